@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
 
 class SearchResult(BaseModel):
     id: str
@@ -11,6 +11,22 @@ class SearchResult(BaseModel):
 class SearchResponse(BaseModel):
     results: List[SearchResult]
 
+class BatchSearchQuery(BaseModel):
+    q: str
+    form_type: Optional[str] = None
+    k: int = Field(10, ge=1, le=250)
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchSearchQuery]
+
+class BatchSearchResult(BaseModel):
+    results: List[SearchResult]
+    error: Optional[str] = None  # set when Typesense rejected this query
+
+class BatchSearchResponse(BaseModel):
+    # One entry per query, in request order
+    results: List[BatchSearchResult]
+
 class CompanyTotal(BaseModel):
     company_name: str
     total_value: float
@@ -18,6 +34,13 @@ class CompanyTotal(BaseModel):
 class CompanyTotalsResponse(BaseModel):
     results: List[CompanyTotal]
 
+class AnalyticsResponse(BaseModel):
+    group_by: List[str]
+    metric: str
+    # One object per group: its dimension columns, `value` (the metric) and `fact_count`
+    results: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
 class SubMissionBase(BaseModel):
     adsh: str
     cik: int
@@ -36,4 +59,10 @@ class SubMissionUpdate(BaseModel):
     name: Optional[str] = None
     form: Optional[str] = None
     sic: Optional[int] = None
-    filing_summary: Optional[str] = None
\ No newline at end of file
+    filing_summary: Optional[str] = None
+
+class BulkIngestResult(BaseModel):
+    line: int
+    adsh: Optional[str] = None
+    status: str  # 'created', 'duplicate' or 'invalid'
+    detail: Optional[str] = None
@@ -0,0 +1,111 @@
+"""
+Response cache for the warehouse (gold) query endpoints.
+
+Warehouse data only changes when the Silver to Gold ETL commits, and every such commit
+bumps the warehouse generation. Entries are keyed on (endpoint, normalized parameters,
+generation), so a load invalidates exactly the results it could have changed; LRU
+eviction and a TTL bound memory. ETags are derived from the same key, which lets a
+matching If-None-Match be answered with 304 without computing or even caching the result.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', 1024))
+QUERY_CACHE_TTL_SECONDS = float(os.environ.get('QUERY_CACHE_TTL_SECONDS', 3600))
+
+def _normalize(value: Any) -> Hashable:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def normalize_params(params: Dict[str, Any]) -> Tuple[Tuple[str, Hashable], ...]:
+    """Sorted (name, value) pairs, leaving out unset parameters, so equivalent requests share an entry."""
+    return tuple(sorted((name, _normalize(value)) for name, value in params.items() if value is not None))
+
+
+class QueryCache:
+    """Thread-safe LRU + TTL cache of endpoint results, keyed on the warehouse generation."""
+
+    def __init__(self, generation: Callable[[], int], max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = QUERY_CACHE_TTL_SECONDS):
+        self._generation = generation
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_generation: Optional[int] = None
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0}
+
+    @staticmethod
+    def etag(key: Tuple) -> str:
+        return '"' + hashlib.sha1(repr(key).encode()).hexdigest() + '"'
+
+    def respond(self, request: Request, response: Response, endpoint: str, params: Dict[str, Any],
+                compute: Callable[[], Any]) -> Any:
+        """
+        The cached result of `compute()` for these parameters, computing it on a miss. Sets the
+        ETag header, or returns a bare 304 response when the client's If-None-Match matches.
+        """
+        generation = self._generation()
+        key = (endpoint, normalize_params(params), generation)
+        etag = self.etag(key)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'X-Warehouse-Generation': str(generation)}
+
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and etag in {tag.strip() for tag in if_none_match.split(',')}:
+            with self._lock:
+                self._stats['not_modified'] += 1
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        response.headers.update(headers)
+        value = self._get(key)
+        if value is None:
+            value = compute()
+            self._put(key, value)
+        return value
+
+    def _get(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._stats['misses'] += 1
+            return None
+
+    def _put(self, key: Tuple, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            generation = key[-1]
+            if generation != self._last_generation:
+                # Entries of older generations can never be hit again; drop them all at once
+                for stale in [k for k in self._entries if k[-1] != generation]:
+                    del self._entries[stale]
+                self._last_generation = generation
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+            }
@@ -1,14 +1,11 @@
 import os
-import typesense
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-print("Loading sentence transformer model...")
-EMBEDDING_MODEL = SentenceTransformer('all-MiniLM-L6-v2')
-print("✓ Model loaded.")
+# Loaded in the background at startup, see api.embeddings.ModelLoader
+EMBEDDING_MODEL_NAME = os.environ.get('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
 
 # Define constants
 COLLECTION_NAME = 'sec_filings'
@@ -16,13 +13,12 @@ TYPESENSE_API_KEY = os.environ.get('TYPESENSE_API_KEY', 'xyz')
 TYPESENSE_HOST = os.environ.get('TYPESENSE_HOST', 'typesense')
 TYPESENSE_PORT = int(os.environ.get('TYPESENSE_PORT', 8108))
 
-# Initialize the Typesense client once at startup
-TYPESENSE_CLIENT = typesense.Client({
-    'nodes': [{
-        'host': TYPESENSE_HOST,
-        'port': TYPESENSE_PORT,
-        'protocol': 'http'
-    }],
-    'api_key': TYPESENSE_API_KEY,
-    'connection_timeout_seconds': 5
-})
\ No newline at end of file
+TYPESENSE_URL = f"http://{TYPESENSE_HOST}:{TYPESENSE_PORT}"
+TYPESENSE_TIMEOUT_SECONDS = float(os.environ.get('TYPESENSE_TIMEOUT_SECONDS', 5))
+TYPESENSE_MAX_RETRIES = int(os.environ.get('TYPESENSE_MAX_RETRIES', 2))
+TYPESENSE_MAX_CONNECTIONS = int(os.environ.get('TYPESENSE_MAX_CONNECTIONS', 100))
+# Typesense's default limit_multi_searches: searches per multi_search request
+TYPESENSE_MULTI_SEARCH_LIMIT = int(os.environ.get('TYPESENSE_MULTI_SEARCH_LIMIT', 50))
+BATCH_SEARCH_MAX_QUERIES = int(os.environ.get('BATCH_SEARCH_MAX_QUERIES', 1000))
+# Largest page GET /raw/submissions/ serves
+RAW_PAGE_MAX_LIMIT = int(os.environ.get('RAW_PAGE_MAX_LIMIT', 1000))
@@ -0,0 +1,275 @@
+"""
+Query embeddings for the search endpoints.
+
+Encoding one query at a time wastes most of a forward pass, so concurrent requests are
+coalesced: each query is queued, and a worker thread waits up to
+EMBEDDING_BATCH_WINDOW_MS after the first one for others to arrive, then encodes them
+all in one `encode` call. Vectors are cached by normalized query text in an LRU bounded
+by EMBEDDING_CACHE_MAX_MB, so repeated queries skip the model entirely. Normalizing
+collapses whitespace, and lowercases only when the loaded model's tokenizer is uncased
+(`do_lower_case`), since case changes the embedding of a cased model.
+
+The model itself is loaded by a `ModelLoader` on a background thread when the app
+starts, and warmed up with one encode, so workers start serving the non-search
+endpoints immediately; until it is ready, embedding requests raise `ModelNotReady`.
+
+EMBEDDING_BACKEND selects how the model runs on CPU: `torch` (full precision),
+`torch-int8` (dynamically quantized Linear layers), `onnx` (ONNX Runtime) or `onnx-int8`
+(the int8-quantized ONNX export, EMBEDDING_ONNX_INT8_FILE). `benchmark_embeddings.py`
+compares their latency, throughput and recall against `torch`.
+"""
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EMBEDDING_BATCH_WINDOW_MS = float(os.environ.get('EMBEDDING_BATCH_WINDOW_MS', 5))
+EMBEDDING_MAX_BATCH = int(os.environ.get('EMBEDDING_MAX_BATCH', 64))
+EMBEDDING_CACHE_MAX_MB = float(os.environ.get('EMBEDDING_CACHE_MAX_MB', 64))
+
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'torch')
+# Quantized ONNX weights published with the model; pick the variant matching the CPU (avx2, avx512, arm64)
+EMBEDDING_ONNX_INT8_FILE = os.environ.get('EMBEDDING_ONNX_INT8_FILE', 'onnx/model_quint8_avx2.onnx')
+EMBEDDING_BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+EMBEDDING_WARMUP_TEXTS = ['warmup', 'risk factors and liquidity of the company']
+
+def normalize_query(text: str, lowercase: bool = False) -> str:
+    """The cache key (and encoded text) of a query. Only pass `lowercase` for uncased models."""
+    return ' '.join((text.lower() if lowercase else text).split())
+
+def is_uncased(model: Any) -> bool:
+    """True when the model lowercases its input anyway, so a query's case can't change its embedding."""
+    if getattr(getattr(model, 'tokenizer', None), 'do_lower_case', False):
+        return True
+    # sentence-transformers' Transformer module (the model's first) has its own flag
+    try:
+        return bool(getattr(model[0], 'do_lower_case', False))
+    except (TypeError, IndexError, KeyError):
+        return False
+
+
+def load_embedding_model(model_name: str, backend: str = EMBEDDING_BACKEND) -> Any:
+    """The SentenceTransformer `model_name` running on the given inference backend. ONNX backends need `optimum[onnxruntime]`."""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}', expected one of: {', '.join(EMBEDDING_BACKENDS)}")
+    # Importing sentence_transformers (and torch) is itself a large part of the startup cost
+    from sentence_transformers import SentenceTransformer
+    if backend == 'onnx':
+        return SentenceTransformer(model_name, backend='onnx')
+    if backend == 'onnx-int8':
+        return SentenceTransformer(model_name, backend='onnx', model_kwargs={'file_name': EMBEDDING_ONNX_INT8_FILE})
+    model = SentenceTransformer(model_name, device='cpu' if backend == 'torch-int8' else None)
+    if backend == 'torch-int8':
+        import torch
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+class ModelNotReady(Exception):
+    """Raised when the embedding model is still loading (or failed to load)."""
+
+
+class ModelLoader:
+    """Loads a SentenceTransformer model on a background thread and warms it up."""
+
+    def __init__(self, model_name: str, backend: str = EMBEDDING_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        self.model: Any = None
+        self.lowercase = False  # whether the loaded model is uncased
+        self.state = 'not_started'  # -> 'loading' -> 'ready' | 'failed'
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Starts loading, once; returns immediately."""
+        with self._lock:
+            if self.state != 'not_started':
+                return
+            self.state = 'loading'
+        threading.Thread(target=self._load, name='embedding-model-loader', daemon=True).start()
+
+    def _load(self) -> None:
+        started = time.perf_counter()
+        try:
+            print(f"Loading sentence transformer model '{self.model_name}' ({self.backend} backend)...")
+            model = load_embedding_model(self.model_name, self.backend)
+            # The first encodes pay for lazy initialization and allocations; do them before taking traffic
+            model.encode(EMBEDDING_WARMUP_TEXTS, batch_size=len(EMBEDDING_WARMUP_TEXTS))
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = 'failed'
+            print(f"✗ Failed to load the embedding model: {self.error}")
+        else:
+            self.lowercase = is_uncased(model)
+            self.model = model
+            self.state = 'ready'
+            print(f"✓ Model loaded and warmed up in {time.perf_counter() - started:.1f}s.")
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until loading finished (or the timeout passed); True if the model is ready."""
+        self._ready.wait(timeout)
+        return self.ready
+
+    def get(self) -> Any:
+        if not self.ready:
+            raise ModelNotReady(f"Embedding model is {self.state.replace('_', ' ')}" + (f": {self.error}" if self.error else ""))
+        return self.model
+
+    def status(self) -> Dict[str, Any]:
+        return {'model': self.model_name, 'backend': self.backend, 'state': self.state, 'lowercase': self.lowercase,
+                'load_seconds': self.load_seconds, 'error': self.error}
+
+
+class EmbeddingCache:
+    """Thread-safe LRU of query -> vector, bounded by the memory its keys and vectors take."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _size(key: str, vector: np.ndarray) -> int:
+        return len(key) + vector.nbytes
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        size = self._size(key, vector)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= self._size(key, previous)
+            self._entries[key] = vector
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.bytes -= self._size(evicted_key, evicted)
+                self.evictions += 1
+
+
+class EmbeddingService:
+    """Micro-batching, caching front of the model a `ModelLoader` provides (anything with `encode(list)`)."""
+
+    def __init__(self, loader: ModelLoader, batch_window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+                 max_batch: int = EMBEDDING_MAX_BATCH, cache_max_mb: float = EMBEDDING_CACHE_MAX_MB):
+        self.loader = loader
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.cache = EmbeddingCache(int(cache_max_mb * 1024 * 1024))
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'cache_hits': 0, 'cache_misses': 0, 'batches': 0, 'batched_queries': 0, 'encode_seconds': 0.0}
+
+    def submit(self, text: str) -> "Future[np.ndarray]":
+        """
+        The embedding of `text` as a future, resolved from the cache or by the next batch.
+        Raises ModelNotReady on a cache miss while the model is loading.
+        """
+        # Until the model is loaded its casing is unknown, but then the cache is empty anyway
+        key = normalize_query(text, self.loader.lowercase)
+        future: "Future[np.ndarray]" = Future()
+        vector = self.cache.get(key)
+        self._count('cache_hits' if vector is not None else 'cache_misses')
+        if vector is not None:
+            future.set_result(vector)
+            return future
+        self.loader.get()
+        self._ensure_worker()
+        self._queue.put((key, future))
+        return future
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.submit(text).result()
+
+    def embed_many(self, texts: List[str]) -> List[np.ndarray]:
+        futures = [self.submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['cache_hits'] + stats['cache_misses']
+        stats['cache_hit_rate'] = round(stats['cache_hits'] / lookups, 4) if lookups else None
+        stats['mean_batch_size'] = round(stats['batched_queries'] / stats['batches'], 2) if stats['batches'] else None
+        stats['encode_seconds'] = round(stats['encode_seconds'], 3)
+        stats.update(cache_entries=len(self.cache), cache_bytes=self.cache.bytes, cache_evictions=self.cache.evictions)
+        return stats
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._worker.start()
+
+    def _next_batch(self) -> List[Tuple[str, Future]]:
+        """Blocks for the first query, then collects more until the window closes or the batch is full."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            # The same query can be queued several times before its first encode lands in the cache
+            keys = list(dict.fromkeys(key for key, _ in batch))
+            started = time.perf_counter()
+            try:
+                vectors = np.asarray(self.loader.get().encode(keys, batch_size=len(keys)), dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self._count('encode_seconds', time.perf_counter() - started)
+            self._count('batches')
+            self._count('batched_queries', len(keys))
+            by_key = {}
+            for key, row in zip(keys, vectors):
+                vector = row.copy()  # don't keep the whole batch array alive through one cached row
+                vector.setflags(write=False)  # shared between callers and the cache
+                by_key[key] = vector
+                self.cache.put(key, vector)
+            for key, future in batch:
+                future.set_result(by_key[key])
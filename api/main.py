@@ -1,29 +1,49 @@
 import os
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import List, Literal, Optional
 import secrets
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Security, status
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request, Response, Security, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from sqlmodel import Session
 
 from api.api_schemas import (
-    SearchResponse, CompanyTotalsResponse, SubMission, SubMissionCreate, SubMissionUpdate
+    SearchResponse, BatchSearchRequest, BatchSearchResponse, CompanyTotalsResponse, AnalyticsResponse, SubMission, SubMissionCreate, SubMissionUpdate
 )
-from data_access.db import engine
+from data_access.analytics import ANALYTICS_MAX_LIMIT, AnalyticsQuery
 from api import services, config
+from api.embeddings import ModelNotReady
 
 # --- INITIALIZATION ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The embedding model loads in the background, so the app serves everything but search right away
+    services.model_loader.start()
+    # Opens the Typesense connection pool on startup and closes it on shutdown
+    await services.typesense_client.start()
+    yield
+    await services.typesense_client.close()
+
 app = FastAPI(
     title="SEC Filings API",
     description="API for querying and searching SEC financial documents.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 security = HTTPBasic()
 
-# --- DEPENDENCIES ---
-def get_db_session():
-    with Session(engine) as session:
-        yield session
+class RequestBodyStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse whose content is produced while the request body is still being read.
+    It leaves `receive` to the body reader: Starlette's disconnect listener would otherwise
+    consume (and drop) body messages on servers older than ASGI spec 2.4.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
 
+# --- DEPENDENCIES ---
 def check_auth(credentials: HTTPBasicCredentials = Security(security)):
     correct_username = os.environ.get('API_USERNAME', 'admin')
     correct_password = os.environ.get('API_PASSWORD', 'supersecret')
@@ -44,23 +64,87 @@ main_router = APIRouter()
 def read_root(username: str = Depends(check_auth)):
     return {"message": f"Welcome, {username}! The SEC Filings API is running."}
 
+@main_router.get("/health", tags=["Status"])
+def read_health(response: Response):
+    """Readiness: 200 once the embedding model is loaded and warmed up, 503 until then. Not authenticated, for probes."""
+    model = services.model_loader.status()
+    if not services.model_loader.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ready" if services.model_loader.ready else model["state"], "embedding_model": model}
+
+@main_router.get("/metrics", tags=["Status"])
+def read_metrics(username: str = Depends(check_auth)):
+    return services.get_metrics()
+
 @main_router.get("/search", response_model=SearchResponse, tags=["Search"])
-def vector_search(
+async def vector_search(
     query: str = Query(..., alias="q", title="Search Query", description="The semantic search query to find relevant filings."),
     form_type: Optional[str] = None,
     k: int = 10, 
     username: str = Depends(check_auth)
 ):
     try:
-        results = services.perform_vector_search(q=query, form_type=form_type, k=k)
+        results = await services.perform_vector_search(q=query, form_type=form_type, k=k)
         return SearchResponse(results=results)
+    except ModelNotReady as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@main_router.post("/search/batch", response_model=BatchSearchResponse, tags=["Search"])
+async def batch_vector_search(batch: BatchSearchRequest, username: str = Depends(check_auth)):
+    """Runs many semantic searches in one request; results come back in the order of `queries`."""
+    try:
+        results = await services.perform_batch_vector_search(batch.queries)
+        return BatchSearchResponse(results=results)
+    except ModelNotReady as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "5"})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @main_router.get("/query/company-totals", response_model=CompanyTotalsResponse, tags=["Database Queries"])
-def get_company_totals(limit: int = 10, db: Session = Depends(get_db_session), username: str = Depends(check_auth)):
-    results = services.get_company_totals_from_db(limit=limit, db=db)
-    return CompanyTotalsResponse(results=results)
+def get_company_totals(
+    request: Request,
+    response: Response,
+    limit: int = 10,
+    tag: Optional[str] = Query(None, description="Only facts for this XBRL tag, e.g. Revenues."),
+    statement: Optional[str] = Query(None, description="Only facts from this statement code (IS, BS, CF, ...)."),
+    date_from: Optional[date] = Query(None, description="Only facts dated on or after this date."),
+    date_to: Optional[date] = Query(None, description="Only facts dated on or before this date."),
+    username: str = Depends(check_auth),
+):
+    params = dict(limit=limit, tag=tag, statement_code=statement, date_from=date_from, date_to=date_to)
+    return services.query_cache.respond(
+        request, response, "company-totals", params,
+        lambda: CompanyTotalsResponse(results=services.get_company_totals_from_db(**params)))
+
+@main_router.get("/query/analytics", response_model=AnalyticsResponse, tags=["Database Queries"])
+def query_analytics(
+    request: Request,
+    response: Response,
+    group_by: List[Literal["company", "filing", "tag", "date", "statement"]] = Query([], description="Dimensions to group the facts by; repeat the parameter for several."),
+    metric: Literal["sum", "avg", "min", "max", "count"] = "sum",
+    order: Literal["desc", "asc"] = Query("desc", description="Order of the groups by metric value."),
+    limit: int = Query(100, ge=1, le=ANALYTICS_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="`next_cursor` of the previous page."),
+    cik: Optional[str] = Query(None, description="Only facts of this company."),
+    tag: Optional[str] = Query(None, description="Only facts for this XBRL tag, e.g. Revenues."),
+    statement: Optional[str] = Query(None, description="Only facts from this statement code (IS, BS, CF, ...)."),
+    form_type: Optional[str] = Query(None, description="Only facts from filings of this form, e.g. 10-K."),
+    date_from: Optional[date] = Query(None, description="Only facts dated on or after this date."),
+    date_to: Optional[date] = Query(None, description="Only facts dated on or before this date."),
+    username: str = Depends(check_auth),
+):
+    """
+    Aggregates the facts by any of the five dimensions in the warehouse, top groups first.
+    Follow `next_cursor` for further pages; queries over the scan or time budget get a 422.
+    """
+    params = dict(group_by=tuple(group_by), metric=metric, descending=order == "desc", limit=limit, cursor=cursor,
+                  cik=cik, tag=tag, statement_code=statement, form_type=form_type, date_from=date_from, date_to=date_to)
+    return services.query_cache.respond(
+        request, response, "analytics", params, lambda: services.run_analytics_query(AnalyticsQuery(**params)))
 
 crud_router = APIRouter(prefix="/raw/submissions", tags=["Raw Data CRUD"], dependencies=[Depends(check_auth)])
 
@@ -68,9 +152,41 @@ crud_router = APIRouter(prefix="/raw/submissions", tags=["Raw Data CRUD"], depen
 def create_new_submissions(submissions: List[SubMissionCreate]):
     return services.create_submissions(submissions)
 
+@crud_router.post("/bulk", status_code=status.HTTP_200_OK)
+async def bulk_ingest_submissions(request: Request, chunk_size: int = Query(1000, ge=1, le=50000)):
+    """
+    Streams NDJSON submissions (one `SubMissionCreate` object per line) into the raw table.
+    Responds with one NDJSON result per input line: `created`, `duplicate` or `invalid`, sent
+    as each chunk is stored. Clients should read the response while uploading large bodies.
+    """
+    return RequestBodyStreamingResponse(
+        services.bulk_ingest_submissions(request.stream(), chunk_size=chunk_size),
+        media_type="application/x-ndjson",
+    )
+
 @crud_router.get("/", response_model=List[SubMission])
-def read_all_submissions(skip: int = 0, limit: int = 100):
-    return services.get_all_submissions(skip=skip, limit=limit)
+def read_all_submissions(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=config.RAW_PAGE_MAX_LIMIT),
+    after: Optional[str] = Query(None, description="Keyset cursor: return submissions whose adsh sorts after this value. Pass an empty value to start from the beginning; the next cursor is sent in the X-Next-Cursor header."),
+):
+    if after is None:
+        return services.get_all_submissions(skip=skip, limit=limit)
+    submissions, next_cursor = services.get_submissions_page(after=after, limit=limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return submissions
+
+@crud_router.get("/export")
+def export_submissions(format: Literal["ndjson", "csv"] = "ndjson"):
+    """Streams the full raw submissions table without building it in memory."""
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        services.export_submissions(fmt=format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="submissions.{format}"'},
+    )
 
 # --- THESE THREE ENDPOINTS ARE NOW UPDATED ---
 
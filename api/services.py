@@ -1,114 +1,202 @@
-import pandas as pd
+import asyncio
+from datetime import date
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple
 from fastapi import HTTPException, status
-import threading
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+import csv
+import io
 import json
-import requests
-from sqlmodel import Session, select, func
+import os
+import numpy as np
 
 from .api_schemas import (
     SubMission, SubMissionCreate, SubMissionUpdate, 
-    CompanyTotal, SearchResult
+    CompanyTotal, SearchResult, BulkIngestResult, AnalyticsResponse, BatchSearchQuery, BatchSearchResult
 )
-from data_access.models import CompanyDim, FactFinancials
+from data_access.bronze_store import SubmissionStore, DuplicateKeyError
+from data_access.analytics import AnalyticsQuery, QueryCostExceeded
+from data_access.warehouse import get_backend
 from . import config
+from .cache import QueryCache
+from .embeddings import EmbeddingService, ModelLoader
+from .typesense_client import TypesenseClient
 
 # Raw Data (Bronze Layer) Service
 BRONZE_SUB_CSV_PATH = Path("data/bronze/structured_filings/sub.csv")
-csv_lock = threading.Lock()
+submission_store = SubmissionStore(BRONZE_SUB_CSV_PATH)
+BULK_MAX_LINE_BYTES = int(os.environ.get('BULK_MAX_LINE_BYTES', 1024 * 1024))
 
 def get_all_submissions(skip: int = 0, limit: int = 100) -> List[SubMission]:
-    if not BRONZE_SUB_CSV_PATH.exists():
-        return []
-    df = pd.read_csv(BRONZE_SUB_CSV_PATH)
-    paginated_df = df.iloc[skip : skip + limit]
-    return [SubMission(**row) for row in paginated_df.to_dict(orient='records')]
+    return [SubMission(**record) for record in submission_store.list(skip=skip, limit=limit)]
+
+def get_submissions_page(after: str, limit: int = 100) -> Tuple[List[SubMission], Optional[str]]:
+    """Keyset pagination in adsh order. Returns the page and the cursor for the next one (None on the last page)."""
+    records = submission_store.page_after(after=after, limit=limit)
+    next_cursor = records[-1]['adsh'] if records and len(records) == limit else None
+    return [SubMission(**record) for record in records], next_cursor
+
+def export_submissions(fmt: str = "ndjson", batch_size: int = 1000) -> Iterator[bytes]:
+    """Streams the whole raw submissions table as NDJSON or CSV, one batch of rows at a time."""
+    if fmt == "csv":
+        columns = submission_store.columns()
+        yield _csv_lines([columns])
+        for batch in submission_store.iter_batches(batch_size):
+            yield _csv_lines([[record.get(c) for c in columns] for record in batch])
+    else:
+        for batch in submission_store.iter_batches(batch_size):
+            yield "".join(json.dumps(record) + "\n" for record in batch).encode()
+
+def _csv_lines(rows: List[List]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue().encode()
 
 def get_submission_by_adsh(adsh: str) -> Optional[SubMission]:
-    if not BRONZE_SUB_CSV_PATH.exists():
-        return None
-    df = pd.read_csv(BRONZE_SUB_CSV_PATH)
-    record = df[df['adsh'] == adsh]
-    if record.empty:
+    record = submission_store.get(adsh)
+    if record is None:
         return None
-    return SubMission(**record.iloc[0].to_dict())
+    return SubMission(**record)
 
 def create_submissions(submissions: List[SubMissionCreate]) -> List[SubMission]:
-    with csv_lock:
-        df = pd.read_csv(BRONZE_SUB_CSV_PATH) if BRONZE_SUB_CSV_PATH.exists() else pd.DataFrame()
-        new_records_df = pd.DataFrame([s.model_dump() for s in submissions])
-        existing_adsh = df['adsh'].isin(new_records_df['adsh'])
-        if existing_adsh.any():
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="One or more submissions with these adsh values already exist.")
-        df = pd.concat([df, new_records_df], ignore_index=True)
-        df.to_csv(BRONZE_SUB_CSV_PATH, index=False)
+    try:
+        submission_store.insert_many([s.model_dump() for s in submissions])
+    except DuplicateKeyError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="One or more submissions with these adsh values already exist.")
     return [SubMission(**s.model_dump()) for s in submissions]
 
+async def bulk_ingest_submissions(body: AsyncIterator[bytes], chunk_size: int = 1000) -> AsyncIterator[bytes]:
+    """
+    Validates and appends NDJSON submissions (one object per line) chunk by chunk while the
+    request body streams in, yielding each chunk's per-record NDJSON results as soon as it is
+    stored. Only one chunk (and no line longer than BULK_MAX_LINE_BYTES) is held in memory.
+    """
+    chunk: List[Tuple[int, Optional[bytes]]] = []
+    async for line_no, line in _iter_lines(body, BULK_MAX_LINE_BYTES):
+        if line is None or line.strip():
+            chunk.append((line_no, line))
+        if len(chunk) >= chunk_size:
+            yield await run_in_threadpool(_ingest_chunk, chunk)
+            chunk = []
+    if chunk:
+        yield await run_in_threadpool(_ingest_chunk, chunk)
+
+async def _iter_lines(body: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """Splits the body into numbered lines. Lines over `max_line_bytes` are dropped as they stream in and yielded as None."""
+    buffer = b''
+    too_long = False  # the line being buffered already went over the limit
+    line_no = 0
+    async for data in body:
+        *lines, buffer = (buffer + data).split(b'\n')
+        for line in lines:
+            line_no += 1
+            yield line_no, None if too_long or len(line) > max_line_bytes else line
+            too_long = False
+        if len(buffer) > max_line_bytes:
+            buffer, too_long = b'', True
+    if buffer or too_long:
+        yield line_no + 1, None if too_long else buffer
+
+def _ingest_chunk(chunk: List[Tuple[int, Optional[bytes]]]) -> bytes:
+    results: List[BulkIngestResult] = []
+    valid: List[Tuple[BulkIngestResult, SubMissionCreate]] = []
+    for line_no, line in chunk:
+        if line is None:
+            results.append(BulkIngestResult(line=line_no, status="invalid", detail=f"Line exceeds {BULK_MAX_LINE_BYTES} bytes."))
+            continue
+        try:
+            submission = SubMissionCreate.model_validate_json(line)
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'body'}: {err['msg']}" for err in e.errors())
+            results.append(BulkIngestResult(line=line_no, status="invalid", detail=detail))
+            continue
+        result = BulkIngestResult(line=line_no, adsh=submission.adsh, status="created")
+        results.append(result)
+        valid.append((result, submission))
+
+    inserted = submission_store.insert_new([submission.model_dump() for _, submission in valid])
+    for (result, _), ok in zip(valid, inserted):
+        if not ok:
+            result.status = "duplicate"
+            result.detail = "A submission with this adsh already exists."
+    return "".join(result.model_dump_json(exclude_none=True) + "\n" for result in results).encode()
+
 def update_submission(adsh: str, submission_update: SubMissionUpdate) -> SubMission:
-    with csv_lock:
-        if not BRONZE_SUB_CSV_PATH.exists():
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Submission file not found.")
-        df = pd.read_csv(BRONZE_SUB_CSV_PATH)
-        record_index = df.index[df['adsh'] == adsh].tolist()
-        if not record_index:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Submission with adsh '{adsh}' not found.")
-        update_data = submission_update.model_dump(exclude_unset=True)
-        for key, value in update_data.items():
-            df.loc[record_index[0], key] = value
-        df.to_csv(BRONZE_SUB_CSV_PATH, index=False)
-        updated_record = df.iloc[record_index[0]]
-        return SubMission(**updated_record.to_dict())
+    update_data = submission_update.model_dump(exclude_unset=True)
+    updated_record = submission_store.update(adsh, update_data)
+    if updated_record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Submission with adsh '{adsh}' not found.")
+    return SubMission(**updated_record)
 
 def delete_submission(adsh: str) -> Dict[str, str]:
-    with csv_lock:
-        if not BRONZE_SUB_CSV_PATH.exists():
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Submission file not found.")
-        df = pd.read_csv(BRONZE_SUB_CSV_PATH)
-        original_len = len(df)
-        df = df[df['adsh'] != adsh]
-        if len(df) == original_len:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Submission with adsh '{adsh}' not found.")
-        df.to_csv(BRONZE_SUB_CSV_PATH, index=False)
+    if not submission_store.delete(adsh):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Submission with adsh '{adsh}' not found.")
     return {"message": f"Submission with adsh '{adsh}' deleted successfully."}
 
+def get_metrics() -> Dict[str, Dict]:
+    return {"bronze_submissions": submission_store.stats(), "warehouse_query_cache": query_cache.stats(),
+            "query_embeddings": embedding_service.stats()}
+
 # Data Warehouse (Gold Layer) Service
-def get_company_totals_from_db(limit: int, db: Session) -> List[CompanyTotal]:
-    statement = (select(CompanyDim.name, func.sum(FactFinancials.value).label("total_value")).join(CompanyDim, FactFinancials.company_id == CompanyDim.id).group_by(CompanyDim.name).order_by(func.sum(FactFinancials.value).desc()).limit(limit))
-    results = db.exec(statement).all()
-    company_totals = [CompanyTotal(company_name=name, total_value=value) for name, value in results]
-    return company_totals
+# Results of the warehouse query endpoints, invalidated whenever an ETL load bumps the generation
+warehouse = get_backend()
+query_cache = QueryCache(warehouse.generation)
+
+def get_company_totals_from_db(limit: int, tag: Optional[str] = None, statement_code: Optional[str] = None,
+                               date_from: Optional[date] = None, date_to: Optional[date] = None) -> List[CompanyTotal]:
+    """Top companies by total reported value, from the configured analytical backend (WAREHOUSE_BACKEND)."""
+    results = warehouse.company_totals(limit, tag=tag, statement_code=statement_code, date_from=date_from, date_to=date_to)
+    return [CompanyTotal(company_name=name, total_value=value) for name, value in results]
+
+def run_analytics_query(query: AnalyticsQuery) -> AnalyticsResponse:
+    """Aggregates the facts in the warehouse per the query, one page at a time."""
+    try:
+        results, next_cursor = warehouse.aggregate_facts(query)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except QueryCostExceeded as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return AnalyticsResponse(group_by=list(query.group_by), metric=query.metric, results=results, next_cursor=next_cursor)
 
 # Vector Search (Typesense) Service
-def perform_vector_search(q: str, form_type: Optional[str], k: int) -> List[SearchResult]:
-    query_vector = config.EMBEDDING_MODEL.encode(q).tolist()
-    vector_as_string = json.dumps(query_vector, separators=(',', ':'))
-    
-    url = f"http://{config.TYPESENSE_HOST}:{config.TYPESENSE_PORT}/multi_search"
-    headers = { 'Content-Type': 'application/json', 'X-TYPESENSE-API-KEY': config.TYPESENSE_API_KEY }
-    search_requests = {
-        'searches': [{
-            'collection': config.COLLECTION_NAME, 'q': '*',
-            'vector_query': f"embedding:({vector_as_string}, k:{k})",
-        }]
+model_loader = ModelLoader(config.EMBEDDING_MODEL_NAME)
+embedding_service = EmbeddingService(model_loader)
+typesense_client = TypesenseClient()
+
+def _vector_search(vector: np.ndarray, form_type: Optional[str], k: int) -> Dict:
+    vector_as_string = json.dumps(vector.tolist(), separators=(',', ':'))
+    search = {
+        'collection': config.COLLECTION_NAME, 'q': '*',
+        'vector_query': f"embedding:({vector_as_string}, k:{k})",
     }
     if form_type:
-        search_requests['searches'][0]['filter_by'] = f'form:={form_type}'
+        search['filter_by'] = f'form:={form_type}'
+    return search
 
-    response = requests.post(url, headers=headers, json=search_requests)
-    response.raise_for_status()
-    search_results = response.json()
-    
-    hits = search_results['results'][0].get('hits', [])
-    if not hits:
-        return []
-
-    results = [SearchResult(
+def _search_results(result: Dict) -> List[SearchResult]:
+    return [SearchResult(
         id=hit['document']['id'],
         cik=hit['document']['cik'],
         name=hit['document']['name'],
         form=hit['document']['form'],
         score=hit.get('vector_distance', 0.0)
-    ) for hit in hits]
-    
-    return results
\ No newline at end of file
+    ) for hit in result.get('hits', [])]
+
+async def perform_vector_search(q: str, form_type: Optional[str], k: int) -> List[SearchResult]:
+    # Encoded on the embedding batcher's thread, so the event loop stays free
+    query_vector = await asyncio.wrap_future(embedding_service.submit(q))
+    search_results = await typesense_client.multi_search([_vector_search(query_vector, form_type, k)])
+    return _search_results(search_results[0])
+
+async def perform_batch_vector_search(queries: List[BatchSearchQuery]) -> List[BatchSearchResult]:
+    """Embeds all queries together and runs them through multi_search; results are in query order."""
+    if len(queries) > config.BATCH_SEARCH_MAX_QUERIES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"At most {config.BATCH_SEARCH_MAX_QUERIES} queries per batch.")
+    # Queued together, so the batcher encodes them in as few model calls as EMBEDDING_MAX_BATCH allows
+    vectors = await asyncio.gather(*(asyncio.wrap_future(embedding_service.submit(query.q)) for query in queries))
+    search_results = await typesense_client.multi_search(
+        [_vector_search(vector, query.form_type, query.k) for query, vector in zip(queries, vectors)])
+    return [BatchSearchResult(results=[], error=result['error']) if 'error' in result
+            else BatchSearchResult(results=_search_results(result)) for result in search_results]
\ No newline at end of file
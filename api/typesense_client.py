@@ -0,0 +1,64 @@
+"""
+Async Typesense client for the search path.
+
+One `httpx.AsyncClient` per process keeps a pool of keep-alive connections to Typesense,
+so searches don't pay a TCP handshake each and many can be in flight on one event loop.
+Connection errors, timeouts and 429/5xx responses are retried with exponential backoff.
+The pool is opened and closed by the app's lifespan.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from . import config
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TypesenseClient:
+    def __init__(self, base_url: str = config.TYPESENSE_URL, api_key: str = config.TYPESENSE_API_KEY,
+                 timeout_seconds: float = config.TYPESENSE_TIMEOUT_SECONDS, max_retries: int = config.TYPESENSE_MAX_RETRIES,
+                 max_connections: int = config.TYPESENSE_MAX_CONNECTIONS):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(timeout_seconds, connect=min(timeout_seconds, 5.0))
+        self.max_retries = max_retries
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits,
+                                             headers={'X-TYPESENSE-API-KEY': self.api_key})
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # Opened lazily too, for use outside the app's lifespan (scripts, tests)
+        await self.start()
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = await self._client.post(path, json=payload)
+            except (httpx.TimeoutException, httpx.TransportError):
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    response.raise_for_status()
+                    return response.json()
+            await asyncio.sleep(0.1 * 2 ** attempt)
+
+    async def multi_search(self, searches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Runs the searches and returns one result object per search, in order. Typesense caps
+        the searches per request, so larger lists are split into concurrent requests.
+        """
+        chunk = config.TYPESENSE_MULTI_SEARCH_LIMIT
+        responses = await asyncio.gather(*(self._post('/multi_search', {'searches': searches[start:start + chunk]})
+                                           for start in range(0, len(searches), chunk)))
+        return [result for response in responses for result in response['results']]
@@ -0,0 +1,134 @@
+"""
+Benchmarks the embedding inference backends on the filing corpus of the Silver layer.
+
+For each backend (see api.embeddings.EMBEDDING_BACKENDS), in its own process so memory
+is measured separately: load time, peak RSS, single-query latency (p50/p95), corpus
+encoding throughput, and search quality against the full-precision `torch` baseline:
+recall@k of the exact top-k documents and the mean cosine similarity of the document
+vectors.
+
+    python benchmark_embeddings.py --backends torch,onnx,onnx-int8 --k 10
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from api.embeddings import EMBEDDING_BACKENDS, load_embedding_model
+
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+SILVER_DIR = Path(__file__).resolve().parent / "data" / "silver"
+
+# Typical search queries; the corpus' own filing summaries are added as further queries
+SAMPLE_QUERIES = [
+    'risk and growth', 'supply chain disruption', 'liquidity and capital resources',
+    'litigation and legal proceedings', 'cybersecurity incidents', 'goodwill impairment',
+    'revenue recognition', 'foreign currency exchange risk', 'interest rate exposure',
+    'climate change regulation',
+]
+
+def load_corpus(limit: int) -> List[str]:
+    """The documents as ingest_to_typesense.py embeds them: filing summary plus PDF text."""
+    df = pd.read_parquet(SILVER_DIR / "sub", columns=['adsh', 'filing_summary', 'extracted_pdf_text'])
+    df = df.drop_duplicates(subset=['adsh'], keep='first').head(limit)
+    return (df['filing_summary'].fillna('') + "\n\n" + df['extracted_pdf_text'].fillna('')).tolist()
+
+def load_queries(corpus: List[str], count: int, seed: int = 0) -> List[str]:
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(corpus), size=min(max(count - len(SAMPLE_QUERIES), 0), len(corpus)), replace=False)
+    # A filing summary's first sentence, like a user searching for a filing they've seen
+    from_corpus = [corpus[i].split('\n')[0].split('. ')[0][:200] for i in picked]
+    return SAMPLE_QUERIES + [query for query in from_corpus if query.strip()]
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_backend(backend: str, corpus: List[str], queries: List[str], batch_size: int) -> Dict[str, Any]:
+    """Runs in a fresh process: loads the model and times it. Returns metrics plus the embeddings."""
+    started = time.perf_counter()
+    model = load_embedding_model(EMBEDDING_MODEL, backend)
+    model.encode(queries[:2])  # warmup
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        model.encode([query])
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    documents = model.encode(corpus, batch_size=batch_size, normalize_embeddings=True)
+    corpus_seconds = time.perf_counter() - started
+    query_vectors = model.encode(queries, batch_size=batch_size, normalize_embeddings=True)
+
+    return {
+        'backend': backend,
+        'load_s': round(load_seconds, 2),
+        'peak_rss_mb': round(peak_rss_mb()),
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 2),
+        'docs_per_s': round(len(corpus) / corpus_seconds, 1),
+        'documents': np.asarray(documents, dtype=np.float32),
+        'queries': np.asarray(query_vectors, dtype=np.float32),
+    }
+
+def top_k(documents: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Exact cosine top-k document indexes per query (vectors are normalized)."""
+    scores = queries @ documents.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def main(backends: List[str], k: int, limit: int, query_count: int, batch_size: int) -> None:
+    print(f"--- Embedding backend benchmark ('{EMBEDDING_MODEL}') ---")
+    corpus = load_corpus(limit)
+    queries = load_queries(corpus, query_count)
+    k = min(k, len(corpus))
+    print(f"Corpus: {len(corpus)} documents, {len(queries)} queries, recall@{k} against 'torch'.\n")
+
+    # The baseline always runs, first
+    backends = ['torch'] + [backend for backend in backends if backend != 'torch']
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for backend in backends:
+        print(f"Running '{backend}'...")
+        with context.Pool(1) as pool:
+            try:
+                results.append(pool.apply(run_backend, (backend, corpus, queries, batch_size)))
+            except Exception as e:
+                print(f"  ✗ '{backend}' failed: {type(e).__name__}: {e}")
+                if backend == 'torch':
+                    sys.exit(1)
+
+    baseline = results[0]
+    expected = top_k(baseline['documents'], baseline['queries'], k)
+    rows = []
+    for result in results:
+        found = top_k(result['documents'], result['queries'], k)
+        recall = np.mean([len(set(e) & set(f)) / k for e, f in zip(expected, found)])
+        similarity = np.mean(np.sum(result['documents'] * baseline['documents'], axis=1))
+        rows.append({key: value for key, value in result.items() if key not in ('documents', 'queries')}
+                    | {f'recall@{k}': round(float(recall), 4), 'cosine_vs_torch': round(float(similarity), 4),
+                       'p50_speedup': round(baseline['p50_ms'] / result['p50_ms'], 2)})
+    print()
+    print(pd.DataFrame(rows).set_index('backend').to_string())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the embedding inference backends")
+    parser.add_argument("--backends", default=','.join(EMBEDDING_BACKENDS),
+                        help=f"Comma-separated backends to compare with 'torch' (default: {','.join(EMBEDDING_BACKENDS)})")
+    parser.add_argument("--k", type=int, default=10, help="k of recall@k")
+    parser.add_argument("--limit", type=int, default=5000, help="Maximum number of corpus documents")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    selected = [backend.strip() for backend in args.backends.split(',') if backend.strip()]
+    unknown = [backend for backend in selected if backend not in EMBEDDING_BACKENDS]
+    if unknown:
+        parser.error(f"unknown backend(s): {', '.join(unknown)}")
+    main(selected, args.k, args.limit, args.queries, args.batch_size)
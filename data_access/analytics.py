@@ -0,0 +1,164 @@
+"""
+Ad-hoc aggregate queries over the star schema.
+
+An `AnalyticsQuery` (group-by dimensions, filters, metric, page size and cursor) is
+compiled into one SELECT over `factfinancials` that joins only the dimensions it needs
+and aggregates in the database. Results are ordered by the metric, ties broken by the
+group columns, and paged with a keyset cursor: the next page continues after the last
+row's (metric, group values) through a row-value comparison in HAVING, so page N costs
+the same as page 1. The SQL is plain enough to run on both warehouse backends.
+"""
+import base64
+import json
+import os
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+ANALYTICS_MAX_LIMIT = int(os.environ.get('ANALYTICS_MAX_LIMIT', 1000))
+ANALYTICS_TIMEOUT_SECONDS = float(os.environ.get('ANALYTICS_TIMEOUT_SECONDS', 10))
+# SQLite virtual machine instructions a query may execute: its measure of rows scanned and joined
+ANALYTICS_MAX_VM_STEPS = int(os.environ.get('ANALYTICS_MAX_VM_STEPS', 500_000_000))
+
+
+class Dimension(NamedTuple):
+    table: str
+    alias: str
+    fact_column: str
+    columns: Tuple[str, ...]  # returned (and grouped by) when grouping on the dimension
+
+
+DIMENSIONS: Dict[str, Dimension] = {
+    'company': Dimension('companydim', 'c', 'company_id', ('cik', 'name')),
+    'filing': Dimension('filingdim', 'fi', 'filing_id', ('accession_number',)),
+    'tag': Dimension('tagdim', 't', 'tag_id', ('tag',)),
+    'date': Dimension('datedim', 'd', 'date_id', ('date_key',)),
+    'statement': Dimension('statementdim', 's', 'statement_id', ('statement_code',)),
+}
+
+METRICS = {
+    'sum': 'SUM(f.value)',
+    'avg': 'AVG(f.value)',
+    'min': 'MIN(f.value)',
+    'max': 'MAX(f.value)',
+    'count': 'COUNT(*)',
+}
+
+
+class QueryCostExceeded(Exception):
+    """Raised when a query runs past its time or scan budget."""
+
+
+class AnalyticsQuery(NamedTuple):
+    group_by: Tuple[str, ...] = ()
+    metric: str = 'sum'
+    descending: bool = True
+    limit: int = 100
+    cursor: Optional[str] = None
+    cik: Optional[str] = None
+    tag: Optional[str] = None
+    statement_code: Optional[str] = None
+    form_type: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+
+class CompiledQuery(NamedTuple):
+    sql: str
+    params: List[Any]
+    columns: List[str]  # result column names, in SELECT order
+
+
+def encode_cursor(row: Dict[str, Any], columns: List[str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps([row[column] for column in columns]).encode()).decode()
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Cursor does not match the query's group_by")
+    return values
+
+def validate(query: AnalyticsQuery) -> None:
+    unknown = [dimension for dimension in query.group_by if dimension not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown group_by dimension(s) {', '.join(unknown)}; expected any of {', '.join(DIMENSIONS)}")
+    if len(set(query.group_by)) != len(query.group_by):
+        raise ValueError("group_by lists a dimension more than once")
+    if query.metric not in METRICS:
+        raise ValueError(f"Unknown metric '{query.metric}'; expected one of {', '.join(METRICS)}")
+    if not 1 <= query.limit <= ANALYTICS_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {ANALYTICS_MAX_LIMIT}")
+
+def compile_query(query: AnalyticsQuery, year_column: Optional[str] = None) -> CompiledQuery:
+    """
+    The SQL for `query`, with `?` placeholders. `year_column`, if given, names a fact column
+    holding the fact's year (the partition column of the Parquet export), used to prune by date range.
+    """
+    validate(query)
+    filters = {
+        ('company', 'cik'): query.cik,
+        ('tag', 'tag'): query.tag,
+        ('statement', 'statement_code'): query.statement_code,
+        ('filing', 'form_type'): query.form_type,
+    }
+    conditions, params = [], []
+    for (dimension, column), value in filters.items():
+        if value is not None:
+            conditions.append(f"{DIMENSIONS[dimension].alias}.{column} = ?")
+            params.append(value)
+    # date_key is YYYYMMDD, so string comparison orders dates correctly
+    for value, operator in ((query.date_from, '>='), (query.date_to, '<=')):
+        if value is not None:
+            conditions.append(f"d.date_key {operator} ?")
+            params.append(value.strftime('%Y%m%d'))
+            if year_column:
+                conditions.append(f"f.{year_column} {operator} ?")
+                params.append(value.year)
+
+    used = set(query.group_by) | {dimension for (dimension, _), value in filters.items() if value is not None}
+    if query.date_from is not None or query.date_to is not None:
+        used.add('date')
+    joins = [f"JOIN {DIMENSIONS[name].table} {DIMENSIONS[name].alias} ON f.{DIMENSIONS[name].fact_column} = {DIMENSIONS[name].alias}.id"
+             for name in DIMENSIONS if name in used]
+
+    group_columns = [(f"{DIMENSIONS[name].alias}.{column}", column) for name in query.group_by for column in DIMENSIONS[name].columns]
+    metric = METRICS[query.metric]
+    select_list = [f"{expression} AS {column}" for expression, column in group_columns]
+    select_list += [f"{metric} AS value", "COUNT(*) AS fact_count"]
+
+    having, having_params = "", []
+    if query.cursor is not None:
+        last_value, *last_groups = decode_cursor(query.cursor, 1 + len(group_columns))
+        past = '<' if query.descending else '>'
+        having = f"HAVING {metric} {past} ?"
+        having_params = [last_value]
+        if group_columns:
+            expressions = ', '.join(expression for expression, _ in group_columns)
+            placeholders = ', '.join('?' for _ in group_columns)
+            having += f" OR ({metric} = ? AND ({expressions}) > ({placeholders}))"
+            having_params += [last_value, *last_groups]
+
+    direction = 'DESC' if query.descending else 'ASC'
+    order_by = [f"value {direction}"] + [f"{column} ASC" for _, column in group_columns]
+    sql = "\n".join(part for part in [
+        f"SELECT {', '.join(select_list)}",
+        "FROM factfinancials f",
+        *joins,
+        f"WHERE {' AND '.join(conditions)}" if conditions else "",
+        f"GROUP BY {', '.join(expression for expression, _ in group_columns)}" if group_columns else "",
+        having,
+        f"ORDER BY {', '.join(order_by)}",
+        "LIMIT ?",
+    ] if part)
+    return CompiledQuery(sql, params + having_params + [query.limit], [column for _, column in group_columns] + ['value', 'fact_count'])
+
+def page(query: AnalyticsQuery, compiled: CompiledQuery, rows: List[tuple]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """The result rows as dicts, and the cursor of the next page (None on the last page)."""
+    results = [dict(zip(compiled.columns, row)) for row in rows]
+    next_cursor = None
+    if len(results) == query.limit:
+        group_columns = compiled.columns[:-2]
+        next_cursor = encode_cursor(results[-1], ['value'] + group_columns)
+    return results, next_cursor
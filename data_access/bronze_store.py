@@ -0,0 +1,586 @@
+"""
+Storage engine for the raw (Bronze) submissions table.
+
+`sub.csv` stays the file the Bronze to Silver ETL reads, but the API no longer
+parses or rewrites it on every request:
+
+- New submissions are appended to the end of the CSV.
+- Updates and deletes are appended to a write log (`sub.csv.log`, one JSON
+  entry per line) and folded back into the CSV by `compact()` once the log
+  grows past a threshold.
+- An in-memory index maps every adsh to the byte range of its row in the CSV
+  (or to its latest logged version), so point lookups read a single row and
+  keyset pagination walks a sorted key list instead of scanning the file.
+- While the table fits in the memory budget, the decoded rows are also kept
+  as a columnar view, so reads don't touch the disk at all.
+
+Every operation stats the CSV and the log first. Growth of either file by
+another process (e.g. another uvicorn worker) is caught up by reading only
+the new tail, provided the region already indexed is unchanged (its size
+and a hash of its first and last FINGERPRINT_WINDOW_BYTES); any other change
+(rewrite, compaction, regeneration) reloads the store.
+
+Writers in all processes serialize on an exclusive `flock` of a sidecar file
+(`sub.csv.lock`) held around appends, log writes and compaction, and re-sync
+once it is held, so a compaction can't drop rows or log entries another
+process writes meanwhile.
+"""
+import bisect
+import csv
+import fcntl
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+KEY_COLUMN = 'adsh'
+DEFAULT_COMPACT_THRESHOLD = int(os.environ.get('BRONZE_LOG_COMPACT_THRESHOLD', 1000))
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get('BRONZE_CACHE_MAX_MB', 512)) * 1024 * 1024
+# Bytes hashed at each end of the indexed region to tell an append from an in-place rewrite
+FINGERPRINT_WINDOW_BYTES = 64 * 1024
+
+# Rough CPython object overhead used to estimate the size of the columnar view
+_ROW_OVERHEAD_BYTES = 100
+_VALUE_OVERHEAD_BYTES = 57
+
+Record = Dict[str, Any]
+# Either the (offset, length) of a row in the CSV or the latest logged record
+Location = Union[Tuple[int, int], Record]
+
+_KIND_RANK = {None: 0, 'int': 1, 'float': 2, 'str': 3}
+
+
+class DuplicateKeyError(ValueError):
+    """Raised when inserted records collide with existing (or each other's) adsh values."""
+    def __init__(self, keys: List[str]):
+        super().__init__(f"Duplicate {KEY_COLUMN} values: {', '.join(keys)}")
+        self.keys = keys
+
+
+# --- CSV helpers ---
+
+def _iter_csv_rows(fh) -> Iterator[Tuple[int, int, List[str]]]:
+    """Yields (offset, length, values) for every row of a binary CSV file, header included."""
+    position = fh.tell()
+
+    def lines():
+        nonlocal position
+        for raw in fh:
+            position += len(raw)
+            yield raw.decode('utf-8')
+
+    start = position
+    for values in csv.reader(lines()):
+        if values:
+            yield start, position - start, values
+        start = position
+
+def _signature(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+def _region_fingerprint(path: Path, end: int) -> Optional[str]:
+    """
+    Hash of the first and last FINGERPRINT_WINDOW_BYTES of `path[:end]` (all of it when shorter).
+    A rewrite that shifts or changes rows before `end` changes the hash; reading two windows
+    keeps the check cheap for large files.
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as fh:
+            if os.fstat(fh.fileno()).st_size < end:
+                return None
+            head_end = min(end, FINGERPRINT_WINDOW_BYTES)
+            digest.update(fh.read(head_end))
+            tail_start = max(head_end, end - FINGERPRINT_WINDOW_BYTES)
+            fh.seek(tail_start)
+            digest.update(fh.read(end - tail_start))
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+def _parse_row(data: bytes) -> List[str]:
+    return next(csv.reader(io.StringIO(data.decode('utf-8'), newline='')), [])
+
+def _encode_row(values: Iterable[Any]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerow(values)
+    return buffer.getvalue().encode('utf-8')
+
+def _format_value(value: Any) -> Any:
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    return value
+
+def _widen_raw(kind: Optional[str], raw: str) -> Optional[str]:
+    """Widens a column kind so it can hold the raw CSV value (mirrors pandas' int/float/str inference)."""
+    if raw == '' or kind == 'str':
+        return kind
+    if kind in (None, 'int'):
+        try:
+            int(raw)
+            return 'int'
+        except ValueError:
+            pass
+    try:
+        float(raw)
+        return 'float'
+    except ValueError:
+        return 'str'
+
+def _widen_value(kind: Optional[str], value: Any) -> Optional[str]:
+    if value is None:
+        return kind
+    if isinstance(value, int) and not isinstance(value, bool):
+        value_kind = 'int'
+    elif isinstance(value, float):
+        value_kind = 'float'
+    else:
+        value_kind = 'str'
+    return value_kind if _KIND_RANK[value_kind] > _KIND_RANK[kind] else kind
+
+def _coerce(kind: Optional[str], raw: str) -> Any:
+    if raw == '':
+        return None
+    if kind == 'int':
+        return int(raw)
+    if kind == 'float':
+        return float(raw)
+    return raw
+
+
+class SubmissionStore:
+    """Indexed, append-only store over the bronze `sub.csv` file. Safe to share between threads and processes."""
+
+    def __init__(self, csv_path: Path, log_path: Optional[Path] = None,
+                 compact_threshold: int = DEFAULT_COMPACT_THRESHOLD, cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.csv_path = Path(csv_path)
+        self.log_path = Path(log_path) if log_path else self.csv_path.with_name(self.csv_path.name + '.log')
+        self.lock_path = self.csv_path.with_name(self.csv_path.name + '.lock')
+        self.compact_threshold = compact_threshold
+        self.cache_max_bytes = cache_max_bytes
+        self._lock = threading.RLock()
+        self._write_depth = 0  # nesting of _writing() in this process, which holds the flock once
+        self._loaded = False
+        self._columns: List[str] = []
+        self._file_width = 0  # number of columns in the CSV header on disk
+        self._kinds: Dict[str, Optional[str]] = {}
+        self._index: Dict[str, Location] = {}  # insertion (file) order
+        self._sorted_keys: List[str] = []      # adsh order, for keyset pagination
+        self._log_entries = 0
+        # Keys with a logged delete since the last compaction. Re-inserting one of them goes
+        # through the log, so on replay it lands after the delete instead of before it.
+        self._logged_deletes: set = set()
+        # File state the in-memory structures reflect
+        self._csv_sig: Optional[Tuple[int, int, int]] = None
+        self._log_sig: Optional[Tuple[int, int, int]] = None
+        self._csv_end = 0
+        self._log_end = 0
+        self._csv_fingerprint: Optional[str] = None
+        self._log_fingerprint: Optional[str] = None
+        # Columnar view of the CSV rows (one list per file column), None when over budget
+        self._view: Optional[List[List[Any]]] = None
+        self._view_rows: Dict[str, int] = {}
+        self._view_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._reloads = 0
+
+    # --- Loading & invalidation ---
+
+    def _sync(self) -> None:
+        """Brings the in-memory state in line with the files on disk. Caller must hold the lock."""
+        csv_sig, log_sig = _signature(self.csv_path), _signature(self.log_path)
+        if self._loaded and csv_sig != self._csv_sig:
+            same_file = csv_sig and self._csv_sig and csv_sig[0] == self._csv_sig[0]
+            if (same_file and csv_sig[1] > self._csv_end and self._file_width
+                    and _region_fingerprint(self.csv_path, self._csv_end) == self._csv_fingerprint):
+                self._catch_up_csv()
+            else:
+                self._loaded = False
+        if self._loaded and log_sig != self._log_sig:
+            same_file = log_sig and self._log_sig and log_sig[0] == self._log_sig[0]
+            appended = same_file and _region_fingerprint(self.log_path, self._log_end) == self._log_fingerprint
+            if (appended or self._log_sig is None) and log_sig and log_sig[1] > self._log_end:
+                self._catch_up_log()
+            else:
+                self._loaded = False
+        if not self._loaded:
+            if self._csv_sig is not None:
+                self._reloads += 1
+            self._load()
+            self._loaded = True
+
+    def _load(self) -> None:
+        self._columns, self._kinds, self._index, self._log_entries = [], {}, {}, 0
+        self._logged_deletes = set()
+        self._view, self._view_rows, self._view_bytes = None, {}, 0
+        self._csv_end = self._log_end = 0
+        self._csv_sig = _signature(self.csv_path)
+        if self._csv_sig is not None:
+            with open(self.csv_path, 'rb') as fh:
+                rows = _iter_csv_rows(fh)
+                header = next(rows, None)
+                if header is not None:
+                    self._columns = header[2]
+                    self._kinds = dict.fromkeys(self._columns)
+                    self._view = [[] for _ in self._columns]
+                    self._csv_end = header[0] + header[1]
+                    self._index_rows(rows)
+        self._csv_fingerprint = _region_fingerprint(self.csv_path, self._csv_end)
+        self._file_width = len(self._columns)
+
+        self._log_sig = _signature(self.log_path)
+        if self._log_sig is not None:
+            self._catch_up_log(maintain_sorted=False)
+        self._sorted_keys = sorted(self._index)
+
+    def _index_rows(self, rows: Iterator[Tuple[int, int, List[str]]]) -> None:
+        """Indexes CSV rows (and adds them to the columnar view while it fits the budget)."""
+        key_pos = self._columns.index(KEY_COLUMN)
+        width = len(self._view) if self._view is not None else self._file_width or len(self._columns)
+        kinds = [self._kinds[column] for column in self._columns[:width]]
+        first_new = len(self._view[0]) if self._view else 0
+        new_keys = []
+        for offset, length, values in rows:
+            key = values[key_pos]
+            if key not in self._index:
+                # Keep the first occurrence of a duplicated adsh, like the old df[...].iloc[0] lookup
+                self._index[key] = (offset, length)
+                new_keys.append(key)
+                if self._view is not None:
+                    self._view_rows[key] = len(self._view[0])
+            for i, raw in enumerate(values[:width]):
+                kinds[i] = _widen_raw(kinds[i], raw)
+            if self._view is not None:
+                for i in range(width):
+                    self._view[i].append(values[i] if i < len(values) else '')
+                self._view_bytes += _ROW_OVERHEAD_BYTES + length + _VALUE_OVERHEAD_BYTES * width
+                if self._view_bytes > self.cache_max_bytes:
+                    self._view, self._view_rows, self._view_bytes = None, {}, 0
+            self._csv_end = offset + length
+        self._kinds.update(zip(self._columns, kinds))
+        if self._view is not None:
+            # Values are kept as raw strings while scanning, decode the new ones now that kinds are known
+            for column, values in zip(self._columns, self._view):
+                kind = self._kinds[column]
+                values[first_new:] = [_coerce(kind, raw) for raw in values[first_new:]]
+        if self._loaded:
+            self._add_sorted_keys(new_keys)
+
+    def _catch_up_csv(self) -> None:
+        """Indexes rows appended to the CSV since it was last read."""
+        with open(self.csv_path, 'rb') as fh:
+            fh.seek(self._csv_end)
+            self._index_rows(_iter_csv_rows(fh))
+        self._csv_sig = _signature(self.csv_path)
+        self._csv_fingerprint = _region_fingerprint(self.csv_path, self._csv_end)
+
+    def _catch_up_log(self, maintain_sorted: bool = True) -> None:
+        """Applies log entries appended since the log was last read."""
+        with open(self.log_path, 'rb') as fh:
+            fh.seek(self._log_end)
+            for line in fh:
+                if not line.endswith(b'\n'):
+                    break  # partially written entry, picked up on the next sync
+                self._log_end += len(line)
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._apply(entry, maintain_sorted)
+                self._log_entries += 1
+        self._log_sig = _signature(self.log_path)
+        self._log_fingerprint = _region_fingerprint(self.log_path, self._log_end)
+
+    def _apply(self, entry: Dict[str, Any], maintain_sorted: bool) -> None:
+        if entry['op'] == 'put':
+            record = entry['record']
+            key = record[KEY_COLUMN]
+            self._observe(record)
+            if maintain_sorted and key not in self._index:
+                bisect.insort(self._sorted_keys, key)
+            self._index[key] = record
+        elif entry['op'] == 'delete':
+            key = entry[KEY_COLUMN]
+            self._logged_deletes.add(key)
+            if self._index.pop(key, None) is not None and maintain_sorted:
+                i = bisect.bisect_left(self._sorted_keys, key)
+                if i < len(self._sorted_keys) and self._sorted_keys[i] == key:
+                    del self._sorted_keys[i]
+
+    def _observe(self, record: Record) -> None:
+        for column, value in record.items():
+            if column not in self._kinds:
+                self._columns.append(column)
+                self._kinds[column] = None
+            self._kinds[column] = _widen_value(self._kinds[column], value)
+
+    # --- Reads ---
+
+    def _read(self, key: str, location: Location, fh=None) -> Record:
+        if not isinstance(location, tuple):
+            self._hits += 1
+            return dict(location)
+        record = dict.fromkeys(self._columns)
+        row = self._view_rows.get(key)
+        if row is not None:
+            self._hits += 1
+            for column, values in zip(self._columns, self._view):
+                record[column] = values[row]
+            return record
+        self._misses += 1
+        offset, length = location
+        if fh is None:
+            with open(self.csv_path, 'rb') as fh:
+                fh.seek(offset)
+                values = _parse_row(fh.read(length))
+        else:
+            fh.seek(offset)
+            values = _parse_row(fh.read(length))
+        for column, raw in zip(self._columns, values):
+            record[column] = _coerce(self._kinds[column], raw)
+        return record
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._index)
+
+    def __contains__(self, adsh: str) -> bool:
+        with self._lock:
+            self._sync()
+            return adsh in self._index
+
+    def get(self, adsh: str) -> Optional[Record]:
+        with self._lock:
+            self._sync()
+            location = self._index.get(adsh)
+            return None if location is None else self._read(adsh, location)
+
+    def list(self, skip: int = 0, limit: int = 100) -> List[Record]:
+        """Returns records in file order, like the old `df.iloc[skip:skip + limit]`."""
+        with self._lock:
+            self._sync()
+            return [self._read(key, loc) for key, loc in islice(self._index.items(), skip, skip + limit)]
+
+    def page_after(self, after: Optional[str] = None, limit: int = 100) -> List[Record]:
+        """Keyset pagination: returns up to `limit` records whose adsh sorts strictly after `after`."""
+        with self._lock:
+            self._sync()
+            start = 0 if after is None else bisect.bisect_right(self._sorted_keys, after)
+            return [self._read(key, self._index[key]) for key in self._sorted_keys[start:start + limit]]
+
+    def iter_batches(self, batch_size: int = 1000) -> Iterator[List[Record]]:
+        """
+        Yields every record in file order, `batch_size` at a time. The lock is only held while
+        a batch is read, so writers aren't blocked for the length of a full export; records
+        deleted mid-export are skipped and updates show up if their batch hasn't been read yet.
+        """
+        with self._lock:
+            self._sync()
+            keys = list(self._index)  # references only, the rows themselves are read per batch
+        for start in range(0, len(keys), batch_size):
+            with self._lock:
+                self._sync()
+                with open(self.csv_path, 'rb') as fh:
+                    batch = [self._read(key, self._index[key], fh)
+                             for key in keys[start:start + batch_size] if key in self._index]
+            if batch:
+                yield batch
+
+    def columns(self) -> List[str]:
+        with self._lock:
+            self._sync()
+            return list(self._columns)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters for monitoring."""
+        with self._lock:
+            self._sync()
+            lookups = self._hits + self._misses
+            return {
+                'rows': len(self._index),
+                'columnar_view': self._view is not None,
+                'view_bytes_estimate': self._view_bytes,
+                'cache_max_bytes': self.cache_max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else None,
+                'reloads': self._reloads,
+                'pending_log_entries': self._log_entries,
+            }
+
+    # --- Writes ---
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Holds the thread lock and the inter-process write lock, with the store synced after acquiring them."""
+        with self._lock:
+            if self._write_depth:
+                self._write_depth += 1
+                try:
+                    yield
+                finally:
+                    self._write_depth -= 1
+                return
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._write_depth = 1
+                try:
+                    # Other processes may have written while we waited
+                    self._sync()
+                    yield
+                finally:
+                    self._write_depth = 0
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def insert_many(self, records: List[Record]) -> None:
+        """Appends new records to the CSV. Raises DuplicateKeyError if any adsh already exists."""
+        with self._writing():
+            counts = Counter(record[KEY_COLUMN] for record in records)
+            duplicates = sorted(key for key, n in counts.items() if n > 1 or key in self._index)
+            if duplicates:
+                raise DuplicateKeyError(duplicates)
+            self._insert(records)
+
+    def insert_new(self, records: List[Record]) -> List[bool]:
+        """
+        Appends the records whose adsh isn't stored yet (the first one wins within the batch)
+        and returns, per record, whether it was inserted.
+        """
+        with self._writing():
+            seen = set()
+            inserted = []
+            for record in records:
+                key = record[KEY_COLUMN]
+                inserted.append(key not in self._index and key not in seen)
+                seen.add(key)
+            self._insert([record for record, ok in zip(records, inserted) if ok])
+            return inserted
+
+    def _insert(self, records: List[Record]) -> None:
+        # Records with columns the CSV header doesn't have can't be appended as rows,
+        # so they go through the write log and widen the header at the next compaction.
+        # So do re-inserts of deleted keys: the CSV is replayed before the log, so an
+        # appended row would be removed again by the logged delete on the next load.
+        file_columns = set(self._columns[:self._file_width]) if self._file_width else None
+        appendable, logged = [], []
+        for record in records:
+            if record[KEY_COLUMN] in self._logged_deletes or (file_columns is not None and not set(record) <= file_columns):
+                logged.append(record)
+            else:
+                appendable.append(record)
+
+        if appendable:
+            self._append_rows(appendable)
+        for record in logged:
+            self._log({'op': 'put', 'record': record})
+        self._maybe_compact()
+
+    def _append_rows(self, records: List[Record]) -> None:
+        self.csv_path.parent.mkdir(parents=True, exist_ok=True)
+        new_file = not self._file_width
+        with open(self.csv_path, 'ab+') as fh:
+            fh.seek(0, os.SEEK_END)
+            if new_file:
+                # Empty or missing file: the first batch defines the header
+                fh.truncate(0)
+                columns = list(dict.fromkeys(column for record in records for column in record))
+                fh.write(_encode_row(columns))
+            else:
+                columns = self._columns[:self._file_width]
+                if fh.tell() > 0:
+                    fh.seek(-1, os.SEEK_END)
+                    if fh.read(1) != b'\n':
+                        fh.write(b'\n')
+            fh.write(b''.join(_encode_row(_format_value(r.get(column)) for column in columns) for r in records))
+        for record in records:
+            self._observe(record)
+        if new_file:
+            self._loaded = False
+        self._sync()
+
+    def update(self, adsh: str, changes: Record) -> Optional[Record]:
+        """Applies `changes` to an existing record. Returns the updated record, or None if it doesn't exist."""
+        with self._writing():
+            location = self._index.get(adsh)
+            if location is None:
+                return None
+            record = {**self._read(adsh, location), **changes, KEY_COLUMN: adsh}
+            self._log({'op': 'put', 'record': record})
+            self._maybe_compact()
+            return record
+
+    def delete(self, adsh: str) -> bool:
+        """Deletes a record. Returns False if it doesn't exist."""
+        with self._writing():
+            if adsh not in self._index:
+                return False
+            self._log({'op': 'delete', KEY_COLUMN: adsh})
+            self._maybe_compact()
+            return True
+
+    def _log(self, entry: Dict[str, Any]) -> None:
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, 'a', encoding='utf-8') as fh:
+            fh.write(json.dumps(entry) + '\n')
+        # Applied by reading the log tail, which also picks up entries other processes appended
+        self._sync()
+
+    def _add_sorted_keys(self, keys: List[str]) -> None:
+        if len(keys) < 64:
+            for key in keys:
+                bisect.insort(self._sorted_keys, key)
+        else:
+            self._sorted_keys.extend(keys)
+            self._sorted_keys.sort()
+
+    # --- Compaction ---
+
+    def _maybe_compact(self) -> None:
+        if self._log_entries >= self.compact_threshold:
+            self.compact()
+
+    def compact(self) -> None:
+        """Folds the write log back into the CSV (atomic rename) and truncates the log."""
+        if not self.log_path.exists():
+            return
+        with self._writing():
+            if not self.log_path.exists():
+                return  # compacted by another process meanwhile
+            widened = len(self._columns) != self._file_width
+            tmp_path = self.csv_path.with_name(self.csv_path.name + '.tmp')
+            src = open(self.csv_path, 'rb') if self.csv_path.exists() else None
+            try:
+                with open(tmp_path, 'wb') as out:
+                    out.write(_encode_row(self._columns))
+                    for location in self._index.values():
+                        if isinstance(location, tuple):
+                            src.seek(location[0])
+                            data = src.read(location[1])
+                            if widened:
+                                values = _parse_row(data)
+                                data = _encode_row(values + [''] * (len(self._columns) - len(values)))
+                            elif not data.endswith(b'\n'):
+                                data += b'\n'
+                        else:
+                            data = _encode_row(_format_value(location.get(column)) for column in self._columns)
+                        out.write(data)
+            finally:
+                if src is not None:
+                    src.close()
+            os.replace(tmp_path, self.csv_path)
+            self.log_path.unlink()
+            # Row offsets and the columnar view are stale now, rebuild from the compacted file
+            self._loaded = False
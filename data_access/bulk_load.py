@@ -0,0 +1,69 @@
+"""
+Bulk loading of DataFrames into the SQLite warehouse.
+
+Bypasses the ORM: rows go straight from the DataFrame to the DB-API cursor with
+`executemany`, in batches, inside a single transaction on a connection whose
+pragmas are tuned for loading (and restored afterwards). The transaction is opened
+explicitly: sqlite3 only begins one implicitly at the first DML statement, so DDL
+issued before it (dropping indexes, say) would otherwise commit on its own.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Union
+
+import pandas as pd
+from sqlalchemy.engine import Engine
+
+BULK_INSERT_BATCH_ROWS = int(os.environ.get('BULK_INSERT_BATCH_ROWS', 50_000))
+
+# Durability is traded for speed only while loading: a crash mid-load rolls back
+# the transaction and the load is simply re-run.
+LOAD_PRAGMAS: Dict[str, Union[int, str]] = {
+    'synchronous': 'OFF',
+    'temp_store': 'MEMORY',
+    'cache_size': -256 * 1024,  # KiB, i.e. 256 MB of page cache
+}
+
+@contextmanager
+def bulk_load_connection(engine: Engine) -> Iterator:
+    """
+    A raw DB-API connection with LOAD_PRAGMAS applied and a transaction open,
+    so DDL and DML alike are part of it. The caller commits; anything left
+    uncommitted is rolled back, and the previous pragma values are restored
+    before the connection goes back to the pool.
+    """
+    raw = engine.raw_connection()
+    cursor = raw.cursor()
+    previous = {name: cursor.execute(f"PRAGMA {name}").fetchone()[0] for name in LOAD_PRAGMAS}
+    for name, value in LOAD_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    try:
+        cursor.execute("BEGIN")
+        yield raw
+    finally:
+        raw.rollback()
+        for name, value in previous.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+        raw.close()
+
+def bulk_insert(raw_connection, table_name: str, df: pd.DataFrame, batch_size: int = BULK_INSERT_BATCH_ROWS) -> int:
+    """
+    Inserts every row of `df` into `table_name` (columns matched by name) with
+    `executemany` in batches of `batch_size`, and returns the number of rows.
+    Runs inside the connection's current transaction; does not commit.
+    """
+    columns = list(df.columns)
+    sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    started = time.perf_counter()
+    cursor = raw_connection.cursor()
+    try:
+        for start in range(0, len(df), batch_size):
+            # itertuples yields native Python scalars, which sqlite3 binds directly
+            cursor.executemany(sql, df.iloc[start:start + batch_size].itertuples(index=False, name=None))
+    finally:
+        cursor.close()
+    elapsed = time.perf_counter() - started
+    print(f"  - Inserted {len(df):,} rows into {table_name} in {elapsed:.2f}s ({len(df) / elapsed if elapsed else 0:,.0f} rows/s)")
+    return len(df)
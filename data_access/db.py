@@ -1,10 +1,47 @@
+from sqlalchemy import event
 from sqlmodel import SQLModel, create_engine
 from .models import *
 
 import os
 
 DB_FILE = os.environ.get('SQLITE_FILE', 'data/warehouse.db')
+SQLITE_CACHE_SIZE_MB = int(os.environ.get('SQLITE_CACHE_SIZE_MB', 64))
+SQLITE_MMAP_SIZE_MB = int(os.environ.get('SQLITE_MMAP_SIZE_MB', 256))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+API_DB_POOL_SIZE = int(os.environ.get('API_DB_POOL_SIZE', 8))
+
+# Applied to every new connection. In WAL mode readers never block the writer (or each
+# other), and synchronous=NORMAL is still crash-safe; only the writer may switch modes.
+_COMMON_PRAGMAS = {
+    'cache_size': -SQLITE_CACHE_SIZE_MB * 1024,  # negative = KiB
+    'mmap_size': SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': SQLITE_BUSY_TIMEOUT_MS,
+}
+WRITER_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', **_COMMON_PRAGMAS}
+READER_PRAGMAS = {'query_only': 'ON', **_COMMON_PRAGMAS}
+
+def _apply_pragmas(engine, pragmas: dict) -> None:
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+# Writer engine: ETL loads and schema management
 engine = create_engine(f'sqlite:///{DB_FILE}', echo=False)
+_apply_pragmas(engine, WRITER_PRAGMAS)
+
+# Read-only pooled engine for the API, so dashboard queries run alongside ETL loads
+read_engine = create_engine(
+    f'sqlite:///file:{DB_FILE}?mode=ro&uri=true',
+    echo=False,
+    pool_size=API_DB_POOL_SIZE,
+    max_overflow=API_DB_POOL_SIZE,
+    connect_args={'check_same_thread': False},
+)
+_apply_pragmas(read_engine, READER_PRAGMAS)
 
 def create_db_and_tables():
     print("Dropping all tables...")
@@ -15,4 +52,3 @@ def create_db_and_tables():
 if __name__ == '__main__':
     create_db_and_tables()
     print('DB and tables created at', DB_FILE)
- 
\ No newline at end of file
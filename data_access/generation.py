@@ -0,0 +1,30 @@
+"""
+The warehouse generation: a counter the ETL bumps in the same transaction as every
+change to the gold tables, so readers can tell whether cached results are still current.
+"""
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from .models import WarehouseGeneration
+
+_TABLE = WarehouseGeneration.__tablename__
+
+def bump_generation(conn) -> None:
+    """Increments the generation on a raw DB-API connection, inside its current transaction."""
+    conn.execute(f"""
+        INSERT INTO {_TABLE} (id, generation, updated_at) VALUES (1, 1, ?)
+        ON CONFLICT (id) DO UPDATE SET generation = generation + 1, updated_at = excluded.updated_at
+    """, (datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f'),))
+
+def read_generation(engine: Engine) -> int:
+    """The current generation (0 for a warehouse no ETL run has bumped yet)."""
+    try:
+        with engine.connect() as conn:
+            generation = conn.execute(text(f"SELECT generation FROM {_TABLE} WHERE id = 1")).scalar()
+    except OperationalError:
+        # Table not created yet
+        return 0
+    return generation or 0
@@ -0,0 +1,117 @@
+"""
+Managed secondary indexes for the star schema.
+
+The indexes aren't declared on the models, so `create_all` doesn't build them up front:
+the Silver to Gold load drops the fact table's indexes before a full reload and
+(re)creates the whole set once the data is in, which is much faster than maintaining
+them row by row during the bulk insert.
+
+    python -m data_access.indexes create    # create missing indexes and ANALYZE
+    python -m data_access.indexes drop      # drop them all
+    python -m data_access.indexes explain   # EXPLAIN QUERY PLAN for representative queries, flagging full scans
+"""
+import argparse
+import sys
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from .db import engine
+
+
+class Index(NamedTuple):
+    name: str
+    table: str
+    columns: Tuple[str, ...]
+
+
+INDEXES: List[Index] = [
+    # Fact foreign keys. company_id and tag_id lead the composite covering indexes below.
+    Index('ix_fact_filing', 'factfinancials', ('filing_id',)),
+    Index('ix_fact_date', 'factfinancials', ('date_id',)),
+    Index('ix_fact_statement', 'factfinancials', ('statement_id',)),
+    # Covering indexes (value included) for company -> tag -> date and tag -> date -> company access
+    Index('ix_fact_company_tag_date', 'factfinancials', ('company_id', 'tag_id', 'date_id', 'value')),
+    Index('ix_fact_tag_date_company', 'factfinancials', ('tag_id', 'date_id', 'company_id', 'value')),
+    # Filters of the company totals endpoint; the primary key covers company-first access
+    Index('ix_agg_tag', 'aggcompanytotals', ('tag_id', 'company_id', 'total_value')),
+    Index('ix_agg_statement', 'aggcompanytotals', ('statement_id', 'company_id', 'total_value')),
+    Index('ix_agg_date', 'aggcompanytotals', ('date_id', 'company_id', 'total_value')),
+    # Dimension lookups: totals GROUP BY name, current-version and as-of lookups by CIK
+    Index('ix_companydim_name', 'companydim', ('name',)),
+    Index('ix_companydim_cik_current', 'companydim', ('cik', 'is_current')),
+]
+
+# Representative warehouse queries, as run by the API and the ETL
+EXPLAIN_QUERIES = {
+    'company totals': """
+        SELECT c.name, SUM(a.total_value) AS total_value FROM aggcompanytotals a
+        JOIN companydim c ON a.company_id = c.id
+        GROUP BY c.name ORDER BY total_value DESC LIMIT 10""",
+    'company totals by tag and date range': """
+        SELECT c.name, SUM(a.total_value) AS total_value FROM aggcompanytotals a
+        JOIN companydim c ON a.company_id = c.id
+        JOIN tagdim t ON a.tag_id = t.id
+        JOIN datedim d ON a.date_id = d.id
+        WHERE t.tag = 'Revenues' AND d.date_key BETWEEN '20230101' AND '20231231'
+        GROUP BY c.name ORDER BY total_value DESC LIMIT 10""",
+    'facts of a company by tag and date': """
+        SELECT t.tag, d.date_key, f.value FROM factfinancials f
+        JOIN tagdim t ON f.tag_id = t.id
+        JOIN datedim d ON f.date_id = d.id
+        WHERE f.company_id = 1 AND f.tag_id = 1""",
+    'tag totals per company': """
+        SELECT f.company_id, SUM(f.value) FROM factfinancials f
+        JOIN tagdim t ON f.tag_id = t.id
+        WHERE t.tag = 'Revenues' GROUP BY f.company_id""",
+    'facts of a filing (incremental reload)': """
+        SELECT company_id, tag_id, date_id, statement_id FROM factfinancials WHERE filing_id = 1""",
+    'current company version': """
+        SELECT id FROM companydim WHERE cik = '320193' AND is_current = 1""",
+}
+
+def _select(table: Optional[str]) -> Iterable[Index]:
+    return [index for index in INDEXES if table is None or index.table == table]
+
+def create_indexes(conn, table: Optional[str] = None, analyze: bool = True) -> None:
+    """Creates the managed indexes (of one table, or all) that don't exist yet, on a raw DB-API connection."""
+    for index in _select(table):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index.name} ON {index.table} ({', '.join(index.columns)})")
+    if analyze:
+        # Fresh statistics so the planner actually picks the indexes
+        conn.execute("ANALYZE")
+
+def drop_indexes(conn, table: Optional[str] = None) -> None:
+    for index in _select(table):
+        conn.execute(f"DROP INDEX IF EXISTS {index.name}")
+
+def explain(conn) -> int:
+    """Prints the query plan of every EXPLAIN_QUERIES entry and returns the number of full table scans."""
+    full_scans = 0
+    for title, query in EXPLAIN_QUERIES.items():
+        print(f"\n{title}:")
+        for _, _, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall():
+            # "SCAN <table>" without an index is a full table scan; index scans read "SCAN ... USING ... INDEX"
+            is_full_scan = detail.startswith('SCAN') and 'INDEX' not in detail
+            full_scans += is_full_scan
+            print(f"  {'⚠ FULL SCAN ' if is_full_scan else ''}{detail}")
+    return full_scans
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manage warehouse indexes")
+    parser.add_argument("command", choices=["create", "drop", "explain"])
+    args = parser.parse_args()
+    raw = engine.raw_connection()
+    try:
+        if args.command == "create":
+            create_indexes(raw)
+            raw.commit()
+            print(f"✓ {len(INDEXES)} indexes present.")
+        elif args.command == "drop":
+            drop_indexes(raw)
+            raw.commit()
+            print(f"✓ Dropped {len(INDEXES)} managed indexes.")
+        else:
+            full_scans = explain(raw)
+            print(f"\n{full_scans} full table scan(s) in {len(EXPLAIN_QUERIES)} queries.")
+            sys.exit(1 if full_scans else 0)
+    finally:
+        raw.close()
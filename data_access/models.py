@@ -63,4 +63,33 @@ class FactFinancials(SQLModel, table=True):
     company_id: Optional[int] = Field(default=None, foreign_key="companydim.id")
     tag_id: Optional[int] = Field(default=None, foreign_key="tagdim.id")
     date_id: Optional[int] = Field(default=None, foreign_key="datedim.id")
-    statement_id: Optional[int] = Field(default=None, foreign_key="statementdim.id")
\ No newline at end of file
+    statement_id: Optional[int] = Field(default=None, foreign_key="statementdim.id")
+
+# --- ETL Bookkeeping ---
+
+class FactLoadWatermark(SQLModel, table=True):
+    """One row per filing whose facts are loaded, with a hash of those facts, so reloads only touch changed filings."""
+    __tablename__ = 'factloadwatermark'
+    filing_id: int = Field(primary_key=True, foreign_key="filingdim.id")
+    facts_hash: str  # order-independent hash of the filing's fact rows
+    fact_count: int
+    loaded_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+
+class WarehouseGeneration(SQLModel, table=True):
+    """Single-row counter bumped by every ETL commit that changes query results; API caches key on it."""
+    __tablename__ = 'warehousegeneration'
+    id: int = Field(default=1, primary_key=True)
+    generation: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+
+# --- Aggregates ---
+
+class AggCompanyTotals(SQLModel, table=True):
+    """Materialized SUM/COUNT of fact values per company x tag x date x statement, kept current by the fact load."""
+    __tablename__ = 'aggcompanytotals'
+    company_id: int = Field(primary_key=True, foreign_key="companydim.id")
+    tag_id: int = Field(primary_key=True, foreign_key="tagdim.id")
+    date_id: int = Field(primary_key=True, foreign_key="datedim.id")
+    statement_id: int = Field(primary_key=True, foreign_key="statementdim.id")
+    total_value: float
+    fact_count: int
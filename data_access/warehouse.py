@@ -0,0 +1,344 @@
+"""
+Analytical query backends for the gold layer, selected with WAREHOUSE_BACKEND.
+
+- `sqlite` (default): queries the SQLite warehouse through the read-only engine,
+  using the materialized AggCompanyTotals table.
+- `duckdb`: queries a Parquet export of the gold tables with an embedded DuckDB,
+  aggregating the facts directly. Facts are exported hive-partitioned by year,
+  so date filters skip whole partitions.
+
+    python -m data_access.warehouse export   # export the gold tables to GOLD_PARQUET_DIR
+    python -m data_access.warehouse parity   # compare both backends' results on sample queries
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from sqlmodel import Session, func, select
+
+from . import analytics
+from .analytics import AnalyticsQuery
+from .db import read_engine
+from .generation import read_generation
+from .models import AggCompanyTotals, CompanyDim, DateDim, StatementDim, TagDim
+
+WAREHOUSE_BACKEND = os.environ.get('WAREHOUSE_BACKEND', 'sqlite')
+GOLD_PARQUET_DIR = Path(os.environ.get('GOLD_PARQUET_DIR', 'data/gold/parquet'))
+EXPORT_BATCH_ROWS = int(os.environ.get('GOLD_EXPORT_BATCH_ROWS', 1_000_000))
+EXPORT_MANIFEST = '_export.json'
+
+DIMENSION_TABLES = ['companydim', 'filingdim', 'tagdim', 'datedim', 'statementdim']
+FACT_TABLE = 'factfinancials'
+
+# (company name, total value) rows, largest total first
+CompanyTotalsRows = List[Tuple[str, float]]
+# Result rows and the cursor of the next page
+AnalyticsPage = Tuple[List[Dict[str, Any]], Optional[str]]
+# How often (in SQLite VM instructions) the analytics budget is checked
+PROGRESS_HANDLER_STEPS = 10_000
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+
+    def generation(self) -> int:
+        return read_generation(read_engine)
+
+    def company_totals(self, limit: int, tag: Optional[str] = None, statement_code: Optional[str] = None,
+                       date_from: Optional[date] = None, date_to: Optional[date] = None) -> CompanyTotalsRows:
+        """Top companies by total reported value, read from the AggCompanyTotals materialized table."""
+        total_value = func.sum(AggCompanyTotals.total_value)
+        statement = select(CompanyDim.name, total_value.label("total_value")).join(CompanyDim, AggCompanyTotals.company_id == CompanyDim.id)
+        if tag is not None:
+            statement = statement.join(TagDim, AggCompanyTotals.tag_id == TagDim.id).where(TagDim.tag == tag)
+        if statement_code is not None:
+            statement = statement.join(StatementDim, AggCompanyTotals.statement_id == StatementDim.id).where(StatementDim.statement_code == statement_code)
+        if date_from is not None or date_to is not None:
+            # date_key is YYYYMMDD, so string comparison orders dates correctly
+            statement = statement.join(DateDim, AggCompanyTotals.date_id == DateDim.id)
+            if date_from is not None:
+                statement = statement.where(DateDim.date_key >= date_from.strftime('%Y%m%d'))
+            if date_to is not None:
+                statement = statement.where(DateDim.date_key <= date_to.strftime('%Y%m%d'))
+        statement = statement.group_by(CompanyDim.name).order_by(total_value.desc()).limit(limit)
+        with Session(read_engine) as session:
+            return [(name, value) for name, value in session.exec(statement).all()]
+
+    def aggregate_facts(self, query: AnalyticsQuery) -> AnalyticsPage:
+        """Runs an analytics query, aborting it once it exceeds the time or VM step budget."""
+        compiled = analytics.compile_query(query)
+        deadline = time.monotonic() + analytics.ANALYTICS_TIMEOUT_SECONDS
+        steps, exceeded = 0, []
+
+        def check_budget() -> int:
+            # A non-zero return makes SQLite interrupt the statement
+            nonlocal steps
+            steps += PROGRESS_HANDLER_STEPS
+            if steps > analytics.ANALYTICS_MAX_VM_STEPS:
+                exceeded.append(f"Query exceeded the scan budget of {analytics.ANALYTICS_MAX_VM_STEPS:,} steps; narrow its filters")
+            elif time.monotonic() > deadline:
+                exceeded.append(f"Query exceeded the time limit of {analytics.ANALYTICS_TIMEOUT_SECONDS:g}s")
+            return 1 if exceeded else 0
+
+        raw = read_engine.raw_connection()
+        conn = raw.driver_connection
+        conn.set_progress_handler(check_budget, PROGRESS_HANDLER_STEPS)
+        try:
+            rows = conn.execute(compiled.sql, compiled.params).fetchall()
+        except sqlite3.OperationalError:
+            if exceeded:
+                raise analytics.QueryCostExceeded(exceeded[0])
+            raise
+        finally:
+            # The connection goes back to the pool
+            conn.set_progress_handler(None, 0)
+            raw.close()
+        return analytics.page(query, compiled, rows)
+
+
+class DuckDBBackend:
+    """Runs queries with DuckDB over the Parquet export; the export can be swapped underneath it at any time."""
+    name = 'duckdb'
+
+    def __init__(self, parquet_dir: Path = GOLD_PARQUET_DIR):
+        import duckdb  # only needed when this backend is selected
+        self._duckdb = duckdb
+        self.parquet_dir = Path(parquet_dir)
+        self._con = duckdb.connect(database=':memory:')
+        self._lock = threading.Lock()
+        self._views_for: Optional[float] = None
+
+    def generation(self) -> int:
+        exported = export_generation(self.parquet_dir)
+        return 0 if exported is None else exported
+
+    def _cursor(self):
+        """A per-call cursor (DuckDB connections aren't shared across threads), with views over the current export."""
+        manifest = self.parquet_dir / EXPORT_MANIFEST
+        if not manifest.exists():
+            raise RuntimeError(f"No gold Parquet export at {self.parquet_dir}; run `python -m data_access.warehouse export`")
+        with self._lock:
+            exported_at = manifest.stat().st_mtime
+            if self._views_for != exported_at:
+                for table in DIMENSION_TABLES:
+                    self._con.execute(f"CREATE OR REPLACE VIEW {table} AS SELECT * FROM read_parquet('{self.parquet_dir / table}.parquet')")
+                self._con.execute(f"CREATE OR REPLACE VIEW {FACT_TABLE} AS SELECT * FROM read_parquet("
+                                  f"'{self.parquet_dir / FACT_TABLE}/**/*.parquet', hive_partitioning = true)")
+                self._views_for = exported_at
+            return self._con.cursor()
+
+    def company_totals(self, limit: int, tag: Optional[str] = None, statement_code: Optional[str] = None,
+                       date_from: Optional[date] = None, date_to: Optional[date] = None) -> CompanyTotalsRows:
+        """Top companies by total reported value, aggregated straight from the facts."""
+        joins, conditions, params = [], [], []
+        if tag is not None:
+            joins.append("JOIN tagdim t ON f.tag_id = t.id")
+            conditions.append("t.tag = ?")
+            params.append(tag)
+        if statement_code is not None:
+            joins.append("JOIN statementdim s ON f.statement_id = s.id")
+            conditions.append("s.statement_code = ?")
+            params.append(statement_code)
+        if date_from is not None or date_to is not None:
+            joins.append("JOIN datedim d ON f.date_id = d.id")
+            if date_from is not None:
+                # The partition column lets DuckDB skip whole years
+                conditions += ["f.year >= ?", "d.date_key >= ?"]
+                params += [date_from.year, date_from.strftime('%Y%m%d')]
+            if date_to is not None:
+                conditions += ["f.year <= ?", "d.date_key <= ?"]
+                params += [date_to.year, date_to.strftime('%Y%m%d')]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT c.name, SUM(f.value) AS total_value
+            FROM {FACT_TABLE} f JOIN companydim c ON f.company_id = c.id {' '.join(joins)}
+            {where}
+            GROUP BY c.name ORDER BY total_value DESC LIMIT ?"""
+        return [(name, value) for name, value in self._cursor().execute(query, params + [limit]).fetchall()]
+
+    def aggregate_facts(self, query: AnalyticsQuery) -> AnalyticsPage:
+        """
+        Runs an analytics query, interrupting it at the time limit. There's no scan budget:
+        the columnar scan only reads the referenced columns of the year partitions in range.
+        """
+        compiled = analytics.compile_query(query, year_column='year')
+        cursor = self._cursor()
+        timer = threading.Timer(analytics.ANALYTICS_TIMEOUT_SECONDS, cursor.interrupt)
+        timer.start()
+        try:
+            rows = cursor.execute(compiled.sql, compiled.params).fetchall()
+        except self._duckdb.InterruptException:
+            raise analytics.QueryCostExceeded(f"Query exceeded the time limit of {analytics.ANALYTICS_TIMEOUT_SECONDS:g}s")
+        finally:
+            timer.cancel()
+        return analytics.page(query, compiled, rows)
+
+
+_backends: Dict[str, Any] = {}
+
+def get_backend(name: str = WAREHOUSE_BACKEND):
+    """The (process-wide) backend instance for `name`."""
+    if name not in _backends:
+        backends = {'sqlite': SQLiteBackend, 'duckdb': DuckDBBackend}
+        if name not in backends:
+            raise ValueError(f"Unknown WAREHOUSE_BACKEND '{name}', expected one of: {', '.join(backends)}")
+        _backends[name] = backends[name]()
+    return _backends[name]
+
+# --- Parquet export ---
+
+def export_generation(out_dir: Path = GOLD_PARQUET_DIR) -> Optional[int]:
+    """The warehouse generation the export in `out_dir` was taken at (None if there's no export)."""
+    manifest = Path(out_dir) / EXPORT_MANIFEST
+    if not manifest.exists():
+        return None
+    return json.loads(manifest.read_text())['generation']
+
+def _iter_fact_batches(conn, batch_rows: int) -> Iterator[pa.RecordBatch]:
+    schema = pa.schema([('id', pa.int64()), ('value', pa.float64()), ('filing_id', pa.int64()), ('company_id', pa.int64()),
+                        ('tag_id', pa.int64()), ('date_id', pa.int64()), ('statement_id', pa.int64()), ('year', pa.int32())])
+    cursor = conn.execute(f"""
+        SELECT f.id, f.value, f.filing_id, f.company_id, f.tag_id, f.date_id, f.statement_id,
+               CAST(substr(d.date_key, 1, 4) AS INTEGER) AS year
+        FROM {FACT_TABLE} f LEFT JOIN datedim d ON f.date_id = d.id""")
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+def export_parquet(out_dir: Path = GOLD_PARQUET_DIR, batch_rows: int = EXPORT_BATCH_ROWS) -> Dict[str, int]:
+    """
+    Exports the gold tables to `out_dir`: one file per dimension and the facts partitioned by year
+    (`factfinancials/year=YYYY/`). Written next to the live export and swapped in with renames,
+    so readers never see a partial export. Returns the row count per table.
+    """
+    started = time.perf_counter()
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + '.tmp')
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    counts = {}
+    raw = read_engine.raw_connection()
+    conn = raw.driver_connection  # the sqlite3 connection, which pandas reads from directly
+    try:
+        # One read transaction, so all tables come from the same snapshot
+        conn.execute("BEGIN")
+        generation = conn.execute("SELECT generation FROM warehousegeneration WHERE id = 1").fetchone()
+        for table in DIMENSION_TABLES:
+            df = pd.read_sql(f"SELECT * FROM {table}", conn)
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_dir / f"{table}.parquet")
+            counts[table] = len(df)
+        counts[FACT_TABLE] = 0
+
+        def counted(batches):
+            for batch in batches:
+                counts[FACT_TABLE] += batch.num_rows
+                yield batch
+        batches = counted(_iter_fact_batches(conn, batch_rows))
+        first = next(batches, None)
+        if first is not None:
+            ds.write_dataset(
+                (b for chunk in ([first], batches) for b in chunk), tmp_dir / FACT_TABLE, schema=first.schema,
+                format='parquet', partitioning=['year'], partitioning_flavor='hive',
+                max_rows_per_group=batch_rows, existing_data_behavior='overwrite_or_ignore')
+        else:
+            (tmp_dir / FACT_TABLE).mkdir()
+        conn.rollback()
+    finally:
+        raw.close()
+
+    (tmp_dir / EXPORT_MANIFEST).write_text(json.dumps({'generation': generation[0] if generation else 0, 'rows': counts}, indent=2))
+    old_dir = out_dir.with_name(out_dir.name + '.old')
+    if out_dir.exists():
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    print(f"✓ Exported gold tables to {out_dir} in {time.perf_counter() - started:.2f}s: {counts}")
+    return counts
+
+# --- Parity check ---
+
+def _parity_cases(limit: int = 20) -> List[Dict[str, Any]]:
+    """Unfiltered totals plus every filter, with values picked from the data."""
+    with read_engine.connect() as conn:
+        tag = conn.execute(text("SELECT t.tag FROM tagdim t JOIN aggcompanytotals a ON a.tag_id = t.id LIMIT 1")).scalar()
+        statement_code = conn.execute(text("SELECT statement_code FROM statementdim LIMIT 1")).scalar()
+        low, high = conn.execute(text("SELECT MIN(date_key), MAX(date_key) FROM datedim")).one()
+    cases = [{'limit': limit}, {'limit': 1}, {'limit': limit, 'tag': tag}, {'limit': limit, 'statement_code': statement_code},
+             {'limit': limit, 'tag': '__no_such_tag__'}]
+    if low and high:
+        middle = pd.Timestamp(low) + (pd.Timestamp(high) - pd.Timestamp(low)) / 2
+        cases += [{'limit': limit, 'date_from': middle.date()}, {'limit': limit, 'date_to': middle.date()},
+                  {'limit': limit, 'tag': tag, 'date_from': pd.Timestamp(low).date(), 'date_to': middle.date()}]
+    return cases
+
+def _analytics_parity_cases(limit: int = 50) -> List[AnalyticsQuery]:
+    return [AnalyticsQuery(limit=limit), AnalyticsQuery(group_by=('company',), limit=limit),
+            AnalyticsQuery(group_by=('tag', 'statement'), metric='count', limit=limit),
+            AnalyticsQuery(group_by=('date',), metric='avg', descending=False, limit=limit),
+            AnalyticsQuery(group_by=('company', 'filing'), metric='max', form_type='10-K', limit=limit)]
+
+def _set_fields(query: AnalyticsQuery) -> Dict[str, Any]:
+    return {name: value for name, value in query._asdict().items() if value not in (None, ())}
+
+def _as_totals(rows: CompanyTotalsRows) -> Dict[Any, float]:
+    return dict(rows)
+
+def _as_groups(page: AnalyticsPage) -> Dict[Any, float]:
+    return {tuple(value for column, value in row.items() if column not in ('value', 'fact_count')): row['value'] for row in page[0]}
+
+def check_parity(rel_tol: float = 1e-9) -> int:
+    """Runs the parity cases on both backends and prints mismatches. Returns the number of failing cases."""
+    sqlite_backend, duckdb_backend = get_backend('sqlite'), get_backend('duckdb')
+    if sqlite_backend.generation() != duckdb_backend.generation():
+        print(f"⚠ Parquet export is at generation {duckdb_backend.generation()}, SQLite at {sqlite_backend.generation()}; re-export first.")
+    cases = [(f"company totals {case}", lambda backend, case=case: _as_totals(backend.company_totals(**case)))
+             for case in _parity_cases()]
+    cases += [(f"analytics {_set_fields(query)}", lambda backend, query=query: _as_groups(backend.aggregate_facts(query)))
+              for query in _analytics_parity_cases()]
+    failures = 0
+    for title, run in cases:
+        timings, results = {}, {}
+        for backend in (sqlite_backend, duckdb_backend):
+            started = time.perf_counter()
+            results[backend.name] = run(backend)
+            timings[backend.name] = time.perf_counter() - started
+        expected, actual = results['sqlite'], results['duckdb']
+        # Ties in the metric can be ordered differently, so compare as group -> value maps
+        same = expected.keys() == actual.keys() and all(
+            math.isclose(value, actual[key], rel_tol=rel_tol) for key, value in expected.items())
+        failures += not same
+        print(f"{'✓' if same else '✗'} {title}: sqlite {timings['sqlite'] * 1000:.1f} ms, duckdb {timings['duckdb'] * 1000:.1f} ms")
+        if not same:
+            print(f"    sqlite: {expected}\n    duckdb: {actual}")
+    return failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gold layer analytical backends")
+    parser.add_argument("command", choices=["export", "parity"])
+    args = parser.parse_args()
+    if args.command == "export":
+        export_parquet()
+    else:
+        failures = check_parity()
+        print(f"\n{'✓ Backends agree' if not failures else f'✗ {failures} case(s) differ'}")
+        sys.exit(1 if failures else 0)
@@ -1,38 +1,165 @@
+import argparse
+import hashlib
+import io
+import json
+import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from pathlib import Path
-import PyPDF2
 import shutil
-import warnings
-
-# Suppress specific warnings from PyPDF2 for cleaner output
-warnings.filterwarnings("ignore", category=PyPDF2.errors.PdfReadWarning)
-
-def extract_text_from_pdf(pdf_path: Path) -> str:
-    """Extracts all text content from a given PDF file."""
-    text = ""
-    try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-    except Exception as e:
-        print(f"  - Warning: Could not read {pdf_path.name}. Error: {e}")
-    return text
-
-def main():
+from typing import Dict, List, Optional
+from data_access.bronze_store import SubmissionStore
+from etl.csv_to_parquet import BatchTransform, convert_csv_to_parquet
+from etl.pdf_text import extract_texts, PDF_EXTRACT_WORKERS
+
+# Silver tables are directories of Parquet part files, one part per ingest batch:
+#   data/silver/<table>/part-<batch>.parquet
+# The manifest records, per bronze input, how much of it has been processed.
+ROOT_DIR = Path(__file__).resolve().parent.parent
+MANIFEST_NAME = "_manifest.json"
+MANIFEST_VERSION = 3
+# Bytes hashed at each end of the processed part of a bronze CSV to tell an append from a rewrite
+FINGERPRINT_WINDOW_BYTES = 1024 * 1024
+COMPACT_AFTER_PARTS = int(os.environ.get('SILVER_COMPACT_AFTER_PARTS', 20))
+
+# --- Manifest ---
+
+def load_manifest(silver_dir: Path) -> Optional[dict]:
+    manifest_path = silver_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    manifest = json.loads(manifest_path.read_text())
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+def save_manifest(silver_dir: Path, manifest: dict) -> None:
+    tmp_path = silver_dir / f"{MANIFEST_NAME}.tmp"
+    tmp_path.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp_path, silver_dir / MANIFEST_NAME)
+
+def _sha256_prefix(path: Path, nbytes: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        remaining = nbytes
+        while remaining > 0:
+            block = fh.read(min(1024 * 1024, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+def _prefix_fingerprint(path: Path, nbytes: int) -> str:
+    """
+    Hash of the first and last FINGERPRINT_WINDOW_BYTES of the first `nbytes` of `path` (all of
+    them when shorter). Rewrites of a bronze CSV change its header or shift the rows before the
+    processed offset, so the two windows tell them from appends without re-reading the history.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        head_end = min(nbytes, FINGERPRINT_WINDOW_BYTES)
+        digest.update(fh.read(head_end))
+        tail_start = max(head_end, nbytes - FINGERPRINT_WINDOW_BYTES)
+        fh.seek(tail_start)
+        digest.update(fh.read(nbytes - tail_start))
+    return digest.hexdigest()
+
+def _new_rows_offset(csv_path: Path, size: int, entry: Optional[dict]) -> Optional[int]:
+    """
+    Byte offset where unprocessed rows of `csv_path` (`size` bytes long) start, or None if the
+    file has to be reprocessed in full (never seen, shrunk, or its already-processed prefix changed).
+    """
+    if entry is None:
+        return None
+    if size < entry['bytes'] or _prefix_fingerprint(csv_path, entry['bytes']) != entry['fingerprint']:
+        return None
+    return entry['bytes']
+
+def _pdf_fingerprints(pdf_files: List[Path], previous: Dict[str, dict]) -> Dict[str, dict]:
+    """adsh -> {size, mtime_ns, sha256}; files whose size and mtime didn't change aren't re-hashed."""
+    fingerprints = {}
+    for pdf_file in pdf_files:
+        st = pdf_file.stat()
+        known = previous.get(pdf_file.stem)
+        if known and known['size'] == st.st_size and known['mtime_ns'] == st.st_mtime_ns:
+            fingerprints[pdf_file.stem] = known
+        else:
+            sha256 = _sha256_prefix(pdf_file, st.st_size)
+            fingerprints[pdf_file.stem] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': sha256}
+    return fingerprints
+
+# --- Reading & transforming ---
+
+def read_bronze_csv(csv_path: Path, start: int = 0, end: Optional[int] = None,
+                    usecols: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Reads the rows of a bronze CSV between byte offsets `start` and `end` (the end of the file
+    when None). The header is always taken from the top.
+    """
+    if start == 0:
+        with pa.OSFile(str(csv_path)) as fh:
+            return pd.read_csv(fh.get_stream(0, fh.size() if end is None else end), usecols=usecols)
+    with open(csv_path, 'rb') as fh:
+        header = fh.readline()
+        fh.seek(start)
+        return pd.read_csv(io.BytesIO(header + fh.read(-1 if end is None else end - start)), usecols=usecols)
+
+def attach_pdf_text(pdf_adsh: List[str], pdf_texts: List[Optional[str]]) -> BatchTransform:
+    """
+    Adds the extracted PDF text of each filing as an `extracted_pdf_text` column (null when
+    there is no PDF or its extraction failed).
+    """
+    adsh_array = pa.array(pdf_adsh, type=pa.string())
+    text_array = pa.array(pdf_texts, type=pa.string())
+
+    def transform(block: pa.Table) -> pa.Table:
+        positions = pc.index_in(block.column('adsh'), value_set=adsh_array)
+        return block.append_column('extracted_pdf_text', text_array.take(positions))
+    return transform
+
+def parse_ddate(block: pa.Table) -> pa.Table:
+    """Converts the YYYYMMDD integer `ddate` column to a timestamp."""
+    i = block.schema.get_field_index('ddate')
+    if i < 0:
+        return block
+    ddate = pc.strptime(pc.cast(block.column(i), pa.string()), format='%Y%m%d', unit='s')
+    return block.set_column(i, 'ddate', pc.cast(ddate, pa.timestamp('ns')))
+
+def part_schema(table_dir: Path) -> Optional[pa.Schema]:
+    """Schema of the table's existing part files, so new parts stay readable as one dataset."""
+    existing = sorted(table_dir.glob("part-*.parquet"))
+    return pq.read_schema(existing[0]) if existing else None
+
+def compact_table(table_dir: Path, parts: List[str], batch: int) -> str:
+    """
+    Merges the table's `parts` into a single part, streamed batch by batch so memory doesn't
+    grow with the table. The old parts are left in place: the caller deletes them once the
+    manifest lists only the new one (a run restarted before that drops unrecorded parts).
+    """
+    dataset = ds.dataset([str(table_dir / part) for part in parts], format='parquet')
+    part_name = f"part-{batch:05d}.parquet"
+    tmp_path = table_dir / f"{part_name}.tmp"
+    with pq.ParquetWriter(tmp_path, dataset.schema) as writer:
+        for record_batch in dataset.to_batches():
+            writer.write_batch(record_batch)
+    os.replace(tmp_path, table_dir / part_name)
+    return part_name
+
+def main(workers: Optional[int] = None, full: bool = False, compact: bool = False, root_dir: Path = ROOT_DIR):
     """
     Main ETL script to process data from the Bronze layer to the Silver layer.
+    By default only bronze rows and PDFs not processed by a previous run are transformed and
+    written as new part files; `full` rebuilds the Silver layer from scratch and `compact`
+    merges every table's parts into one. `workers` is the number of PDF extraction processes.
+    `root_dir` is the project directory holding `data/`.
     """
     print("--- Starting Bronze to Silver ETL Process ---")
 
     # --- 1. Set Up Paths ---
-    # Robustly define paths relative to the script's location
-    SCRIPT_DIR = Path(__file__).resolve().parent
-    ROOT_DIR = SCRIPT_DIR.parent
-    BRONZE_DIR = ROOT_DIR / "data" / "bronze"
-    SILVER_DIR = ROOT_DIR / "data" / "silver"
+    BRONZE_DIR = root_dir / "data" / "bronze"
+    SILVER_DIR = root_dir / "data" / "silver"
     STRUCTURED_BRONZE = BRONZE_DIR / "structured_filings"
     UNSTRUCTURED_BRONZE = BRONZE_DIR / "unstructured_filings_pdf"
 
@@ -40,60 +167,116 @@ def main():
     print(f"Target Silver directory: {SILVER_DIR}")
 
     # --- 2. Initialize Silver Directory ---
-    if SILVER_DIR.exists():
-        print(f"Removing existing Silver directory: {SILVER_DIR}")
-        shutil.rmtree(SILVER_DIR)
-    SILVER_DIR.mkdir(parents=True)
-    print("✓ Silver directory created.")
-
-    # --- 3. Load Structured Data ---
-    print("\nStep 1: Loading structured data from Bronze CSVs...")
-    dfs = {}
+    manifest = None if full else load_manifest(SILVER_DIR)
+    if manifest is None:
+        if SILVER_DIR.exists():
+            print(f"Removing existing Silver directory for a full rebuild: {SILVER_DIR}")
+            shutil.rmtree(SILVER_DIR)
+        SILVER_DIR.mkdir(parents=True)
+        manifest = {'version': MANIFEST_VERSION, 'next_batch': 0, 'tables': {}, 'pdfs': {}}
+        print("✓ Silver directory created.")
+    else:
+        print(f"✓ Found Silver manifest, running incrementally (next batch: {manifest['next_batch']}).")
+        # Drop part files a previous, interrupted run wrote but never recorded
+        for table_name, entry in manifest['tables'].items():
+            for part in (SILVER_DIR / table_name).glob("part-*.parquet"):
+                if part.name not in entry['parts']:
+                    part.unlink()
+    batch = manifest['next_batch']
+
+    # --- 3. Find New Structured Data ---
+    print("\nStep 1: Checking Bronze CSVs for new rows...")
+    # Fold edits the API has written to the submissions write log back into sub.csv
+    SubmissionStore(STRUCTURED_BRONZE / "sub.csv").compact()
+    starts = {}  # table -> byte offset of the rows to convert (0 = whole file)
+    # table -> size when the run started; rows appended after that are left for the next run
+    ends = {}
+    rebuild = set()
     for csv_file in STRUCTURED_BRONZE.glob("*.csv"):
         table_name = csv_file.stem
-        dfs[table_name] = pd.read_csv(csv_file)
-    print(f"✓ Loaded {len(dfs)} tables: {list(dfs.keys())}")
+        ends[table_name] = size = csv_file.stat().st_size
+        start = _new_rows_offset(csv_file, size, manifest['tables'].get(table_name))
+        if start is None:
+            rebuild.add(table_name)
+            starts[table_name] = 0
+            print(f"  - {table_name}: full load")
+        elif start < size:
+            starts[table_name] = start
+            print(f"  - {table_name}: {size - start:,} new bytes")
+        else:
+            print(f"  - {table_name}: unchanged")
 
     # --- 4. Extract and Process Unstructured Data ---
     print("\nStep 2: Extracting text from unstructured PDFs...")
-    pdf_texts = []
-    pdf_files = sorted(list(UNSTRUCTURED_BRONZE.glob("*.pdf")))
-    total_pdfs = len(pdf_files)
-
-    for i, pdf_file in enumerate(pdf_files):
-        adsh = pdf_file.stem  # Filename is the accession number (adsh)
-        text = extract_text_from_pdf(pdf_file)
-        pdf_texts.append({'adsh': adsh, 'extracted_pdf_text': text})
-        if (i + 1) % 10 == 0 or (i + 1) == total_pdfs:
-            print(f"  - Processed {i + 1}/{total_pdfs} PDFs")
-    
-    pdf_df = pd.DataFrame(pdf_texts)
-    print("✓ Extracted and compiled PDF text into a DataFrame.")
-
-    # --- 5. Merge, Clean, and Transform Data ---
-    print("\nStep 3: Merging, cleaning, and transforming data...")
-    # Merge extracted PDF text into the 'sub' dataframe
-    dfs['sub'] = pd.merge(dfs['sub'], pdf_df, on='adsh', how='left')
-    print("  - Merged PDF text with 'sub' table.")
-
-    # Data Type Conversion (example)
-    # Convert ddate to a proper datetime format
-    if 'ddate' in dfs['num'].columns:
-
-        dfs['num']['ddate'] = pd.to_datetime(dfs['num']['ddate'].astype(int).astype(str), format='%Y%m%d')
-        print("  - Converted 'ddate' column to datetime format.")
-    
-    print("✓ Data merging and cleaning complete.")
-
-    # --- 6. Save to Silver Layer as Parquet ---
-    print("\nStep 4: Saving cleaned dataframes to Silver layer as Parquet files...")
-    for table_name, df in dfs.items():
-        output_path = SILVER_DIR / f"{table_name}.parquet"
-        df.to_parquet(output_path, index=False)
-        print(f"  - Saved {output_path}")
+    sub_csv = STRUCTURED_BRONZE / "sub.csv"
+    all_pdfs = sorted(UNSTRUCTURED_BRONZE.glob("*.pdf"))
+    fingerprints = _pdf_fingerprints(all_pdfs, manifest['pdfs'])
+    changed_adsh = {adsh for adsh in fingerprints.keys() | manifest['pdfs'].keys()
+                    if fingerprints.get(adsh) != manifest['pdfs'].get(adsh)}
+    new_sub_adsh = (set(read_bronze_csv(sub_csv, starts['sub'], ends['sub'], usecols=['adsh'])['adsh'])
+                    if 'sub' in starts else set())
+    if 'sub' not in rebuild and changed_adsh - new_sub_adsh:
+        # Text of filings already in Silver changed, their rows have to be rewritten
+        print(f"  - {len(changed_adsh - new_sub_adsh)} PDFs of already processed filings changed, reloading 'sub' in full")
+        rebuild.add('sub')
+        starts['sub'] = 0
+        new_sub_adsh = set(read_bronze_csv(sub_csv, end=ends['sub'], usecols=['adsh'])['adsh'])
+    pdf_files = [pdf_file for pdf_file in all_pdfs if pdf_file.stem in new_sub_adsh]
+
+    workers = workers or PDF_EXTRACT_WORKERS
+    print(f"  - Extracting {len(pdf_files)} PDFs with {workers} worker process(es)")
+    texts, pdf_stats = extract_texts(pdf_files, workers=workers)
+    # Filename is the accession number (adsh)
+    transforms = {'sub': attach_pdf_text([pdf_file.stem for pdf_file in pdf_files], texts), 'num': parse_ddate}
+    print("✓ Extracted PDF text.")
+
+    # --- 5. Convert to Silver Layer Parquet ---
+    # Streams each CSV block by block: merges PDF text into 'sub', converts 'ddate' in 'num'
+    print(f"\nStep 3: Converting new rows to Silver Parquet part files (batch {batch})...")
+    for table_name, start in starts.items():
+        csv_file = STRUCTURED_BRONZE / f"{table_name}.csv"
+        table_dir = SILVER_DIR / table_name
+        entry = manifest['tables'].get(table_name)
+        if table_name in rebuild or entry is None:
+            if table_dir.exists():
+                shutil.rmtree(table_dir)
+            entry = {'bytes': 0, 'fingerprint': None, 'rows': 0, 'parts': []}
+        table_dir.mkdir(parents=True, exist_ok=True)
+        part_name = f"part-{batch:05d}.parquet"
+        size = ends[table_name]
+        rows = convert_csv_to_parquet(csv_file, table_dir / part_name, table=table_name, start=start, end=size,
+                                      transform=transforms.get(table_name), schema=part_schema(table_dir))
+        entry.update(bytes=size, fingerprint=_prefix_fingerprint(csv_file, size), rows=entry['rows'] + rows,
+                     parts=entry['parts'] + [part_name])
+        manifest['tables'][table_name] = entry
+        print(f"  - Saved {table_dir / part_name} ({rows} rows)")
+    # PDFs that failed to extract are left out, so the next run sees them as changed and retries them
+    failed_adsh = {pdf_file.stem for pdf_file, text in zip(pdf_files, texts) if text is None}
+    manifest['pdfs'] = {adsh: fp for adsh, fp in fingerprints.items() if adsh not in failed_adsh}
     print("✓ All tables saved to Silver layer.")
 
+    # --- 7. Compact Part Files ---
+    obsolete = []
+    for table_name, entry in manifest['tables'].items():
+        if len(entry['parts']) > 1 and (compact or len(entry['parts']) > COMPACT_AFTER_PARTS):
+            part_name = compact_table(SILVER_DIR / table_name, entry['parts'], batch)
+            obsolete += [SILVER_DIR / table_name / part for part in entry['parts'] if part != part_name]
+            entry['parts'] = [part_name]
+            print(f"  - Compacted '{table_name}' into {part_name}")
+
+    manifest['next_batch'] = batch + 1
+    save_manifest(SILVER_DIR, manifest)
+    for part in obsolete:
+        part.unlink(missing_ok=True)
+
+    print(f"\nPDF text cache: {pdf_stats['hit']} hits, {pdf_stats['extracted']} extracted, {pdf_stats['failed']} failed")
     print("\n--- ✅ Bronze to Silver ETL Process Complete ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Bronze to Silver ETL")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"PDF extraction processes (default: PDF_EXTRACT_WORKERS or CPU count, currently {PDF_EXTRACT_WORKERS})")
+    parser.add_argument("--full", action="store_true", help="Rebuild the Silver layer from scratch instead of processing only new data")
+    parser.add_argument("--compact", action="store_true", help="Merge every Silver table's part files into a single file")
+    args = parser.parse_args()
+    main(workers=args.workers, full=args.full, compact=args.compact)
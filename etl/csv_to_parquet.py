@@ -0,0 +1,139 @@
+"""
+Streaming CSV to Parquet conversion with explicit column types for the SEC tables.
+
+The CSV is read block by block with pyarrow's streaming reader and every block is
+written as a Parquet row group, so peak memory is bounded by the block size instead
+of the input size (the SEC `num` table alone is several GB).
+"""
+import csv
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+CSV_BLOCK_SIZE = int(os.environ.get('CSV_BLOCK_SIZE_MB', 32)) * 1024 * 1024
+
+# Column types per table. Covers the SEC Financial Statement Data Sets columns as well as
+# the synthetic id columns generate_sdv_data.py adds; any other column is read as a string
+# so every block (and every part file) gets the same schema.
+SCHEMAS: Dict[str, Dict[str, pa.DataType]] = {
+    'sub': {
+        'adsh': pa.string(), 'cik': pa.int64(), 'name': pa.string(), 'sic': pa.int64(),
+        'countryba': pa.string(), 'stprba': pa.string(), 'cityba': pa.string(), 'zipba': pa.string(),
+        'bas1': pa.string(), 'bas2': pa.string(), 'baph': pa.string(),
+        'countryma': pa.string(), 'stprma': pa.string(), 'cityma': pa.string(), 'zipma': pa.string(),
+        'mas1': pa.string(), 'mas2': pa.string(), 'countryinc': pa.string(), 'stprinc': pa.string(),
+        'ein': pa.int64(), 'former': pa.string(), 'changed': pa.int64(), 'afs': pa.string(),
+        'wksi': pa.int64(), 'fye': pa.string(), 'form': pa.string(), 'period': pa.int64(),
+        'fy': pa.int64(), 'fp': pa.string(), 'filed': pa.int64(), 'accepted': pa.string(),
+        'prevrpt': pa.int64(), 'detail': pa.int64(), 'instance': pa.string(), 'nciks': pa.int64(),
+        'aciks': pa.string(), 'filing_summary': pa.string(),
+    },
+    'num': {
+        'num_id': pa.int64(), 'adsh': pa.string(), 'tag': pa.string(), 'tag_id': pa.int64(),
+        'version': pa.string(), 'coreg': pa.string(), 'ddate': pa.int64(), 'qtrs': pa.int64(),
+        'uom': pa.string(), 'value': pa.float64(), 'footnote': pa.string(),
+    },
+    'pre': {
+        'pre_id': pa.int64(), 'adsh': pa.string(), 'report': pa.int64(), 'line': pa.int64(),
+        'stmt': pa.string(), 'inpth': pa.int64(), 'rfile': pa.string(), 'tag': pa.string(),
+        'tag_id': pa.int64(), 'version': pa.string(), 'plabel': pa.string(), 'negating': pa.int64(),
+    },
+    'tag': {
+        'tag_id': pa.int64(), 'tag': pa.string(), 'version': pa.string(), 'custom': pa.int64(),
+        'abstract': pa.int64(), 'datatype': pa.string(), 'iord': pa.string(), 'crdr': pa.string(),
+        'tlabel': pa.string(), 'label': pa.string(), 'doc': pa.string(),
+    },
+}
+
+# Applied to every block (as a single-chunk table) before it is written
+BatchTransform = Callable[[pa.Table], pa.Table]
+
+def read_header(csv_path: Path, delimiter: str = ',') -> List[str]:
+    with open(csv_path, newline='', encoding='utf-8') as fh:
+        return next(csv.reader(fh, delimiter=delimiter), [])
+
+def column_types(table: Optional[str], columns: List[str]) -> Dict[str, pa.DataType]:
+    """Explicit types for every column: the table's schema where known, string otherwise."""
+    known = SCHEMAS.get(table, {}) if table else {}
+    return {column: known.get(column, pa.string()) for column in columns}
+
+def convert_csv_to_parquet(
+    csv_path: Path,
+    out_path: Path,
+    table: Optional[str] = None,
+    delimiter: str = ',',
+    start: int = 0,
+    end: Optional[int] = None,
+    transform: Optional[BatchTransform] = None,
+    rename: Optional[Callable[[str], str]] = None,
+    schema: Optional[pa.Schema] = None,
+    block_size: int = CSV_BLOCK_SIZE,
+) -> int:
+    """
+    Streams `csv_path` into `out_path` one block (Parquet row group) at a time and returns the row count.
+
+    - `table` selects the column types from SCHEMAS (unknown tables/columns are read as strings).
+    - `start` skips to a byte offset (the header is still taken from the top of the file),
+      for converting only rows appended since an earlier run.
+    - `end` stops at a byte offset instead of the end of the file, so rows appended while
+      converting are left for the next run.
+    - `transform` is applied to every record batch before it is written.
+    - `rename` maps raw header names to output column names.
+    - `schema` forces the output schema, e.g. to match existing part files.
+
+    Rows with the wrong number of fields are logged and skipped rather than failing the file.
+    """
+    started = time.perf_counter()
+    raw_columns = read_header(csv_path, delimiter)
+    columns = [rename(c) for c in raw_columns] if rename else raw_columns
+    read_options = pa_csv.ReadOptions(column_names=columns, block_size=block_size, skip_rows=0 if start else 1)
+    skipped = 0
+
+    def skip_invalid_row(row) -> str:
+        nonlocal skipped
+        skipped += 1
+        line = f'line {row.number}' if row.number is not None else 'a row'
+        print(f"  - Skipping {line} of {Path(csv_path).name}: expected {row.expected_columns} fields, "
+              f"got {row.actual_columns}: {row.text[:200]!r}")
+        return 'skip'
+
+    parse_options = pa_csv.ParseOptions(delimiter=delimiter, newlines_in_values=True,
+                                        invalid_row_handler=skip_invalid_row)
+    convert_options = pa_csv.ConvertOptions(column_types=column_types(table, columns), strings_can_be_null=True)
+
+    rows = 0
+    writer = None
+
+    def write(batch: pa.RecordBatch) -> None:
+        nonlocal writer, schema, rows
+        block = pa.Table.from_batches([batch])
+        if transform is not None:
+            block = transform(block)
+        if writer is None:
+            schema = schema or block.schema
+            writer = pq.ParquetWriter(out_path, schema)
+        writer.write_table(block.cast(schema))
+        rows += block.num_rows
+
+    with pa.OSFile(str(csv_path)) as fh:
+        stop = fh.size() if end is None else end
+        reader = pa_csv.open_csv(fh.get_stream(start, stop - start), read_options=read_options, parse_options=parse_options, convert_options=convert_options)
+        try:
+            for batch in reader:
+                write(batch)
+            if writer is None:
+                # No data rows: still write an empty file with the right schema
+                write(pa.RecordBatch.from_pylist([], schema=reader.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"  - Converted {rows:,} rows from {Path(csv_path).name} in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)"
+          + (f", skipped {skipped:,} malformed rows" if skipped else ''))
+    return rows
@@ -1,19 +1,22 @@
-from PyPDF2 import PdfReader
 import pathlib
+from etl.pdf_text import extract_texts
 
 PDF_DIR = pathlib.Path('data/raw_pdfs')  # place your SEC PDF filings here
 OUT_DIR = pathlib.Path('data/bronze/pdfs_text')
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def extract_text_from_pdf(pdf_path: pathlib.Path):
-    text = []
-    reader = PdfReader(str(pdf_path))
-    for p in reader.pages:
-        text.append(p.extract_text() or '')
-    out_file = OUT_DIR / (pdf_path.stem + '.txt')
-    out_file.write_text('\n'.join(text), encoding='utf-8')
-    print('Wrote', out_file)
-
 if __name__ == '__main__':
-    for pdf in PDF_DIR.glob('*.pdf'):
-        extract_text_from_pdf(pdf)
+    pdfs = sorted(PDF_DIR.glob('*.pdf'))
+    texts, stats = extract_texts(pdfs)
+    written = 0
+    for pdf, text in zip(pdfs, texts):
+        if text is None:
+            continue  # Failed; retried on the next run
+        out_file = OUT_DIR / (pdf.stem + '.txt')
+        # Skip rewriting files whose text hasn't changed since the last run
+        if out_file.exists() and out_file.read_text(encoding='utf-8') == text:
+            continue
+        out_file.write_text(text, encoding='utf-8')
+        written += 1
+        print('Wrote', out_file)
+    print(f"{written} files written; cache: {stats['hit']} hits, {stats['extracted']} extracted, {stats['failed']} failed")
@@ -0,0 +1,56 @@
+"""
+Maintenance of the materialized aggregate tables derived from FactFinancials.
+
+AggCompanyTotals holds SUM(value) and COUNT(*) per (company, tag, date, statement).
+Incremental refreshes recompute only the "dirty" groups: those that had facts of a
+reloaded filing before the reload, or have them after it. Everything runs on the
+fact load's raw DB-API connection, inside its transaction.
+"""
+from data_access.models import AggCompanyTotals, FactFinancials
+
+GROUP_COLUMNS = ['company_id', 'tag_id', 'date_id', 'statement_id']
+DIRTY_TABLE = 'dirty_company_totals'
+
+_GROUP_LIST = ', '.join(GROUP_COLUMNS)
+_GROUPS_NOT_NULL = ' AND '.join(f"{column} IS NOT NULL" for column in GROUP_COLUMNS)
+_AGGREGATE_SELECT = f"SELECT {_GROUP_LIST}, SUM(value), COUNT(*) FROM {FactFinancials.__tablename__}"
+
+def start_refresh(conn) -> None:
+    """Creates (or empties) the temp table collecting dirty groups."""
+    conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {DIRTY_TABLE} "
+                 f"({' INTEGER, '.join(GROUP_COLUMNS)} INTEGER, PRIMARY KEY ({_GROUP_LIST}))")
+    conn.execute(f"DELETE FROM {DIRTY_TABLE}")
+
+def mark_filings_dirty(conn, filings_table: str) -> None:
+    """Marks the groups of the current facts of the filings listed in `filings_table` (column id) as dirty."""
+    conn.execute(f"""
+        INSERT OR IGNORE INTO {DIRTY_TABLE} ({_GROUP_LIST})
+        SELECT DISTINCT {_GROUP_LIST} FROM {FactFinancials.__tablename__}
+        WHERE filing_id IN (SELECT id FROM {filings_table}) AND {_GROUPS_NOT_NULL}
+    """)
+
+def refresh_dirty(conn) -> int:
+    """Recomputes the dirty groups from the facts. Returns the number of groups refreshed."""
+    table = AggCompanyTotals.__tablename__
+    dirty = conn.execute(f"SELECT COUNT(*) FROM {DIRTY_TABLE}").fetchone()[0]
+    if dirty:
+        conn.execute(f"DELETE FROM {table} WHERE ({_GROUP_LIST}) IN (SELECT {_GROUP_LIST} FROM {DIRTY_TABLE})")
+        conn.execute(f"""
+            INSERT INTO {table} ({_GROUP_LIST}, total_value, fact_count)
+            {_AGGREGATE_SELECT}
+            WHERE ({_GROUP_LIST}) IN (SELECT {_GROUP_LIST} FROM {DIRTY_TABLE})
+            GROUP BY {_GROUP_LIST}
+        """)
+        conn.execute(f"DELETE FROM {DIRTY_TABLE}")
+    return dirty
+
+def rebuild(conn) -> int:
+    """Recomputes the whole aggregate table. Returns its row count."""
+    table = AggCompanyTotals.__tablename__
+    conn.execute(f"DELETE FROM {table}")
+    conn.execute(f"""
+        INSERT INTO {table} ({_GROUP_LIST}, total_value, fact_count)
+        {_AGGREGATE_SELECT} WHERE {_GROUPS_NOT_NULL}
+        GROUP BY {_GROUP_LIST}
+    """)
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
@@ -0,0 +1,107 @@
+"""
+Natural -> surrogate key lookups for the warehouse dimensions, shared by the gold loaders.
+
+Each dimension's keys are read from the database once and kept as a pandas Index
+(natural keys) plus an aligned int64 array (surrogate ids), so whole columns are
+resolved with one vectorized `get_indexer` call instead of merges or per-row dict
+lookups. After new dimension rows are inserted, `refresh()` reads only rows with
+ids above the highest one already known and folds them in place.
+"""
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+
+class KeyLookup:
+    """Natural key -> surrogate id map for one dimension table."""
+
+    def __init__(self, table: str, key_column: str, where: Optional[str] = None):
+        self.table = table
+        self.key_column = key_column
+        self.where = where  # e.g. only the current versions of an SCD2 dimension
+        self._keys = pd.Index([], dtype=object)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._max_id = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key) -> bool:
+        return key in self._keys
+
+    def refresh(self, engine: Engine) -> int:
+        """Loads rows inserted since the last refresh (all rows the first time). Returns how many were read."""
+        conditions = [f"id > {self._max_id}"] + ([self.where] if self.where else [])
+        query = f"SELECT id, {self.key_column} FROM {self.table} WHERE {' AND '.join(conditions)} ORDER BY id"
+        with engine.connect() as conn:
+            rows = pd.read_sql(text(query), conn)
+        self.add(rows[self.key_column], rows['id'])
+        return len(rows)
+
+    def add(self, keys: Iterable, ids: Iterable[int]) -> None:
+        """Adds (or, for keys already known, repoints) keys to the given ids; later entries win."""
+        new = pd.DataFrame({'key': pd.Index(keys, dtype=object), 'id': np.asarray(ids, dtype=np.int64)})
+        if new.empty:
+            return
+        new = new.drop_duplicates('key', keep='last')
+        positions = self._keys.get_indexer(new['key'])
+        known = positions >= 0
+        if known.any():
+            self._ids = self._ids.copy()
+            self._ids[positions[known]] = new['id'].to_numpy()[known]
+        if (~known).any():
+            self._keys = self._keys.append(pd.Index(new['key'][~known], dtype=object))
+            self._ids = np.concatenate([self._ids, new['id'].to_numpy()[~known]])
+        self._max_id = max(self._max_id, int(new['id'].max()))
+
+    def resolve(self, values) -> pd.Series:
+        """Surrogate ids for a column of natural keys, as nullable Int64 (<NA> where the key is unknown)."""
+        values = pd.Series(values)
+        positions = self._keys.get_indexer(values.astype(object))
+        found = positions >= 0
+        ids = np.zeros(len(positions), dtype=np.int64)
+        ids[found] = self._ids[positions[found]]
+        return pd.Series(pd.arrays.IntegerArray(ids, ~found), index=values.index, name=f"{self.table}_id")
+
+    def missing(self, values) -> pd.Index:
+        """The distinct natural keys in `values` the dimension doesn't contain yet."""
+        unique = pd.Index(pd.unique(pd.Series(values).astype(object)))
+        return unique[self._keys.get_indexer(unique) < 0]
+
+
+# Natural key of every dimension; CompanyDim is SCD2, so only its current versions are looked up
+DIMENSIONS = {
+    'company': ('companydim', 'cik', 'is_current = 1'),
+    'filing': ('filingdim', 'accession_number', None),
+    'tag': ('tagdim', 'tag', None),
+    'date': ('datedim', 'date_key', None),
+    'statement': ('statementdim', 'statement_code', None),
+}
+
+
+class DimensionKeys:
+    """The key lookups of all dimensions, each loaded from the database on first use."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self._lookups: Dict[str, KeyLookup] = {}
+
+    def __getitem__(self, dimension: str) -> KeyLookup:
+        self.load(dimension)
+        return self._lookups[dimension]
+
+    def load(self, *dimensions: str) -> None:
+        """Reads the keys of the given dimensions now rather than on first use; already loaded ones are left alone."""
+        for dimension in dimensions:
+            if dimension not in self._lookups:
+                lookup = KeyLookup(*DIMENSIONS[dimension])
+                lookup.refresh(self.engine)
+                self._lookups[dimension] = lookup
+
+    def refresh(self, *dimensions: str) -> None:
+        """Picks up rows inserted since the lookups were loaded (all loaded dimensions by default)."""
+        for dimension in dimensions or list(self._lookups):
+            self[dimension].refresh(self.engine)
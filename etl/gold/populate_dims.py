@@ -1,8 +1,10 @@
 import pandas as pd
 import pathlib
-from sqlmodel import Session, select
+from data_access.bulk_load import bulk_insert, bulk_load_connection
 from data_access.db import engine
-from data_access.models import CompanyDim, FilingDim, TagDim, DateDim
+from data_access.models import FilingDim, TagDim, DateDim
+from etl.gold.dim_keys import DimensionKeys
+from etl.gold.scd2 import company_sources, merge_company_dim
 
 # Define the paths to the Silver layer Parquet files
 SILVER_DIR = pathlib.Path('data/silver/financials')
@@ -25,73 +27,36 @@ def populate_all_dims():
     pre_df = pd.read_parquet(PRE_PARQUET_FILE)
     num_df = pd.read_parquet(NUM_PARQUET_FILE)
     
-    with Session(engine) as session:
+    with bulk_load_connection(engine) as conn:
         # --- Populate CompanyDim ---
         print("Populating CompanyDim...")
-        # Deduplicate companies by their CIK
-        companies_df = sub_df.drop_duplicates(subset=['cik']).copy()
-        
-        companies_to_add = []
-        for _, row in companies_df.iterrows():
-            company = CompanyDim(
-                cik=str(row['cik']), # <-- CIK is now explicitly a string here
-                name=row['name'],
-                sic=None,
-                country_of_incorporation=None,
-                country_of_business=None
-            )
-            companies_to_add.append(company)
-        
-        session.add_all(companies_to_add)
-        session.commit()
-        print(f"Successfully added {len(companies_to_add)} unique companies to CompanyDim.")
+        # One row per CIK; the set-based SCD2 merge only adds CIKs not in the table yet
+        added, _ = merge_company_dim(conn, company_sources(sub_df.assign(sic=None)))
+        conn.commit()
+        print(f"Successfully added {added} unique companies to CompanyDim.")
 
         # --- Populate FilingDim ---
         print("Populating FilingDim...")
-        companies_in_db = session.exec(select(CompanyDim)).all()
-        cik_to_company_id = {c.cik: c.id for c in companies_in_db}
-
-        filings_to_add = []
-        for _, row in sub_df.iterrows():
-            # Correcting the lookup by converting the CIK from the DataFrame to a string
-            company_id = cik_to_company_id.get(str(row['cik']))
-            if company_id:
-                filing = FilingDim(
-                    accession_number=row['adsh'],
-                    form_type=row['form'],
-                    period_of_report=None,
-                    date_filed=None,
-                    company_id=company_id
-                )
-                filings_to_add.append(filing)
-        session.add_all(filings_to_add)
-        session.commit()
-        print(f"Successfully added {len(filings_to_add)} filings to FilingDim.")
+        keys = DimensionKeys(engine)
+        # Only filings whose company is known; the CIK is a string in CompanyDim
+        has_company = keys['company'].resolve(sub_df['cik'].astype(str)).notna().to_numpy()
+        filings_df = sub_df.loc[has_company, ['adsh', 'form']].rename(columns={'adsh': 'accession_number', 'form': 'form_type'})
+        added = bulk_insert(conn, FilingDim.__tablename__, filings_df)
+        conn.commit()
+        print(f"Successfully added {added} filings to FilingDim.")
 
         # --- Populate TagDim ---
         print("Populating TagDim...")
-        tags_to_add = []
-        for _, row in tag_df.iterrows():
-            tag = TagDim(
-                tag=row['tag'],
-                version=row['version'],
-                custom=row['custom'],
-                label=row['label']
-            )
-            tags_to_add.append(tag)
-        session.add_all(tags_to_add)
-        session.commit()
-        print(f"Successfully added {len(tags_to_add)} unique tags to TagDim.")
-        
+        added = bulk_insert(conn, TagDim.__tablename__, tag_df[['tag', 'version', 'custom', 'label']])
+        conn.commit()
+        print(f"Successfully added {added} unique tags to TagDim.")
+
         # --- Populate DateDim ---
         print("Populating DateDim...")
-        unique_dates = num_df['ddate'].unique()
-        dates_to_add = []
-        for date_str in unique_dates:
-            dates_to_add.append(DateDim(date_key=str(date_str)))
-        session.add_all(dates_to_add)
-        session.commit()
-        print(f"Successfully added {len(dates_to_add)} unique dates to DateDim.")
+        dates_df = pd.DataFrame({'date_key': pd.Series(num_df['ddate'].unique()).astype(str)})
+        added = bulk_insert(conn, DateDim.__tablename__, dates_df)
+        conn.commit()
+        print(f"Successfully added {added} unique dates to DateDim.")
 
     print("Populating all dimensions complete.")
 
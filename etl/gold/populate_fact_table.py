@@ -1,9 +1,10 @@
 import pandas as pd
 import pathlib
-from sqlmodel import Session, select
 import pyarrow.parquet as pq
+from data_access.bulk_load import bulk_insert, bulk_load_connection
 from data_access.db import engine
-from data_access.models import FactFinancials, CompanyDim, FilingDim, TagDim, DateDim
+from data_access.models import FactFinancials
+from etl.gold.dim_keys import DimensionKeys
 
 # Define the paths to the Silver layer Parquet files
 SILVER_DIR = pathlib.Path('data/silver/financials')
@@ -26,14 +27,11 @@ def populate_fact_financials_chunked():
         print(f"Error: {e}. Please ensure the Silver ETL has been run.")
         return
     
-    # Create lookup maps from the database
-    with Session(engine) as session:
-        print("  - Creating dimension lookup maps...")
-        company_map = {c.cik: c.id for c in session.exec(select(CompanyDim)).all()}
-        filing_map = {f.accession_number: f.id for f in session.exec(select(FilingDim)).all()}
-        tag_map = {t.tag: t.id for t in session.exec(select(TagDim)).all()}
-        date_map = {d.date_key: d.id for d in session.exec(select(DateDim)).all()}
-        print("  - Dimension lookup maps created.")
+    # Load the dimension key lookups from the database once
+    print("  - Creating dimension lookup maps...")
+    keys = DimensionKeys(engine)
+    keys.load('company', 'filing', 'tag', 'date')
+    print("  - Dimension lookup maps created.")
 
     total_added = 0
     # Process the NUM file in chunks
@@ -63,31 +61,23 @@ def populate_fact_financials_chunked():
         merged_df['cik'] = merged_df['cik'].astype(str)
 
         # Map CIK, ADSH, Tag, and DDate to their respective dimension IDs
-        merged_df['company_id'] = merged_df['cik'].apply(lambda c: company_map.get(c))
-        merged_df['filing_id'] = merged_df['adsh'].apply(lambda a: filing_map.get(a))
-        merged_df['tag_id'] = merged_df['tag'].apply(lambda t: tag_map.get(t))
-        merged_df['date_id'] = merged_df['ddate'].apply(lambda d: date_map.get(d))
+        merged_df['company_id'] = keys['company'].resolve(merged_df['cik'])
+        merged_df['filing_id'] = keys['filing'].resolve(merged_df['adsh'])
+        merged_df['tag_id'] = keys['tag'].resolve(merged_df['tag'])
+        merged_df['date_id'] = keys['date'].resolve(merged_df['ddate'])
 
         # Filter out rows where any ID lookup failed
         valid_facts_df = merged_df.dropna(subset=['company_id', 'filing_id', 'tag_id', 'date_id'])
         
         # Check if the dataframe has any records
         if not valid_facts_df.empty:
-            with Session(engine) as session:
-                fact_records = [
-                    FactFinancials(
-                        value=row['value'],
-                        company_id=int(row['company_id']),
-                        filing_id=int(row['filing_id']),
-                        tag_id=int(row['tag_id']),
-                        date_id=int(row['date_id'])
-                    )
-                    for _, row in valid_facts_df.iterrows()
-                ]
-                session.add_all(fact_records)
-                session.commit()
-                print(f"  - Adding {len(fact_records)} valid fact records from chunk {i + 1}...")
-                total_added += len(fact_records)
+            id_columns = ['company_id', 'filing_id', 'tag_id', 'date_id']
+            fact_df = valid_facts_df[['value'] + id_columns].astype({column: 'int64' for column in id_columns})
+            with bulk_load_connection(engine) as conn:
+                added = bulk_insert(conn, FactFinancials.__tablename__, fact_df)
+                conn.commit()
+            print(f"  - Adding {added} valid fact records from chunk {i + 1}...")
+            total_added += added
         else:
             print(f"  - Adding 0 valid fact records from chunk {i + 1}...")
 
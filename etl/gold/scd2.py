@@ -0,0 +1,136 @@
+"""
+Set-based Slowly Changing Dimension (Type 2) maintenance for CompanyDim.
+
+The merge runs inside the database: the source companies are bulk loaded into a
+temporary staging table, one UPDATE expires the current versions whose attributes
+changed, and one INSERT adds a new current version for every changed or new CIK.
+Python memory doesn't grow with the number of changed rows.
+
+Versions carry business dates: a version is valid from the first filing filed under
+its attributes (see `company_sources`), not from the load that noticed the change, so
+facts can be matched to the version in effect on their filing date. Without filing
+dates the load time is used.
+"""
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from data_access.bulk_load import bulk_insert
+from data_access.models import CompanyDim
+
+# SQLAlchemy's storage format for DateTime columns on SQLite
+SQLITE_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+OPEN_VALID_TO = datetime(9999, 12, 31)
+
+STAGING_TABLE = 'stage_companydim'
+
+def company_sources(filings: pd.DataFrame) -> pd.DataFrame:
+    """
+    The current attributes of every CIK in `filings` (columns cik, name, sic and optionally filed,
+    YYYYMMDD): those of its latest filing, with `valid_from` the filing date of the earliest
+    filing of the latest run of filings sharing them (NaT without filing dates).
+    """
+    columns = ['cik', 'name', 'sic']
+    df = filings[columns].astype({'cik': str}).reset_index(drop=True)
+    if 'filed' in filings:
+        filed = pd.to_numeric(filings['filed'], errors='coerce').astype('Int64').astype('string').reset_index(drop=True)
+        df['valid_from'] = pd.to_datetime(filed, format='%Y%m%d', errors='coerce')
+    else:
+        df['valid_from'] = pd.NaT
+    df = df.sort_values(['cik', 'valid_from'], kind='stable', na_position='first')
+    # A run ends wherever a CIK's attributes change from one filing to the next
+    values = df[columns].astype('string').fillna('\0').to_numpy(dtype=object)
+    changed = np.ones(len(df), dtype=bool)
+    changed[1:] = (values[1:] != values[:-1]).any(axis=1)
+    df['run'] = np.cumsum(changed)
+    latest = df.groupby('cik', sort=False)['run'].transform('max') == df['run']
+    current = df[latest]
+    first = current.groupby('cik', sort=False)['valid_from'].min()
+    result = current.drop_duplicates('cik', keep='last')[columns].set_index('cik')
+    result['valid_from'] = first
+    return result.reset_index()
+
+def merge_company_dim(conn, source_df: pd.DataFrame, now: Optional[datetime] = None) -> Tuple[int, int]:
+    """
+    Applies SCD2 to CompanyDim from `source_df` (columns cik, name, sic and optionally valid_from;
+    one row per CIK) on the raw DB-API connection `conn`, inside its current transaction. New
+    versions start at their `valid_from` (`now` where missing), never before the version they
+    replace, which ends there. Returns (new, changed) counts.
+    """
+    table = CompanyDim.__tablename__
+    now_text = (now or datetime.utcnow()).strftime(SQLITE_DATETIME_FORMAT)
+    open_text = OPEN_VALID_TO.strftime(SQLITE_DATETIME_FORMAT)
+    valid_from = pd.to_datetime(source_df['valid_from']) if 'valid_from' in source_df else pd.Series(pd.NaT, index=source_df.index)
+
+    # sic is stored as the string form of the integer code, as the ORM did
+    sic = pd.to_numeric(source_df['sic'], errors='coerce').astype('Int64')
+    staged = pd.DataFrame({
+        'cik': source_df['cik'].astype(str),
+        'name': source_df['name'].astype(object).where(source_df['name'].notna(), None),
+        'sic': sic.astype('string').astype(object).where(sic.notna(), None),
+        'valid_from': valid_from.dt.strftime(SQLITE_DATETIME_FORMAT).astype(object).where(valid_from.notna(), now_text),
+    })
+    # Recreated rather than emptied: a pooled connection may hold one with an older layout
+    conn.execute(f"DROP TABLE IF EXISTS temp.{STAGING_TABLE}")
+    conn.execute(f"CREATE TEMP TABLE {STAGING_TABLE} (cik TEXT PRIMARY KEY, name TEXT, sic TEXT, valid_from TEXT)")
+    bulk_insert(conn, STAGING_TABLE, staged)
+
+    # 1. Expire current versions whose attributes differ from the source (IS NOT is null-safe).
+    #    Dates are stored as text in a sortable format, so MAX() picks the later one.
+    changed = conn.execute(f"""
+        UPDATE {table} SET is_current = 0,
+            valid_to = (SELECT MAX(s.valid_from, {table}.valid_from) FROM {STAGING_TABLE} s WHERE s.cik = {table}.cik)
+        WHERE is_current = 1 AND EXISTS (
+            SELECT 1 FROM {STAGING_TABLE} s
+            WHERE s.cik = {table}.cik AND (s.name IS NOT {table}.name OR s.sic IS NOT {table}.sic))
+    """).rowcount
+
+    # 2. Every staged CIK without a current version (new, or just expired) gets one, starting
+    #    where the version it replaces ended
+    inserted = conn.execute(f"""
+        INSERT INTO {table} (cik, name, sic, valid_from, valid_to, is_current)
+        SELECT s.cik, s.name, s.sic, COALESCE((SELECT MAX(c.valid_to) FROM {table} c WHERE c.cik = s.cik), s.valid_from), ?, 1
+        FROM {STAGING_TABLE} s
+        WHERE NOT EXISTS (SELECT 1 FROM {table} c WHERE c.cik = s.cik AND c.is_current = 1)
+    """, (open_text,)).rowcount
+
+    conn.execute(f"DELETE FROM {STAGING_TABLE}")
+    return inserted - changed, changed
+
+def company_ids_as_of(engine: Engine, ciks: pd.Series, dates: pd.Series) -> pd.Series:
+    """
+    The CompanyDim version in effect at each date, for a column of CIKs and a column of dates
+    (e.g. filing dates), as nullable Int64 aligned with `ciks`. Versions are matched with
+    `merge_asof` on valid_from; dates before a CIK's first version resolve to that first
+    version, and missing dates to the current one.
+    """
+    with engine.connect() as conn:
+        versions = pd.read_sql(text(f"SELECT id, cik, valid_from, is_current FROM {CompanyDim.__tablename__}"), conn,
+                               parse_dates=['valid_from'])
+    # On equal dates the later version wins
+    versions = versions.sort_values(['valid_from', 'id'])
+    lookup = pd.DataFrame({'cik': ciks.astype(str).to_numpy(), 'date': pd.to_datetime(dates).to_numpy(),
+                           'row': np.arange(len(ciks))})
+    result = np.full(len(lookup), -1, dtype=np.int64)
+
+    dated = lookup.dropna(subset=['date']).sort_values('date')
+    if not dated.empty and not versions.empty:
+        for direction in ('backward', 'forward'):
+            pending = dated[result[dated['row'].to_numpy()] < 0]
+            if pending.empty:
+                break
+            matched = pd.merge_asof(pending, versions[['cik', 'valid_from', 'id']], left_on='date', right_on='valid_from',
+                                    by='cik', direction=direction).dropna(subset=['id'])
+            result[matched['row'].to_numpy()] = matched['id'].to_numpy(dtype=np.int64)
+
+    current = versions[versions['is_current'].astype(bool)].drop_duplicates('cik', keep='last').set_index('cik')['id']
+    unresolved = lookup[result < 0]
+    current_ids = current.reindex(unresolved['cik']).to_numpy()
+    found = ~pd.isna(current_ids)
+    result[unresolved['row'].to_numpy()[found]] = current_ids[found].astype(np.int64)
+
+    return pd.Series(pd.arrays.IntegerArray(result, result < 0), index=ciks.index, name='company_id')
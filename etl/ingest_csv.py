@@ -1,6 +1,5 @@
-import pandas as pd
 import pathlib
-from datetime import datetime
+from etl.csv_to_parquet import convert_csv_to_parquet
 
 BRONZE_DIR = pathlib.Path('data/bronze')
 CSV_DIR = BRONZE_DIR / 'csv'
@@ -8,10 +7,8 @@ OUT_DIR = BRONZE_DIR / 'parquet'
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 def ingest_csv_to_parquet(csv_path: pathlib.Path):
-    df = pd.read_csv(csv_path)
-    df.columns = [c.strip() for c in df.columns]
     out_file = OUT_DIR / (csv_path.stem + '.parquet')
-    df.to_parquet(out_file, index=False)
+    convert_csv_to_parquet(csv_path, out_file, table=csv_path.stem, rename=str.strip)
     print('Saved', out_file)
 
 if __name__ == '__main__':
@@ -0,0 +1,177 @@
+"""
+PDF text extraction shared by the Bronze to Silver ETL and `extract_pdfs.py`.
+
+Extracted text is cached on disk keyed by the SHA-256 of the PDF bytes and the
+extractor version, so re-runs only parse new or modified PDFs:
+
+    python -m etl.pdf_text stats   # entries and size of the cache
+    python -m etl.pdf_text prune   # drop entries no current PDF maps to
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import shutil
+import signal
+import warnings
+from functools import partial
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import PyPDF2
+
+# Suppress specific warnings from PyPDF2 for cleaner output
+warnings.filterwarnings("ignore", category=PyPDF2.errors.PdfReadWarning)
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+PDF_DIRS = [ROOT_DIR / "data" / "bronze" / "unstructured_filings_pdf", ROOT_DIR / "data" / "raw_pdfs"]
+
+PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', os.cpu_count() or 1))
+PDF_EXTRACT_TIMEOUT_SECONDS = int(os.environ.get('PDF_EXTRACT_TIMEOUT_SECONDS', 60))
+PDF_EXTRACT_CHUNKSIZE = int(os.environ.get('PDF_EXTRACT_CHUNKSIZE', 8))
+PDF_TEXT_CACHE_DIR = Path(os.environ.get('PDF_TEXT_CACHE_DIR', ROOT_DIR / "data" / "cache" / "pdf_text"))
+
+# Bump when the extraction logic changes so cached text is re-extracted
+EXTRACTOR_VERSION = f"pypdf2-{PyPDF2.__version__}-v1"
+
+def _read_pdf_text(pdf_path: Path) -> str:
+    pages = []
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for page in reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                pages.append(page_text + "\n")
+    return "".join(pages)
+
+def extract_text_from_pdf(pdf_path: Path) -> str:
+    """Extracts all text content from a given PDF file."""
+    try:
+        return _read_pdf_text(pdf_path)
+    except Exception as e:
+        print(f"  - Warning: Could not read {pdf_path.name}. Error: {e}")
+        return ""
+
+# --- Content-hash cache ---
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _cache_path(cache_dir: Path, digest: str) -> Path:
+    return cache_dir / EXTRACTOR_VERSION / digest[:2] / f"{digest}.txt"
+
+def _write_cache(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(text, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+# --- Extraction workers ---
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError("extraction timed out")
+
+def _extract_one(pdf_path: Path, timeout: int, cache_dir: Optional[Path]) -> Tuple[Optional[str], str]:
+    """
+    Runs in a pool worker and returns (text, outcome), outcome being 'hit', 'extracted' or 'failed'.
+    SIGALRM interrupts a PDF that stalls the parser; failed extractions return None for the text
+    and aren't cached.
+    """
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = _cache_path(cache_dir, file_sha256(pdf_path))
+        if cache_path.exists():
+            return cache_path.read_text(encoding='utf-8'), 'hit'
+
+    use_alarm = bool(timeout) and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(timeout)
+    try:
+        text = _read_pdf_text(pdf_path)
+    except Exception as e:
+        print(f"  - Warning: Could not read {pdf_path.name}. Error: {e}")
+        return None, 'failed'
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+    if cache_path is not None:
+        _write_cache(cache_path, text)
+    return text, 'extracted'
+
+def extract_texts(pdf_files: List[Path], workers: Optional[int] = None,
+                  timeout: int = PDF_EXTRACT_TIMEOUT_SECONDS, chunksize: int = PDF_EXTRACT_CHUNKSIZE,
+                  cache_dir: Optional[Path] = PDF_TEXT_CACHE_DIR) -> Tuple[List[Optional[str]], Dict[str, int]]:
+    """
+    Extracts the text of every PDF using a pool of worker processes.
+    Files are handed out in chunks of `chunksize`; texts are returned in input order (None for
+    files that failed or timed out, so callers can retry them), together with counts of cache
+    hits, extracted and failed files.
+    Pass `cache_dir=None` to bypass the cache.
+    """
+    workers = min(workers or PDF_EXTRACT_WORKERS, max(len(pdf_files), 1))
+    total = len(pdf_files)
+    report_every = max(10, total // 20)
+    extract = partial(_extract_one, timeout=timeout, cache_dir=cache_dir)
+
+    texts = []
+    stats = {'hit': 0, 'extracted': 0, 'failed': 0}
+    if workers <= 1:
+        results = map(extract, pdf_files)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(extract, pdf_files, chunksize=chunksize)
+    try:
+        for i, (text, outcome) in enumerate(results):
+            texts.append(text)
+            stats[outcome] += 1
+            if (i + 1) % report_every == 0 or (i + 1) == total:
+                print(f"  - Processed {i + 1}/{total} PDFs")
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return texts, stats
+
+# --- Cache maintenance ---
+
+def cache_stats(cache_dir: Path = PDF_TEXT_CACHE_DIR) -> Dict[str, int]:
+    entries = list(cache_dir.glob("*/*/*.txt")) if cache_dir.exists() else []
+    current = [p for p in entries if p.parent.parent.name == EXTRACTOR_VERSION]
+    return {
+        'entries': len(entries),
+        'current_version_entries': len(current),
+        'bytes': sum(p.stat().st_size for p in entries),
+    }
+
+def prune_cache(pdf_dirs: Iterable[Path] = PDF_DIRS, cache_dir: Path = PDF_TEXT_CACHE_DIR) -> int:
+    """Removes cache entries of other extractor versions and of PDFs no longer present. Returns the number removed."""
+    if not cache_dir.exists():
+        return 0
+    live = {file_sha256(pdf) for pdf_dir in pdf_dirs if pdf_dir.exists() for pdf in pdf_dir.glob("*.pdf")}
+    removed = 0
+    for version_dir in cache_dir.iterdir():
+        if version_dir.name != EXTRACTOR_VERSION:
+            removed += sum(1 for _ in version_dir.glob("*/*.txt"))
+            shutil.rmtree(version_dir)
+            continue
+        for entry in version_dir.glob("*/*.txt"):
+            if entry.stem not in live:
+                entry.unlink()
+                removed += 1
+    return removed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the extracted PDF text cache")
+    parser.add_argument("command", choices=["stats", "prune"])
+    args = parser.parse_args()
+    if args.command == "prune":
+        print(f"Pruning {PDF_TEXT_CACHE_DIR} against PDFs in: {', '.join(str(d) for d in PDF_DIRS)}")
+        print(f"✓ Removed {prune_cache()} orphaned cache entries.")
+    print(f"Cache stats ({EXTRACTOR_VERSION}): {cache_stats()}")
@@ -1,64 +1,100 @@
-import pandas as pd
+import argparse
+import csv
+import multiprocessing
+import os
 import pathlib
-from typing import List
-from pandas.errors import ParserError
+from typing import List, Optional
+import pyarrow as pa
+from etl.csv_to_parquet import column_types, convert_csv_to_parquet
 
 # Define the input and output directories
 BRONZE_TXT_DIR = pathlib.Path('data/bronze/txt')
 SILVER_PARQUET_DIR = pathlib.Path('data/silver/financials')
 SILVER_PARQUET_DIR.mkdir(parents=True, exist_ok=True)
 
-def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    """Strips whitespace and converts column names to snake_case."""
-    df.columns = [c.strip().replace(' ', '_').replace('.', '').lower() for c in df.columns]
-    return df
+DELIMITERS = ['\t', ',', ';', '|']  # Candidate delimiters, in order of preference
+SNIFF_SAMPLE_BYTES = int(os.environ.get('TXT_SNIFF_SAMPLE_KB', 64)) * 1024
+TRANSFORM_WORKERS = int(os.environ.get('TXT_TRANSFORM_WORKERS', 1))
 
-def transform_raw_txt_to_silver(file_path: pathlib.Path):
+def standardize_column_name(column: str) -> str:
+    """Strips whitespace and converts a column name to snake_case."""
+    return column.strip().replace(' ', '_').replace('.', '').lower()
+
+def read_sample(file_path: pathlib.Path, size: int = SNIFF_SAMPLE_BYTES) -> str:
+    """The first `size` bytes of the file, cut back to the last complete line."""
+    with open(file_path, 'rb') as fh:
+        sample = fh.read(size)
+    if len(sample) == size and b'\n' in sample:
+        sample = sample[:sample.rindex(b'\n') + 1]
+    return sample.decode('utf-8', errors='replace')
+
+def sniff_delimiter(sample: str) -> Optional[str]:
     """
-    Reads a raw text file, cleans it, and saves it to the Silver layer
-    as a Parquet file. Explicitly tries tab delimiter first.
+    Picks the delimiter from a sample of the file: csv.Sniffer restricted to the candidates,
+    falling back to the candidate that splits the header into the most columns.
     """
-    delimiters = ['\t', ',', ';', '|']  # Common delimiters to try, starting with tab
-
-    for sep in delimiters:
-        try:
-            # Try to read the file with the current delimiter
-            df = pd.read_csv(file_path, sep=sep, on_bad_lines='warn', engine='python')
-            print(f'File {file_path.name} successfully parsed with delimiter: "{sep}"')
-            
-            # Apply basic cleaning
-            df = standardize_columns(df)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=''.join(DELIMITERS)).delimiter
+    except csv.Error:
+        header = sample.split('\n', 1)[0]
+        counts = {sep: header.count(sep) for sep in DELIMITERS}
+        best = max(DELIMITERS, key=lambda sep: counts[sep])
+        return best if counts[best] else None
 
-            # Define output path
-            out_file = SILVER_PARQUET_DIR / (file_path.stem + '.parquet')
+def transform_raw_txt_to_silver(file_path: pathlib.Path) -> Optional[pathlib.Path]:
+    """
+    Reads a raw text file, cleans it, and saves it to the Silver layer as a Parquet file.
+    The delimiter and columns are sniffed from a bounded sample of the file, which is then
+    parsed once with pyarrow's streaming reader. Returns the output path, or None on failure.
+    """
+    sample = read_sample(file_path)
+    sep = sniff_delimiter(sample)
+    if sep is None:
+        print(f'Could not detect the delimiter of {file_path.name} with any of the candidate delimiters.')
+        return None
 
-            # Save to Parquet format in the Silver layer
-            df.to_parquet(out_file, index=False)
-            print(f'Successfully transformed and saved: {out_file}')
-            return  # Exit the function after a successful parse
+    # SEC dumps are named after their table (num.txt, sub.txt, ...), which selects the dtypes
+    table = file_path.stem
+    header = next(csv.reader([sample.split('\n', 1)[0]], delimiter=sep), [])
+    schema = column_types(table, [standardize_column_name(c) for c in header])
+    print(f'File {file_path.name}: delimiter "{sep}", {len(schema)} columns '
+          f'({sum(1 for t in schema.values() if t != pa.string())} typed)')
 
-        except ParserError as e:
-            # The current delimiter failed, try the next one
-            print(f'Failed to parse {file_path.name} with delimiter "{sep}": {e}')
-        
-        except Exception as e:
-            # Handle other potential errors
-            print(f'An unexpected error occurred while processing {file_path.name}: {e}')
-            return
+    # Define output path
+    out_file = SILVER_PARQUET_DIR / (file_path.stem + '.parquet')
+    try:
+        convert_csv_to_parquet(file_path, out_file, table=table, delimiter=sep, rename=standardize_column_name)
+    except Exception as e:
+        print(f'An unexpected error occurred while processing {file_path.name}: {e}')
+        out_file.unlink(missing_ok=True)
+        return None
+    print(f'Successfully transformed and saved: {out_file}')
+    return out_file
 
-    # If the loop finishes without a successful parse
-    print(f'Could not parse file {file_path.name} with any of the attempted delimiters.')
+def transform_all(txt_files: List[pathlib.Path], workers: int = TRANSFORM_WORKERS) -> int:
+    """Transforms every file, in `workers` processes when > 1. Returns the number converted."""
+    if workers <= 1 or len(txt_files) <= 1:
+        results = [transform_raw_txt_to_silver(file) for file in txt_files]
+    else:
+        with multiprocessing.Pool(min(workers, len(txt_files))) as pool:
+            results = pool.map(transform_raw_txt_to_silver, txt_files, chunksize=1)
+    return sum(1 for out_file in results if out_file is not None)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Transform raw SEC text dumps into Silver Parquet files")
+    parser.add_argument("--workers", type=int, default=TRANSFORM_WORKERS,
+                        help="Files to convert in parallel (default: TXT_TRANSFORM_WORKERS or 1)")
+    args = parser.parse_args()
+
     # Remove old Parquet files for a clean run
     for old_file in SILVER_PARQUET_DIR.glob('*.parquet'):
         old_file.unlink()
-    
+
     txt_files: List[pathlib.Path] = list(BRONZE_TXT_DIR.glob('*.txt'))
-    
+
     if not txt_files:
-        print(f"No .txt files found in {BRONZE_DIR}. Please make sure your files are in the correct directory.")
+        print(f"No .txt files found in {BRONZE_TXT_DIR}. Please make sure your files are in the correct directory.")
     else:
-        for file in txt_files:
-            transform_raw_txt_to_silver(file)
\ No newline at end of file
+        converted = transform_all(txt_files, workers=args.workers)
+        print(f'{converted}/{len(txt_files)} files transformed.')
@@ -1,18 +1,191 @@
+import numpy as np
+import os
 import pandas as pd
+import pyarrow.dataset as ds
+import resource
+import time
 from pathlib import Path
-from sqlmodel import Session, select, delete
+from sqlmodel import Session
 from datetime import datetime
+from typing import Iterable, Iterator, List
 from data_access.db import engine
+from data_access.bulk_load import bulk_insert, bulk_load_connection
+from data_access.generation import bump_generation, read_generation
+from data_access import warehouse
+from data_access import indexes
+from etl.gold import aggregates
+from etl.gold.dim_keys import DimensionKeys
+from etl.gold.scd2 import company_ids_as_of, company_sources, merge_company_dim
 from data_access.models import (
-    CompanyDim, FilingDim, TagDim, DateDim, StatementDim, FactFinancials
+    FilingDim, TagDim, DateDim, StatementDim, FactFinancials, FactLoadWatermark, AggCompanyTotals,
+    WarehouseGeneration,
 )
+import argparse
 import sys
 import traceback
 
-def main():
+FACT_COLUMNS = ['value', 'company_id', 'filing_id', 'tag_id', 'date_id', 'statement_id']
+FACT_BATCH_ROWS = int(os.environ.get('FACT_BATCH_ROWS', 500_000))
+
+# --- Streaming helpers ---
+
+def iter_batches(table_dir: Path, columns: List[str], batch_size: int = FACT_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    """Streams a Silver table (a directory of Parquet parts) as DataFrames of at most `batch_size` rows."""
+    scanner = ds.dataset(table_dir, format='parquet').scanner(
+        columns=columns, batch_size=batch_size, batch_readahead=1, fragment_readahead=1)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class FactSource:
+    """
+    Builds warehouse fact rows from the Silver `num` table one batch at a time. `pre`, `sub`
+    and `tag` are indexed once up front; each `num` batch is joined against them and its
+    dimension keys resolved, so memory is bounded by the batch size rather than by `num`.
+    """
+
+    def __init__(self, num_dir: Path, pre: pd.DataFrame, sub: pd.DataFrame, tag: pd.DataFrame,
+                 keys: DimensionKeys, batch_size: int = FACT_BATCH_ROWS):
+        self.num_dir = num_dir
+        self.batch_size = batch_size
+        self.keys = keys
+        self.stmt_by_key = pre[['adsh', 'tag_id', 'stmt']].set_index(['adsh', 'tag_id']).sort_index()
+        # Facts belong to the company version in effect when the filing was filed
+        filings = sub.drop_duplicates('adsh')
+        if 'filed' in filings:
+            filed = pd.to_numeric(filings['filed'], errors='coerce').astype('Int64').astype('string')
+            company_ids = company_ids_as_of(keys.engine, filings['cik'], pd.to_datetime(filed, format='%Y%m%d', errors='coerce'))
+        else:
+            company_ids = keys['company'].resolve(filings['cik'].astype(str))
+        self.company_by_adsh = pd.Series(company_ids.array, index=filings['adsh'])
+        tag_by_id = pd.Series(tag['tag'].to_numpy(), index=tag['tag_id'])
+        self.tag_by_id = tag_by_id[~tag_by_id.index.duplicated()]
+
+    def build(self, num: pd.DataFrame) -> pd.DataFrame:
+        """
+        Joins `num` facts to their statement (via `pre`) and resolves every dimension's surrogate key
+        with vectorized lookups. Facts whose keys can't all be resolved are dropped.
+        """
+        facts = num[['adsh', 'tag_id', 'ddate', 'value']].join(self.stmt_by_key, on=['adsh', 'tag_id'], how='inner')
+        key_ids = {
+            'company_id': self.company_by_adsh.reindex(facts['adsh']),
+            'filing_id': self.keys['filing'].resolve(facts['adsh'].to_numpy()),
+            'tag_id': self.keys['tag'].resolve(self.tag_by_id.reindex(facts['tag_id']).to_numpy()),
+            'date_id': self.keys['date'].resolve(facts['ddate'].dt.strftime('%Y%m%d').to_numpy()),
+            'statement_id': self.keys['statement'].resolve(facts['stmt'].to_numpy()),
+        }
+        fact_df = pd.DataFrame({'value': facts['value'].to_numpy(), **{name: ids.array for name, ids in key_ids.items()}})
+        return fact_df.dropna(subset=list(key_ids)).astype({name: 'int64' for name in key_ids})[FACT_COLUMNS]
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        for num in iter_batches(self.num_dir, ['adsh', 'tag_id', 'ddate', 'value'], self.batch_size):
+            yield self.build(num)
+
+# --- Fact loading ---
+
+def filing_hashes(fact_batches: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Per filing: the number of facts and the (wrapping) sum of their row hashes. The sum is
+    independent of row order and of how the facts are split into batches, so a filing only
+    hashes differently when its facts change.
+    """
+    totals = pd.DataFrame({'facts_hash': pd.Series(dtype='uint64'), 'fact_count': pd.Series(dtype='int64')})
+    for fact_df in fact_batches:
+        row_hashes = pd.util.hash_pandas_object(fact_df[FACT_COLUMNS], index=False)
+        grouped = row_hashes.groupby(fact_df['filing_id'].to_numpy())
+        part = pd.DataFrame({'facts_hash': grouped.sum().astype('uint64'), 'fact_count': grouped.size()})
+        totals = pd.concat([totals, part]).groupby(level=0).sum()
+    totals['facts_hash'] = totals['facts_hash'].map('{:016x}'.format)
+    totals.index.name = 'filing_id'
+    return totals.reset_index().astype({'filing_id': 'int64', 'fact_count': 'int64'})
+
+def load_facts(source: FactSource, full_reload: bool = False) -> None:
+    """
+    Loads the facts into FactFinancials, filing by filing: facts of filings whose hash
+    differs from the load watermark (or that are new, or gone from the source) are deleted
+    and re-inserted, everything else is left alone. `full_reload` (or an empty watermark
+    table) clears and reloads every fact instead. Runs as a single transaction, index drops
+    included: a failed load rolls them back, and readers keep the indexes until it commits.
+
+    The source is streamed twice: once to hash every filing, once to insert the facts of the
+    filings that need (re)loading, batch by batch. The AggCompanyTotals groups those filings
+    touch are recomputed in the same transaction (the whole table on full reloads).
+    """
+    loaded = pd.read_sql(f"SELECT filing_id, facts_hash, fact_count FROM {FactLoadWatermark.__tablename__}", engine)
+    full_reload = full_reload or loaded.empty
+
+    started = time.perf_counter()
+    source_hashes = filing_hashes(source)
+    print(f"  - Hashed facts of {len(source_hashes)} filings in {time.perf_counter() - started:.2f}s (peak RSS {peak_rss_mb():,.0f} MB)")
+    if full_reload:
+        stale_ids = []
+        changed = source_hashes
+    else:
+        merged = source_hashes.merge(loaded, on='filing_id', how='left', suffixes=('', '_loaded'))
+        changed = source_hashes[((merged['facts_hash'] != merged['facts_hash_loaded'])
+                                 | (merged['fact_count'] != merged['fact_count_loaded'])).to_numpy()]
+        removed_ids = loaded.loc[~loaded['filing_id'].isin(source_hashes['filing_id']), 'filing_id'].tolist()
+        stale_ids = loaded.loc[loaded['filing_id'].isin(changed['filing_id']), 'filing_id'].tolist() + removed_ids
+        print(f"  - {len(changed)} of {len(source_hashes)} filings new or changed, {len(removed_ids)} removed from the source")
+
+    with bulk_load_connection(engine) as conn:
+        rebuild_totals = full_reload or conn.execute(f"SELECT 1 FROM {AggCompanyTotals.__tablename__} LIMIT 1").fetchone() is None
+        if full_reload:
+            # Indexes are rebuilt once after the insert instead of being maintained row by row
+            indexes.drop_indexes(conn, FactFinancials.__tablename__)
+            conn.execute(f"DELETE FROM {FactFinancials.__tablename__}")
+            conn.execute(f"DELETE FROM {FactLoadWatermark.__tablename__}")
+            print("  - Cleared existing records from FactFinancials table.")
+        else:
+            # Filing ids go through a temp table so the delete is one statement whatever their number
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS reload_filings (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM reload_filings")
+            conn.executemany("INSERT INTO reload_filings (id) VALUES (?)", [(i,) for i in set(stale_ids) | set(changed['filing_id'].tolist())])
+            aggregates.start_refresh(conn)
+            # Aggregate groups of the facts about to be replaced...
+            aggregates.mark_filings_dirty(conn, 'reload_filings')
+            if stale_ids:
+                deleted = conn.execute(f"DELETE FROM {FactFinancials.__tablename__} WHERE filing_id IN (SELECT id FROM reload_filings)").rowcount
+                conn.execute(f"DELETE FROM {FactLoadWatermark.__tablename__} WHERE filing_id IN (SELECT id FROM reload_filings)")
+                print(f"  - Deleted {deleted} facts of {len(stale_ids)} stale filings.")
+
+        if not changed.empty:
+            load_ids = changed['filing_id'].to_numpy()
+            for i, fact_df in enumerate(source):
+                batch_started = time.perf_counter()
+                fact_df = fact_df[np.isin(fact_df['filing_id'].to_numpy(), load_ids)]
+                bulk_insert(conn, FactFinancials.__tablename__, fact_df)
+                print(f"  - Batch {i + 1}: {len(fact_df):,} facts in {time.perf_counter() - batch_started:.2f}s "
+                      f"(peak RSS {peak_rss_mb():,.0f} MB)")
+        watermarks = changed.assign(loaded_at=datetime.utcnow().isoformat(sep=' '))
+        bulk_insert(conn, FactLoadWatermark.__tablename__, watermarks)
+
+        started = time.perf_counter()
+        indexes.create_indexes(conn)
+        print(f"  - Created/analyzed warehouse indexes in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        if rebuild_totals:
+            groups = aggregates.rebuild(conn)
+            print(f"  - Rebuilt AggCompanyTotals ({groups:,} groups) in {time.perf_counter() - started:.2f}s")
+        else:
+            # ...and of the facts that replaced them
+            aggregates.mark_filings_dirty(conn, 'reload_filings')
+            groups = aggregates.refresh_dirty(conn)
+            print(f"  - Refreshed {groups:,} AggCompanyTotals groups in {time.perf_counter() - started:.2f}s")
+        if full_reload or stale_ids or not changed.empty:
+            bump_generation(conn)
+        conn.commit()
+
+def main(full_reload: bool = False):
     """
     Main ETL script to process data from the Silver layer to the Gold layer (Data Warehouse).
-    This script is idempotent and handles incremental loads for all dimensions.
+    This script is idempotent and handles incremental loads for all dimensions and facts;
+    `full_reload` reloads every fact (for backfills).
     """
     print("--- Starting Silver to Gold ETL Process ---")
 
@@ -22,43 +195,40 @@ def main():
     SILVER_DIR = ROOT_DIR / "data" / "silver"
 
     print(f"Reading clean data from Silver layer: {SILVER_DIR}")
-    dfs = {}
-    for parquet_file in SILVER_DIR.glob("*.parquet"):
-        table_name = parquet_file.stem
-        dfs[table_name] = pd.read_parquet(parquet_file)
-    print(f"✓ Loaded {len(dfs)} tables: {list(dfs.keys())}")
+    # Each Silver table is a directory of Parquet part files. `num` is by far the largest
+    # and is only ever streamed in batches; the other tables are loaded up front.
+    dfs = {
+        'sub': pd.read_parquet(SILVER_DIR / 'sub'),
+        'tag': pd.read_parquet(SILVER_DIR / 'tag'),
+        'pre': pd.read_parquet(SILVER_DIR / 'pre', columns=['adsh', 'tag_id', 'stmt']),
+    }
+    num_dir = SILVER_DIR / 'num'
+    print(f"✓ Loaded {len(dfs)} tables: {list(dfs.keys())} (streaming 'num' in batches of {FACT_BATCH_ROWS:,} rows)")
+
+    # Bookkeeping tables added after the original schema, for warehouses created before them
+    for model in (FactLoadWatermark, AggCompanyTotals, WarehouseGeneration):
+        model.__table__.create(engine, checkfirst=True)
+
+    keys = DimensionKeys(engine)
+    # --- 2. Prepare and Populate Dimension Tables ---
+    print("\nStep 1: Populating Dimension tables...")
+
+    # --- CompanyDim with SCD Type 2 Logic (set-based, inside the database) ---
+    # Each CIK's latest attributes, valid from the first filing filed under them
+    source_companies_df = company_sources(dfs['sub'])
+    with bulk_load_connection(engine) as conn:
+        new_count, changed_count = merge_company_dim(conn, source_companies_df)
+        if changed_count:
+            # Renamed companies change query results even before any fact is reloaded
+            bump_generation(conn)
+        conn.commit()
+    print(f"  - Merged CompanyDim: {new_count} new records, {changed_count} updated (SCD2) records")
 
     with Session(engine) as session:
-        # --- 2. Prepare and Populate Dimension Tables ---
-        print("\nStep 1: Populating Dimension tables...")
-
-        # --- CompanyDim with SCD Type 2 Logic ---
-        source_companies_df = dfs['sub'][['cik', 'name', 'sic']].drop_duplicates(subset=['cik']).astype({'cik': str})
-        target_companies_df = pd.read_sql("SELECT id, cik, name, sic FROM companydim WHERE is_current = TRUE", engine)
-        merged_df = pd.merge(source_companies_df, target_companies_df, on='cik', how='left', indicator=True, suffixes=('', '_target'))
-        new_companies = merged_df[merged_df['_merge'] == 'left_only']
-        if not new_companies.empty:
-            new_records = [CompanyDim(**row) for row in new_companies[['cik', 'name', 'sic']].to_dict(orient='records')]
-            session.add_all(new_records)
-            print(f"  - Staged {len(new_records)} new records for CompanyDim")
-        changed_companies = merged_df[(merged_df['_merge'] == 'both') & ((merged_df['name'] != merged_df['name_target']) | (merged_df['sic'].astype(str) != merged_df['sic_target'].astype(str)))]
-        if not changed_companies.empty:
-            ciks_to_update = changed_companies['cik'].tolist()
-            statement = select(CompanyDim).where(CompanyDim.cik.in_(ciks_to_update), CompanyDim.is_current == True)
-            records_to_expire = session.exec(statement).all()
-            for record in records_to_expire:
-                record.is_current = False
-                record.valid_to = datetime.utcnow()
-            new_versions_df = changed_companies[['cik', 'name', 'sic']]
-            new_version_records = [CompanyDim(**row) for row in new_versions_df.to_dict(orient='records')]
-            session.add_all(new_version_records)
-            print(f"  - Staged {len(new_version_records)} updated (SCD2) records for CompanyDim")
-        
         # --- FilingDim (Idempotent Load) ---
         source_filings_df = dfs['sub'][['adsh', 'form']].drop_duplicates(subset=['adsh'])
         source_filings_df.rename(columns={'adsh': 'accession_number', 'form': 'form_type'}, inplace=True)
-        existing_filings = pd.read_sql("SELECT accession_number FROM filingdim", engine)
-        new_filings_df = source_filings_df[~source_filings_df['accession_number'].isin(existing_filings['accession_number'])]
+        new_filings_df = source_filings_df[source_filings_df['accession_number'].isin(keys['filing'].missing(source_filings_df['accession_number']))]
         if not new_filings_df.empty:
             filing_records = [FilingDim(**row) for row in new_filings_df.to_dict(orient='records')]
             session.add_all(filing_records)
@@ -66,17 +236,17 @@ def main():
 
         # --- TagDim (Idempotent Load) ---
         source_tags_df = dfs['tag'].drop_duplicates(subset=['tag'])
-        existing_tags = pd.read_sql("SELECT tag FROM tagdim", engine)
-        new_tags_df = source_tags_df[~source_tags_df['tag'].isin(existing_tags['tag'])]
+        new_tags_df = source_tags_df[source_tags_df['tag'].isin(keys['tag'].missing(source_tags_df['tag']))]
         if not new_tags_df.empty:
             tag_records = [TagDim(**row) for row in new_tags_df.to_dict(orient='records')]
             session.add_all(tag_records)
             print(f"  - Staged {len(tag_records)} new records for TagDim")
 
         # --- DateDim (Idempotent Load) ---
-        source_date_keys = dfs['num']['ddate'].dt.strftime('%Y%m%d').drop_duplicates()
-        existing_dates = pd.read_sql("SELECT date_key FROM datedim", engine)
-        new_date_keys = source_date_keys[~source_date_keys.isin(existing_dates['date_key'])].tolist()
+        source_date_keys = pd.Index([], dtype=object)
+        for num in iter_batches(num_dir, ['ddate']):
+            source_date_keys = source_date_keys.union(pd.Index(num['ddate'].dt.strftime('%Y%m%d').unique()))
+        new_date_keys = keys['date'].missing(source_date_keys).tolist()
         if new_date_keys:
             date_records = [DateDim(date_key=key) for key in new_date_keys]
             session.add_all(date_records)
@@ -85,8 +255,7 @@ def main():
         # --- StatementDim (Idempotent Load) ---
         source_stmts_df = dfs['pre'][['stmt']].drop_duplicates()
         source_stmts_df.rename(columns={'stmt': 'statement_code'}, inplace=True)
-        existing_stmts = pd.read_sql("SELECT statement_code FROM statementdim", engine)
-        new_stmts_df = source_stmts_df[~source_stmts_df['statement_code'].isin(existing_stmts['statement_code'])]
+        new_stmts_df = source_stmts_df[source_stmts_df['statement_code'].isin(keys['statement'].missing(source_stmts_df['statement_code']))]
         if not new_stmts_df.empty:
             stmt_map = {'IS': 'Income Statement', 'BS': 'Balance Sheet', 'CF': 'Cash Flow'}
             new_stmts_df['statement_name'] = new_stmts_df['statement_code'].map(stmt_map).fillna('Other')
@@ -99,45 +268,28 @@ def main():
 
         # --- 3. Prepare and Populate the Fact Table ---
         print("\nStep 2: Preparing and Populating the FactFinancials table...")
-        # Clear existing facts for a full reload
-        statement = delete(FactFinancials)
-        session.exec(statement)
-        print("  - Cleared existing records from FactFinancials table.")
-
-        company_map = pd.read_sql("SELECT id, cik FROM companydim WHERE is_current = TRUE", engine)
-        filing_map = pd.read_sql("SELECT id, accession_number FROM filingdim", engine)
-        tag_map = pd.read_sql("SELECT id, tag FROM tagdim", engine)
-        date_map = pd.read_sql("SELECT id, date_key FROM datedim", engine)
-        stmt_map = pd.read_sql("SELECT id, statement_code FROM statementdim", engine)
-
-        facts = dfs['num'][['adsh', 'tag_id', 'ddate', 'value']]
-        facts = facts.merge(dfs['pre'][['adsh', 'tag_id', 'stmt']], on=['adsh', 'tag_id'])
-        facts = facts.merge(dfs['sub'][['adsh', 'cik']], on='adsh')
-        facts = facts.merge(dfs['tag'][['tag_id', 'tag']], on='tag_id')
-
-        facts['date_key'] = facts['ddate'].dt.strftime('%Y%m%d')
-        facts['cik'] = facts['cik'].astype(str)
-        facts = facts.merge(company_map.rename(columns={'id': 'company_id'}), on='cik')
-        facts = facts.merge(filing_map.rename(columns={'id': 'filing_id', 'accession_number': 'adsh'}), on='adsh')
-        facts = facts.merge(tag_map.rename(columns={'id': 'tag_id_fk'}), left_on='tag', right_on='tag')
-        facts = facts.merge(date_map.rename(columns={'id': 'date_id'}), on='date_key')
-        facts = facts.merge(stmt_map.rename(columns={'id': 'statement_id', 'statement_code': 'stmt'}), on='stmt')
-        
-        fact_df = facts[['value', 'company_id', 'filing_id', 'tag_id_fk', 'date_id', 'statement_id']]
-        fact_df.rename(columns={'tag_id_fk': 'tag_id'}, inplace=True)
-        
-        fact_records = [FactFinancials(**row) for row in fact_df.to_dict(orient='records')]
-        session.add_all(fact_records)
-        print(f"  - Staged {len(fact_records)} new records for FactFinancials")
-        
-        session.commit()
+        # Pick up the surrogate keys of the dimension rows just inserted
+        keys.refresh('company', 'filing', 'tag', 'date', 'statement')
+        source = FactSource(num_dir, dfs['pre'], dfs['sub'], dfs['tag'], keys)
+        load_facts(source, full_reload=full_reload)
         print("✓ Committed fact records to the database.")
 
+    if warehouse.WAREHOUSE_BACKEND == 'duckdb':
+        print("\nStep 3: Exporting the gold tables to Parquet for the DuckDB backend...")
+        if warehouse.export_generation() == read_generation(engine):
+            print("✓ Parquet export is already at the current generation.")
+        else:
+            warehouse.export_parquet()
+
     print("\n--- ✅ Silver to Gold ETL Process Complete ---")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Silver to Gold ETL")
+    parser.add_argument("--full-reload", action="store_true",
+                        help="Delete and reload every fact instead of only those of new or changed filings")
+    args = parser.parse_args()
     try:
-        main()
+        main(full_reload=args.full_reload)
     except Exception as e:
         print("\n--- ❌ ERROR ---", file=sys.stderr)
         print(f"An unexpected error occurred: {e}", file=sys.stderr)
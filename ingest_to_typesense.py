@@ -1,7 +1,7 @@
 import pandas as pd
 from pathlib import Path
 import typesense
-from sentence_transformers import SentenceTransformer
+from api.embeddings import EMBEDDING_BACKEND, load_embedding_model
 import os
 from dotenv import load_dotenv
 import sys
@@ -22,8 +22,8 @@ def main():
     print("--- Starting Typesense Ingestion Process ---")
     try:
         # --- 1. Initialize Clients ---
-        print(f"Step 1: Initializing Sentence Transformer model ('{EMBEDDING_MODEL}')...")
-        model = SentenceTransformer(EMBEDDING_MODEL)
+        print(f"Step 1: Initializing Sentence Transformer model ('{EMBEDDING_MODEL}', {EMBEDDING_BACKEND} backend)...")
+        model = load_embedding_model(EMBEDDING_MODEL, EMBEDDING_BACKEND)
         print("✓ Model initialized.")
 
         client = typesense.Client({
@@ -62,7 +62,7 @@ def main():
         print("\nStep 3: Loading and preparing data from the Silver layer...")
         SCRIPT_DIR = Path(__file__).resolve().parent
         SILVER_DIR = SCRIPT_DIR / "data" / "silver"
-        data_df = pd.read_parquet(SILVER_DIR / "sub.parquet")
+        data_df = pd.read_parquet(SILVER_DIR / "sub")
         
         data_df.drop_duplicates(subset=['adsh'], inplace=True, keep='first')
         
@@ -0,0 +1,64 @@
+import itertools
+
+import pandas as pd
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+from data_access import models  # noqa: F401  (registers the tables)
+from data_access import warehouse
+from data_access.db import READER_PRAGMAS, WRITER_PRAGMAS, _apply_pragmas
+from etl import silver_to_gold
+
+
+@pytest.fixture
+def warehouse_engine(tmp_path):
+    """An empty gold warehouse (every table, no managed indexes) in a temporary SQLite file."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.db'}")
+    _apply_pragmas(engine, WRITER_PRAGMAS)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def gold_warehouse(warehouse_engine, tmp_path, monkeypatch):
+    """
+    A small loaded warehouse: 3 companies (one with an expired SCD2 version), 4 filings, 3 tags,
+    2 statements and dates over two years, with 72 facts loaded by the ETL's fact loader (which
+    also builds AggCompanyTotals and bumps the generation). `data_access.warehouse` reads it
+    through a read-only engine, like the API.
+    """
+    with warehouse_engine.begin() as conn:
+        conn.exec_driver_sql("""
+            INSERT INTO companydim (id, cik, name, sic, valid_from, valid_to, is_current) VALUES
+            (1, '100', 'Acme Old', '1000', '2020-01-01 00:00:00.000000', '2022-06-01 00:00:00.000000', 0),
+            (2, '100', 'Acme', '1000', '2022-06-01 00:00:00.000000', '9999-12-31 00:00:00.000000', 1),
+            (3, '200', 'Globex', '2000', '2020-01-01 00:00:00.000000', '9999-12-31 00:00:00.000000', 1),
+            (4, '300', 'Initech', NULL, '2020-01-01 00:00:00.000000', '9999-12-31 00:00:00.000000', 1)""")
+        conn.exec_driver_sql("""
+            INSERT INTO filingdim (id, accession_number, form_type) VALUES
+            (1, 'F1', '10-K'), (2, 'F2', '10-Q'), (3, 'F3', '10-K'), (4, 'F4', '10-Q')""")
+        conn.exec_driver_sql("""
+            INSERT INTO tagdim (id, tag, version, custom, label) VALUES
+            (1, 'Revenues', 'us-gaap', 0, 'Revenues'), (2, 'Assets', 'us-gaap', 0, 'Assets'),
+            (3, 'NetIncomeLoss', 'us-gaap', 0, 'Net income')""")
+        conn.exec_driver_sql("""
+            INSERT INTO statementdim (id, statement_code, statement_name) VALUES
+            (1, 'IS', 'Income Statement'), (2, 'BS', 'Balance Sheet')""")
+        conn.exec_driver_sql("""
+            INSERT INTO datedim (id, date_key) VALUES (1, '20220331'), (2, '20221231'), (3, '20230630')""")
+
+    filings = {1: 1, 2: 2, 3: 3, 4: 4}  # filing -> company version
+    rows = [((filing * 7 + tag * 5 + date * 3) % 11 * 2.5, company, filing, tag, date, 1 if tag != 2 else 2)
+            for (filing, company), tag, date in itertools.product(filings.items(), (1, 2, 3), (1, 2, 3))]
+    rows += [(value * 2, *keys) for value, *keys in rows]  # repeated groups, so sums differ from values
+    monkeypatch.setattr(silver_to_gold, 'engine', warehouse_engine)
+    silver_to_gold.load_facts([pd.DataFrame(rows, columns=silver_to_gold.FACT_COLUMNS)])
+
+    read_engine = create_engine(f"sqlite:///file:{tmp_path / 'warehouse.db'}?mode=ro&uri=true",
+                                connect_args={'check_same_thread': False})
+    _apply_pragmas(read_engine, READER_PRAGMAS)
+    monkeypatch.setattr(warehouse, 'read_engine', read_engine)
+    monkeypatch.setattr(warehouse, '_backends', {})
+    yield warehouse_engine
+    read_engine.dispose()
@@ -0,0 +1,75 @@
+from datetime import date
+
+import pytest
+
+from data_access import analytics, warehouse
+from data_access.analytics import AnalyticsQuery, QueryCostExceeded, compile_query
+
+
+def all_pages(backend, query):
+    rows, pages = [], 0
+    while True:
+        page, cursor = backend.aggregate_facts(query._replace(cursor=cursor if pages else None))
+        rows += page
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+@pytest.fixture(params=['sqlite', 'duckdb'])
+def backend(request, gold_warehouse, tmp_path, monkeypatch):
+    if request.param == 'sqlite':
+        return warehouse.get_backend('sqlite')
+    pytest.importorskip('duckdb')
+    warehouse.export_parquet(tmp_path / 'parquet')
+    return warehouse.DuckDBBackend(tmp_path / 'parquet')
+
+
+@pytest.mark.parametrize('query', [
+    AnalyticsQuery(group_by=('company', 'tag'), limit=4),
+    AnalyticsQuery(group_by=('date',), metric='count', descending=False, limit=2),
+    AnalyticsQuery(group_by=('filing', 'statement'), metric='min', form_type='10-Q', limit=3),
+], ids=['sum', 'count-ascending-ties', 'filtered'])
+def test_keyset_pages_match_one_big_page(backend, query):
+    expected, next_cursor = backend.aggregate_facts(query._replace(limit=analytics.ANALYTICS_MAX_LIMIT))
+    assert next_cursor is None and expected
+    rows, pages = all_pages(backend, query)
+    assert rows == expected
+    # A full last page still hands out a cursor, which then yields an empty page
+    assert pages == len(expected) // query.limit + 1
+
+
+def test_filters_and_ungrouped_totals(backend):
+    rows, _ = backend.aggregate_facts(AnalyticsQuery(metric='count'))
+    assert rows == [{'value': 72, 'fact_count': 72}]
+    rows, _ = backend.aggregate_facts(AnalyticsQuery(group_by=('company',), cik='100', tag='Assets',
+                                                     date_from=date(2022, 6, 1), date_to=date(2022, 12, 31)))
+    # Both SCD2 versions of CIK 100 are separate groups, with one date in range
+    assert sorted(row['name'] for row in rows) == ['Acme', 'Acme Old']
+    assert all(row['fact_count'] == 2 for row in rows)
+
+
+def test_sqlite_scan_budget_aborts_the_query(gold_warehouse, monkeypatch):
+    # The fixture's queries finish within one progress handler interval at the default
+    monkeypatch.setattr(warehouse, 'PROGRESS_HANDLER_STEPS', 10)
+    monkeypatch.setattr(analytics, 'ANALYTICS_MAX_VM_STEPS', 50)
+    with pytest.raises(QueryCostExceeded, match='scan budget'):
+        warehouse.get_backend('sqlite').aggregate_facts(AnalyticsQuery(group_by=('company', 'tag')))
+
+
+@pytest.mark.parametrize('query, message', [
+    (AnalyticsQuery(group_by=('color',)), 'Unknown group_by'),
+    (AnalyticsQuery(group_by=('tag', 'tag')), 'more than once'),
+    (AnalyticsQuery(metric='median'), 'Unknown metric'),
+    (AnalyticsQuery(limit=0), 'limit must be'),
+    (AnalyticsQuery(group_by=('tag',), cursor='not-a-cursor'), 'Malformed cursor'),
+    (AnalyticsQuery(group_by=('tag',), cursor=analytics.encode_cursor({'value': 1}, ['value'])), 'does not match'),
+])
+def test_invalid_queries(query, message):
+    with pytest.raises(ValueError, match=message):
+        compile_query(query)
+
+
+def test_only_needed_dimensions_are_joined():
+    sql = compile_query(AnalyticsQuery(group_by=('tag',), date_from=date(2023, 1, 1)), year_column='year').sql
+    assert 'JOIN tagdim' in sql and 'JOIN datedim' in sql and 'companydim' not in sql and 'f.year >= ?' in sql
@@ -0,0 +1,93 @@
+import os
+import threading
+
+from data_access.bronze_store import SubmissionStore
+
+
+def record(adsh, name='Co', form='10-K'):
+    return {'adsh': adsh, 'cik': 1, 'name': name, 'form': form, 'sic': 100, 'filing_summary': 's'}
+
+
+def test_reinsert_after_delete_survives_reload_and_compact(tmp_path):
+    path = tmp_path / 'sub.csv'
+    store = SubmissionStore(path)
+    store.insert_many([record('A1'), record('A2')])
+    assert store.delete('A1')
+    store.insert_many([record('A1', name='Co again')])
+    assert store.get('A1')['name'] == 'Co again'
+
+    reloaded = SubmissionStore(path)
+    assert reloaded.get('A1')['name'] == 'Co again'
+    assert len(reloaded) == 2
+
+    reloaded.compact()
+    assert not store.log_path.exists()
+    compacted = SubmissionStore(path)
+    assert compacted.get('A1')['name'] == 'Co again'
+    assert sorted(r['adsh'] for r in compacted.list()) == ['A1', 'A2']
+
+
+def test_reinsert_seen_by_another_store_instance(tmp_path):
+    path = tmp_path / 'sub.csv'
+    writer, reader = SubmissionStore(path), SubmissionStore(path)
+    writer.insert_many([record('A1')])
+    assert reader.get('A1') is not None
+    writer.delete('A1')
+    writer.insert_new([record('A1', name='Back')])
+    assert reader.get('A1')['name'] == 'Back'
+
+
+def test_in_place_rewrite_that_grows_the_file_reloads(tmp_path):
+    path = tmp_path / 'sub.csv'
+    store = SubmissionStore(path)
+    store.insert_many([record('A1', name='Short'), record('A2', name='Other')])
+    assert store.get('A2')['name'] == 'Other'
+
+    # Rewrite in place (same inode), longer than before: rows shift, so old offsets are stale
+    text = path.read_text().replace('Short', 'A much longer company name')
+    with open(path, 'r+') as fh:
+        fh.truncate(0)
+        fh.write(text)
+    assert os.stat(path).st_size > store._csv_end
+
+    assert store.get('A1')['name'] == 'A much longer company name'
+    assert store.get('A2')['name'] == 'Other'
+    assert store.stats()['reloads'] == 1
+
+
+def test_append_by_another_process_is_caught_up_without_reload(tmp_path):
+    path = tmp_path / 'sub.csv'
+    store = SubmissionStore(path)
+    store.insert_many([record('A1')])
+    SubmissionStore(path).insert_many([record('A2')])
+    assert store.get('A2') is not None
+    assert store.stats()['reloads'] == 0
+
+
+def test_writes_from_another_process_during_compaction_are_kept(tmp_path, monkeypatch):
+    path = tmp_path / 'sub.csv'
+    compactor, writer = SubmissionStore(path), SubmissionStore(path)
+    compactor.insert_many([record('A1'), record('A2')])
+    compactor.update('A1', {'name': 'Renamed'})
+    real_replace, done = os.replace, []
+
+    def write():
+        # Another process's writes, arriving while the compacted file is being swapped in
+        writer.insert_many([record('A3')])
+        writer.update('A2', {'name': 'Updated'})
+        done.append(True)
+
+    def replace(src, dst):
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join(0.2)
+        assert not done  # blocked on the write lock until the compaction finished
+        real_replace(src, dst)
+        replace.thread = thread
+    monkeypatch.setattr('data_access.bronze_store.os.replace', replace)
+    compactor.compact()
+    replace.thread.join(5)
+    assert done
+
+    reloaded = SubmissionStore(path)
+    assert {r['adsh']: r['name'] for r in reloaded.list()} == {'A1': 'Renamed', 'A2': 'Updated', 'A3': 'Co'}
@@ -0,0 +1,153 @@
+import json
+
+import pandas as pd
+import pytest
+
+from etl import bronze_to_silver
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    """A project directory with small bronze CSVs and PDFs whose "text" is their content."""
+    structured = tmp_path / 'data' / 'bronze' / 'structured_filings'
+    pdfs = tmp_path / 'data' / 'bronze' / 'unstructured_filings_pdf'
+    structured.mkdir(parents=True)
+    pdfs.mkdir(parents=True)
+    (structured / 'sub.csv').write_text("adsh,cik,name,form,sic,filing_summary\nA1,1,Acme,10-K,100,s1\nA2,2,Globex,10-Q,200,s2\n")
+    (structured / 'num.csv').write_text("adsh,tag,tag_id,ddate,value\nA1,Revenues,1,20230630,10.5\nA2,Assets,2,20221231,20\n")
+    (structured / 'pre.csv').write_text("adsh,tag_id,stmt\nA1,1,IS\nA2,2,BS\n")
+    (structured / 'tag.csv').write_text("tag_id,tag,version,custom,label\n1,Revenues,v,0,Revenues\n2,Assets,v,0,Assets\n")
+    (pdfs / 'A1.pdf').write_text("text of A1")
+
+    def extract_texts(pdf_files, workers=None):
+        return [pdf_file.read_text() for pdf_file in pdf_files], {'hit': 0, 'extracted': len(pdf_files), 'failed': 0}
+    monkeypatch.setattr(bronze_to_silver, 'extract_texts', extract_texts)
+    return tmp_path
+
+
+def run(root, **kwargs):
+    bronze_to_silver.main(workers=1, root_dir=root, **kwargs)
+    return json.loads((root / 'data' / 'silver' / bronze_to_silver.MANIFEST_NAME).read_text())
+
+
+def silver(root, table):
+    return pd.read_parquet(root / 'data' / 'silver' / table)
+
+
+def pdf_texts(root):
+    return silver(root, 'sub').set_index('adsh')['extracted_pdf_text'].fillna('').to_dict()
+
+
+def append(path, text):
+    with open(path, 'a') as fh:
+        fh.write(text)
+
+
+def test_appended_rows_are_written_as_a_new_part(root):
+    structured = root / 'data' / 'bronze' / 'structured_filings'
+    manifest = run(root)
+    assert {table: entry['parts'] for table, entry in manifest['tables'].items()} == {
+        table: ['part-00000.parquet'] for table in ('sub', 'num', 'pre', 'tag')}
+    assert pdf_texts(root) == {'A1': 'text of A1', 'A2': ''}
+
+    append(structured / 'num.csv', "A2,Revenues,1,20230331,5\n")
+    append(structured / 'sub.csv', "A3,3,Initech,10-K,300,s3\n")
+    (root / 'data' / 'bronze' / 'unstructured_filings_pdf' / 'A3.pdf').write_text("text of A3")
+    manifest = run(root)
+    assert manifest['tables']['num']['parts'] == ['part-00000.parquet', 'part-00001.parquet']
+    assert manifest['tables']['num']['rows'] == 3
+    assert manifest['tables']['tag']['parts'] == ['part-00000.parquet']  # unchanged
+    num = silver(root, 'num')
+    assert len(num) == 3 and str(num['ddate'].dtype) == 'datetime64[ns]'
+    assert pdf_texts(root) == {'A1': 'text of A1', 'A2': '', 'A3': 'text of A3'}
+
+    manifest = run(root)  # nothing new
+    assert manifest['tables']['num']['parts'] == ['part-00000.parquet', 'part-00001.parquet']
+    assert manifest['next_batch'] == 3
+
+
+def test_rewritten_input_is_reloaded_in_full(root):
+    structured = root / 'data' / 'bronze' / 'structured_filings'
+    run(root)
+    # Same inode, longer than before, but the processed prefix changed: not an append
+    (structured / 'tag.csv').write_text("tag_id,tag,version,custom,label\n1,Revenues,v2,0,Revenue total\n"
+                                        "2,Assets,v2,0,Assets\n3,Liabilities,v2,0,Liabilities\n")
+    manifest = run(root)
+    assert manifest['tables']['tag']['parts'] == ['part-00001.parquet']
+    tag = silver(root, 'tag')
+    assert tag['label'].tolist() == ['Revenue total', 'Assets', 'Liabilities']
+
+
+def test_changed_pdf_of_a_processed_filing_reloads_sub(root):
+    run(root)
+    (root / 'data' / 'bronze' / 'unstructured_filings_pdf' / 'A1.pdf').write_text("new text of A1")
+    manifest = run(root)
+    assert manifest['tables']['sub']['parts'] == ['part-00001.parquet']
+    assert pdf_texts(root)['A1'] == 'new text of A1'
+
+
+def test_unrecorded_parts_are_dropped_and_parts_compacted(root):
+    structured = root / 'data' / 'bronze' / 'structured_filings'
+    run(root)
+    # Written by a run that was interrupted before saving the manifest
+    stray = root / 'data' / 'silver' / 'num' / 'part-00001.parquet'
+    silver(root, 'num').to_parquet(stray)
+    append(structured / 'num.csv', "A2,Revenues,1,20230331,5\n")
+    manifest = run(root, compact=True)
+    assert manifest['tables']['num']['parts'] == ['part-00001.parquet']
+    assert sorted(p.name for p in (root / 'data' / 'silver' / 'num').iterdir()) == ['part-00001.parquet']
+    assert len(silver(root, 'num')) == 3
+
+
+def test_rows_appended_during_a_run_are_loaded_once(root, monkeypatch):
+    structured = root / 'data' / 'bronze' / 'structured_filings'
+    convert = bronze_to_silver.convert_csv_to_parquet
+
+    def convert_while_appending(csv_path, *args, **kwargs):
+        if csv_path.name == 'num.csv':
+            append(csv_path, "A2,Liabilities,3,20230331,7\n")
+        return convert(csv_path, *args, **kwargs)
+    monkeypatch.setattr(bronze_to_silver, 'convert_csv_to_parquet', convert_while_appending)
+    manifest = run(root)
+    assert manifest['tables']['num']['rows'] == 2
+
+    monkeypatch.setattr(bronze_to_silver, 'convert_csv_to_parquet', convert)
+    manifest = run(root)
+    assert manifest['tables']['num']['rows'] == 3
+    assert sorted(silver(root, 'num')['tag']) == ['Assets', 'Liabilities', 'Revenues']
+
+
+def test_compaction_keeps_the_old_parts_until_the_manifest_is_saved(root, monkeypatch):
+    structured = root / 'data' / 'bronze' / 'structured_filings'
+    num_dir = root / 'data' / 'silver' / 'num'
+    run(root)
+    append(structured / 'num.csv', "A2,Revenues,1,20230331,5\n")
+    save_manifest = bronze_to_silver.save_manifest
+
+    def crash(silver_dir, manifest):
+        raise RuntimeError("crashed")
+    monkeypatch.setattr(bronze_to_silver, 'save_manifest', crash)
+    with pytest.raises(RuntimeError):
+        bronze_to_silver.main(workers=1, root_dir=root, compact=True)
+    assert (num_dir / 'part-00000.parquet').exists()
+
+    monkeypatch.setattr(bronze_to_silver, 'save_manifest', save_manifest)
+    manifest = run(root)
+    assert manifest['tables']['num']['parts'] == ['part-00000.parquet', 'part-00001.parquet']
+    assert len(silver(root, 'num')) == 3
+
+
+def test_failed_pdfs_are_retried_by_the_next_run(root, monkeypatch):
+    extract_texts = bronze_to_silver.extract_texts
+
+    def failing_extract_texts(pdf_files, workers=None):
+        return [None] * len(pdf_files), {'hit': 0, 'extracted': 0, 'failed': len(pdf_files)}
+    monkeypatch.setattr(bronze_to_silver, 'extract_texts', failing_extract_texts)
+    manifest = run(root)
+    assert manifest['pdfs'] == {}
+    assert pdf_texts(root) == {'A1': '', 'A2': ''}
+
+    monkeypatch.setattr(bronze_to_silver, 'extract_texts', extract_texts)
+    manifest = run(root)
+    assert set(manifest['pdfs']) == {'A1'}
+    assert pdf_texts(root) == {'A1': 'text of A1', 'A2': ''}
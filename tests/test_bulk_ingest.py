@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import services
+from api.main import app
+from data_access.bronze_store import SubmissionStore
+
+AUTH = ('admin', 'supersecret')
+
+
+def submission(adsh):
+    return {'adsh': adsh, 'cik': 1, 'name': 'Co', 'form': '10-K', 'sic': 100, 'filing_summary': 's'}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = SubmissionStore(tmp_path / 'sub.csv')
+    monkeypatch.setattr(services, 'submission_store', store)
+    return store
+
+
+def ndjson(records):
+    return b''.join(json.dumps(record).encode() + b'\n' for record in records)
+
+
+def test_results_stream_before_the_body_is_consumed(store):
+    pulled = []
+
+    async def body():
+        for i in range(4):
+            pulled.append(i)
+            yield ndjson([submission(f'A{i}')])
+
+    async def first_result():
+        results = services.bulk_ingest_submissions(body(), chunk_size=1)
+        first = await results.__anext__()
+        await results.aclose()
+        return first
+
+    first = json.loads(asyncio.run(first_result()))
+    assert first == {'line': 1, 'adsh': 'A0', 'status': 'created'}
+    assert len(pulled) < 4
+
+
+def test_overlong_line_is_invalid_without_buffering_it(monkeypatch):
+    async def body():
+        yield b'{"short": 1}\n' + b'x' * 10
+        for _ in range(5):
+            yield b'x' * 10  # one 60-byte line spread over several chunks
+        yield b'\n{"after": 2}'
+
+    async def collect():
+        return [item async for item in services._iter_lines(body(), max_line_bytes=20)]
+
+    assert asyncio.run(collect()) == [(1, b'{"short": 1}'), (2, None), (3, b'{"after": 2}')]
+
+
+def test_bulk_endpoint(store, monkeypatch):
+    monkeypatch.setattr(services, 'BULK_MAX_LINE_BYTES', 200)
+    store.insert_many([submission('DUP')])
+    body = ndjson([submission('N1'), submission('DUP')]) + b'{"adsh": "bad"}\n' + b'"' + b'y' * 300 + b'"\n'
+    with TestClient(app) as client:
+        response = client.post('/raw/submissions/bulk?chunk_size=2', content=body, auth=AUTH)
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [(r['line'], r['status']) for r in results] == [(1, 'created'), (2, 'duplicate'), (3, 'invalid'), (4, 'invalid')]
+    assert 'exceeds 200 bytes' in results[3]['detail']
+    assert store.get('N1') is not None
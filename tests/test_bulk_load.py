@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from data_access import indexes
+from data_access.bulk_load import bulk_insert, bulk_load_connection
+from etl import silver_to_gold
+from etl.silver_to_gold import load_facts
+
+
+def index_names(engine, table='factfinancials'):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,))
+        return {name for name, in rows if not name.startswith('sqlite_autoindex')}
+
+
+def fact_count(engine):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("SELECT COUNT(*) FROM factfinancials").scalar()
+
+
+def facts(filing_ids, per_filing=3):
+    rows = [(float(i), 1, filing_id, i, 1, 1) for filing_id in filing_ids for i in range(1, per_filing + 1)]
+    return pd.DataFrame(rows, columns=silver_to_gold.FACT_COLUMNS)
+
+
+def test_ddl_before_the_first_insert_rolls_back_with_the_load(warehouse_engine):
+    with bulk_load_connection(warehouse_engine) as conn:
+        indexes.create_indexes(conn, 'factfinancials', analyze=False)
+        conn.commit()
+    managed = index_names(warehouse_engine)
+    assert managed
+
+    with bulk_load_connection(warehouse_engine) as conn:
+        indexes.drop_indexes(conn, 'factfinancials')
+        bulk_insert(conn, 'factfinancials', facts([1]))
+        # Not committed: leaving the block rolls everything back, the drop included
+
+    assert index_names(warehouse_engine) == managed
+    assert fact_count(warehouse_engine) == 0
+
+
+def test_failed_full_reload_keeps_facts_and_indexes(warehouse_engine, monkeypatch):
+    monkeypatch.setattr(silver_to_gold, 'engine', warehouse_engine)
+    load_facts([facts([1, 2])])
+    managed = index_names(warehouse_engine)
+    assert managed and fact_count(warehouse_engine) == 6
+
+    class FailingSource:
+        """Hashes fine, then fails while the facts are being inserted."""
+        def __init__(self):
+            self.passes = 0
+
+        def __iter__(self):
+            self.passes += 1
+            yield facts([1, 2, 3])
+            if self.passes == 2:
+                raise RuntimeError("source went away")
+
+    with pytest.raises(RuntimeError):
+        load_facts(FailingSource(), full_reload=True)
+
+    assert index_names(warehouse_engine) == managed
+    assert fact_count(warehouse_engine) == 6
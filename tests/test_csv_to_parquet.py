@@ -0,0 +1,30 @@
+import pandas as pd
+
+from etl.csv_to_parquet import convert_csv_to_parquet
+from etl.silver import transform_txt
+
+
+def test_malformed_rows_are_skipped(tmp_path, capsys):
+    csv_path = tmp_path / 'num.csv'
+    csv_path.write_text("adsh,tag,value\nA1,Revenues,10.5\nA2,Assets,20,extra\nA3,Assets,30\n")
+
+    rows = convert_csv_to_parquet(csv_path, tmp_path / 'num.parquet', table='num')
+
+    assert rows == 2
+    assert pd.read_parquet(tmp_path / 'num.parquet')['adsh'].tolist() == ['A1', 'A3']
+    assert 'expected 3 fields, got 4' in capsys.readouterr().out
+
+
+def test_ragged_line_does_not_fail_a_txt_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(transform_txt, 'SILVER_PARQUET_DIR', tmp_path / 'silver')
+    (tmp_path / 'silver').mkdir()
+    header = ['adsh', 'tag', 'version', 'ddate', 'qtrs', 'uom', 'value']
+    lines = ['\t'.join(header)] + [f'A{i}\tRevenues\tus-gaap/2023\t20230630\t1\tUSD\t{i}' for i in range(20)]
+    lines.insert(5, 'A99\tRevenues\tus-gaap/2023\t20230630\t1\tUSD\t99\tstray')
+    (tmp_path / 'num.txt').write_text('\n'.join(lines) + '\n')
+
+    out_file = transform_txt.transform_raw_txt_to_silver(tmp_path / 'num.txt')
+
+    assert out_file is not None
+    df = pd.read_parquet(out_file)
+    assert len(df) == 20 and 'A99' not in set(df['adsh'])
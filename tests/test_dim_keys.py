@@ -0,0 +1,24 @@
+import pandas as pd
+
+from etl.gold.dim_keys import DimensionKeys
+
+
+def add_tags(engine, *tags):
+    with engine.begin() as conn:
+        for tag in tags:
+            conn.exec_driver_sql("INSERT INTO tagdim (tag, version, custom, label) VALUES (?, 'v', 0, ?)", (tag, tag))
+
+
+def test_load_reads_keys_once_and_refresh_picks_up_new_rows(warehouse_engine):
+    add_tags(warehouse_engine, 'Revenues', 'Assets')
+    keys = DimensionKeys(warehouse_engine)
+    keys.load('tag', 'date')
+    assert len(keys['tag']) == 2 and len(keys['date']) == 0
+
+    add_tags(warehouse_engine, 'Liabilities')
+    keys.load('tag')  # already loaded: not re-read
+    assert keys['tag'].resolve(['Assets', 'Liabilities']).tolist() == [2, pd.NA]
+    assert keys['tag'].missing(['Assets', 'Liabilities', 'Other']).tolist() == ['Liabilities', 'Other']
+
+    keys.refresh('tag')
+    assert keys['tag'].resolve(['Liabilities']).tolist() == [3]
@@ -0,0 +1,52 @@
+import types
+import zlib
+
+import numpy as np
+import pytest
+
+from api import embeddings
+from api.embeddings import EmbeddingService, ModelLoader, normalize_query
+
+
+class FakeModel:
+    """Encodes each text to a vector derived from its exact characters, so case matters unless lowercased."""
+
+    def __init__(self, do_lower_case):
+        self.tokenizer = types.SimpleNamespace(do_lower_case=do_lower_case)
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32):
+        self.encoded.extend(texts)
+        return np.array([np.random.default_rng(zlib.crc32(text.encode())).normal(size=4) for text in texts])
+
+
+def service_for(monkeypatch, model):
+    monkeypatch.setattr(embeddings, 'load_embedding_model', lambda name, backend: model)
+    loader = ModelLoader('fake-model')
+    loader.start()
+    assert loader.wait(5)
+    model.encoded.clear()  # warmup
+    return EmbeddingService(loader, batch_window_ms=0)
+
+
+def test_cased_model_keeps_query_case(monkeypatch):
+    model = FakeModel(do_lower_case=False)
+    service = service_for(monkeypatch, model)
+    upper, lower = service.embed('Apple  results'), service.embed('apple results')
+    assert model.encoded == ['Apple results', 'apple results']
+    assert not np.array_equal(upper, lower)
+    assert service.loader.status()['lowercase'] is False
+
+
+def test_uncased_model_shares_cache_entries_across_case(monkeypatch):
+    model = FakeModel(do_lower_case=True)
+    service = service_for(monkeypatch, model)
+    first, second = service.embed('Apple  results'), service.embed('apple results')
+    assert model.encoded == ['apple results']
+    assert np.array_equal(first, second)
+    assert service.stats()['cache_hits'] == 1
+
+
+@pytest.mark.parametrize('lowercase, expected', [(False, 'Apple Inc.'), (True, 'apple inc.')])
+def test_normalize_query(lowercase, expected):
+    assert normalize_query('  Apple \t Inc.\n', lowercase) == expected
@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+from fastapi import Request, Response
+from fastapi.testclient import TestClient
+
+from api import services
+from api.cache import QueryCache
+from api.main import app
+from data_access import warehouse
+from etl import silver_to_gold
+
+AUTH = ('admin', 'supersecret')
+
+
+def request(if_none_match=None):
+    headers = [(b'if-none-match', if_none_match.encode())] if if_none_match else []
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': headers})
+
+
+def test_entries_are_keyed_on_parameters_and_generation():
+    generation, computed = [1], []
+    cache = QueryCache(lambda: generation[0])
+
+    def respond(**params):
+        response = Response()
+        value = cache.respond(request(), response, 'totals', params, lambda: computed.append(params) or len(computed))
+        return value, response.headers['etag']
+
+    first, etag = respond(limit=5, tag=None)
+    # Unset parameters don't split entries
+    assert respond(limit=5) == (first, etag)
+    assert respond(limit=6)[0] != first
+    generation[0] = 2
+    value, new_etag = respond(limit=5)
+    assert value != first and new_etag != etag
+    # The old generation's entries were dropped when the first new one was stored
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 3, 1)
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('api.cache.time.monotonic', lambda: now[0])
+    cache = QueryCache(lambda: 1, max_entries=2, ttl_seconds=10)
+    calls = []
+
+    def respond(limit):
+        return cache.respond(request(), Response(), 'totals', {'limit': limit}, lambda: calls.append(limit) or limit)
+
+    respond(1), respond(2), respond(1), respond(3)  # 2 is the least recently used
+    assert cache.stats()['evictions'] == 1
+    respond(1), respond(2)
+    assert calls == [1, 2, 3, 2]
+    now[0] = 11
+    respond(1)
+    assert calls == [1, 2, 3, 2, 1]
+
+
+def test_matching_if_none_match_is_answered_without_computing():
+    cache = QueryCache(lambda: 7)
+    response = Response()
+    cache.respond(request(), response, 'totals', {'limit': 5}, lambda: 'result')
+    etag = response.headers['etag']
+
+    def fail():
+        raise AssertionError("computed on a 304")
+    not_modified = cache.respond(request(f'"other", {etag}'), Response(), 'totals', {'limit': 5}, fail)
+    assert not_modified.status_code == 304 and not_modified.headers['etag'] == etag
+    assert cache.stats()['not_modified'] == 1
+
+
+@pytest.fixture
+def client(gold_warehouse, monkeypatch):
+    backend = warehouse.SQLiteBackend()
+    monkeypatch.setattr(services, 'warehouse', backend)
+    monkeypatch.setattr(services, 'query_cache', QueryCache(backend.generation))
+    return TestClient(app)
+
+
+def test_a_load_invalidates_cached_results_and_etags(client):
+    first = client.get('/query/company-totals?limit=2', auth=AUTH)
+    assert first.status_code == 200 and first.headers['x-warehouse-generation'] == '1'
+    etag = first.headers['etag']
+    assert client.get('/query/company-totals?limit=2', auth=AUTH, headers={'If-None-Match': etag}).status_code == 304
+
+    # A reload with every value doubled bumps the generation
+    with silver_to_gold.engine.connect() as conn:
+        facts = pd.read_sql("SELECT * FROM factfinancials", conn)[silver_to_gold.FACT_COLUMNS]
+    silver_to_gold.load_facts([facts.assign(value=facts['value'] * 2)], full_reload=True)
+
+    after = client.get('/query/company-totals?limit=2', auth=AUTH, headers={'If-None-Match': etag})
+    assert after.status_code == 200 and after.headers['x-warehouse-generation'] == '2'
+    assert after.headers['etag'] != etag
+    assert [row['total_value'] for row in after.json()['results']] == [
+        row['total_value'] * 2 for row in first.json()['results']]
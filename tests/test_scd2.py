@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import pandas as pd
+
+from data_access.bulk_load import bulk_load_connection
+from etl.gold.scd2 import company_ids_as_of, company_sources, merge_company_dim
+
+
+def merge_sources(engine, sources, now=None):
+    with bulk_load_connection(engine) as conn:
+        counts = merge_company_dim(conn, sources, now=now)
+        conn.commit()
+    return counts
+
+
+def merge(engine, companies, now):
+    return merge_sources(engine, pd.DataFrame(companies, columns=['cik', 'name', 'sic']), now=now)
+
+
+def versions(engine):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(
+            "SELECT id, cik, name, sic, valid_from, valid_to, is_current FROM companydim ORDER BY id").fetchall()
+
+
+def test_merge_adds_new_and_versions_changed_companies(warehouse_engine):
+    assert merge(warehouse_engine, [('100', 'Acme', 1000), ('200', 'Globex', None)], datetime(2021, 1, 1)) == (2, 0)
+    # Unchanged (a null sic included) is a no-op
+    assert merge(warehouse_engine, [('100', 'Acme', 1000), ('200', 'Globex', None)], datetime(2021, 6, 1)) == (0, 0)
+    assert merge(warehouse_engine, [('100', 'Acme Corp', 1000), ('200', 'Globex', None), ('300', 'Initech', 3000)],
+                 datetime(2022, 1, 1)) == (1, 1)
+
+    rows = versions(warehouse_engine)
+    assert [(cik, name, sic, is_current) for _, cik, name, sic, _, _, is_current in rows] == [
+        ('100', 'Acme', '1000', 0), ('200', 'Globex', None, 1), ('100', 'Acme Corp', '1000', 1), ('300', 'Initech', '3000', 1)]
+    expired, renamed = rows[0], rows[2]
+    assert expired[5] == renamed[4] == '2022-01-01 00:00:00.000000'
+    assert renamed[5].startswith('9999-12-31')
+
+
+def test_company_ids_as_of_picks_the_version_in_effect(warehouse_engine):
+    merge(warehouse_engine, [('100', 'Acme', 1000)], datetime(2021, 1, 1))
+    merge(warehouse_engine, [('100', 'Acme Corp', 1000)], datetime(2022, 1, 1))
+    ciks = pd.Series(['100', '100', '100', '100', '999'], index=[10, 11, 12, 13, 14])
+    dates = pd.Series(pd.to_datetime(['2021-06-01', '2023-01-01', '2020-01-01', None, '2021-06-01']), index=ciks.index)
+    ids = company_ids_as_of(warehouse_engine, ciks, dates)
+    # Before the first version -> the first version; no date -> the current one; unknown CIK -> <NA>
+    assert ids.index.tolist() == [10, 11, 12, 13, 14]
+    assert ids.tolist() == [1, 2, 1, 2, pd.NA]
+
+
+def filings(*rows):
+    return pd.DataFrame(rows, columns=['cik', 'name', 'sic', 'filed'])
+
+
+def test_company_sources_take_the_latest_attributes_and_their_first_filing_date():
+    sources = company_sources(filings(
+        (100, 'Acme', 1000, 20210105), (100, 'Acme Corp', 1000, 20220301), (100, 'Acme', 1000, 20230110),
+        (100, 'Acme', 1000, 20230601), (200, 'Globex', None, 20220101)))
+    assert sources['cik'].tolist() == ['100', '200']
+    assert sources['name'].tolist() == ['Acme', 'Globex']
+    # Acme's latest run of filings started in 2023, not with its first filing under that name
+    assert sources['valid_from'].tolist() == [pd.Timestamp('2023-01-10'), pd.Timestamp('2022-01-01')]
+
+
+def test_rename_detected_by_a_later_load_applies_from_its_filing_date(warehouse_engine):
+    first_load = filings((100, 'Acme', 1000, 20210105), (100, 'Acme', 1000, 20220301))
+    merge_sources(warehouse_engine, company_sources(first_load))
+    # The next load, long after the filings, sees the filing that introduced the new name
+    second_load = pd.concat([first_load, filings((100, 'Acme Corp', 1000, 20230110))])
+    assert merge_sources(warehouse_engine, company_sources(second_load)) == (0, 1)
+
+    rows = versions(warehouse_engine)
+    assert [(name, valid_from[:10], valid_to[:10]) for _, _, name, _, valid_from, valid_to, _ in rows] == [
+        ('Acme', '2021-01-05', '2023-01-10'), ('Acme Corp', '2023-01-10', '9999-12-31')]
+    filed = pd.to_datetime(second_load['filed'].astype(str), format='%Y%m%d')
+    assert company_ids_as_of(warehouse_engine, second_load['cik'], filed).tolist() == [1, 1, 2]
+
+
+def test_new_version_never_starts_before_the_one_it_replaces(warehouse_engine):
+    merge(warehouse_engine, [('100', 'Acme', 1000)], datetime(2024, 1, 1))  # no filing dates: load time
+    merge_sources(warehouse_engine, company_sources(filings((100, 'Acme Corp', 1000, 20230110))))
+    (_, _, _, _, old_from, old_to, _), (_, _, _, _, new_from, _, _) = versions(warehouse_engine)
+    assert old_from == old_to == new_from == '2024-01-01 00:00:00.000000'
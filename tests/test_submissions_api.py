@@ -0,0 +1,35 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from api import config, services
+from api.main import app
+from data_access.bronze_store import SubmissionStore
+
+AUTH = ('admin', 'supersecret')
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    store = SubmissionStore(tmp_path / 'sub.csv')
+    store.insert_many([{'adsh': adsh, 'cik': 1, 'name': 'Co', 'form': '10-K', 'sic': 100, 'filing_summary': 's'}
+                       for adsh in ('A1', 'A2', 'A3')])
+    monkeypatch.setattr(services, 'submission_store', store)
+    return TestClient(app)
+
+
+def test_keyset_pages_follow_the_cursor(client):
+    first = client.get('/raw/submissions/?after=&limit=2', auth=AUTH)
+    assert [s['adsh'] for s in first.json()] == ['A1', 'A2'] and first.headers['x-next-cursor'] == 'A2'
+    last = client.get('/raw/submissions/?after=A2&limit=2', auth=AUTH)
+    assert [s['adsh'] for s in last.json()] == ['A3'] and 'x-next-cursor' not in last.headers
+
+
+@pytest.mark.parametrize('query', ['after=&limit=0', 'after=&limit=-1', 'limit=-1', 'skip=-1',
+                                   f'after=&limit={config.RAW_PAGE_MAX_LIMIT + 1}'])
+def test_out_of_range_paging_is_rejected(client, query):
+    assert client.get(f'/raw/submissions/?{query}', auth=AUTH).status_code == 422
+
+
+def test_empty_last_page_has_no_cursor(client):
+    response = client.get('/raw/submissions/?after=A3&limit=1', auth=AUTH)
+    assert response.status_code == 200 and response.json() == [] and 'x-next-cursor' not in response.headers